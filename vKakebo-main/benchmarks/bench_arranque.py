@@ -0,0 +1,79 @@
+"""
+Tiempo de arranque de la ventana con libros de distinto tamaño: hasta el
+primer pintado (la ventana con la lista vacia y el aviso) y hasta que se
+puede usar (formulario construido y primera pagina de la lista pintada).
+Abrir la base de datos y leer la primera pagina van en otro hilo, asi que
+el primer pintado no debe depender del numero de movimientos.
+
+    python -m benchmarks.bench_arranque
+    python -m benchmarks.bench_arranque --tamanos 0 1000000 --salida arranque.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+from kakebo.controllers import Controller
+from benchmarks.libro import crear_sqlite
+
+TAMANOS = (0, 100_000, 1_000_000)
+REPETICIONES = 5
+# segundos desde crear la ventana
+PRESUPUESTO = {"primer_pintado": 0.2, "interactivo": 0.5}
+ESPERA_MAXIMA = 60
+
+def arrancar(ruta):
+    app = Controller(ruta)
+    limite = time.perf_counter() + ESPERA_MAXIMA
+    try:
+        while "interactivo" not in app.tiempos and time.perf_counter() < limite:
+            app.update()
+            time.sleep(0.001)
+        return dict(app.tiempos)
+    finally:
+        app.cerrar()
+
+def medir(ruta, repeticiones):
+    tiempos = [arrancar(ruta) for _ in range(repeticiones)]
+    return {fase: statistics.median(medida.get(fase, float("inf")) for medida in tiempos)
+            for fase in PRESUPUESTO}
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    opciones = parser.parse_args(argumentos)
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as error:
+        print(f"No hay pantalla disponible: {error}")
+        return 0
+
+    resultados = {}
+    fuera = []
+    print(f"{'movimientos':>12} {'pintado (ms)':>14} {'interactivo (ms)':>18}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for movimientos in opciones.tamanos:
+            ruta = os.path.join(directorio, f"arranque_{movimientos}.db")
+            crear_sqlite(ruta, movimientos)
+            medida = medir(ruta, opciones.repeticiones)
+            resultados[str(movimientos)] = medida
+            marcas = [fase for fase, segundos in medida.items() if segundos > PRESUPUESTO[fase]]
+            fuera.extend((movimientos, fase) for fase in marcas)
+            print(f"{movimientos:>12} {medida['primer_pintado'] * 1000:>14.1f} "
+                  f"{medida['interactivo'] * 1000:>18.1f}"
+                  + (f"  > presupuesto: {', '.join(marcas)}" if marcas else ""))
+
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8") as f:
+            json.dump({"presupuesto": PRESUPUESTO, "resultados": resultados}, f, indent=2)
+    return 1 if fuera else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
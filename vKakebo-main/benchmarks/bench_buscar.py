@@ -0,0 +1,71 @@
+"""
+Tiempo de DaoSqlite.buscar sobre un libro sintetico (por defecto de un
+millon de movimientos). Para cada busqueda da la mediana en ms con los dos
+ordenes: "recientes" recorre las coincidencias de FTS5 en orden y para al
+llegar al limite; "rank" tiene que puntuarlas todas, asi que con palabras
+que salen en muchos movimientos tarda mas.
+
+    python -m benchmarks.bench_buscar
+    python -m benchmarks.bench_buscar --movimientos 100000 --salida buscar.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from kakebo.modelos import DaoSqlite, Gasto, CategoriaGastos
+from benchmarks.libro import crear_sqlite
+
+MOVIMIENTOS = 1_000_000
+REPETICIONES = 20
+OBJETIVO = 0.010
+
+# nombre, texto, filtros
+BUSQUEDAS = (
+    ("palabra comun", "farmacia", {}),
+    ("prefijo", "farma", {}),
+    ("dos palabras", "reparacion coche", {}),
+    ("palabra y numero", "museo 1234", {}),
+    ("con fechas", "cine", {"desde": date(2024, 1, 1), "hasta": date(2024, 3, 31)}),
+    ("con categoria", "regalo", {"tipo": Gasto, "categorias": [CategoriaGastos.EXTRAS]}),
+)
+
+def medir(dao, repeticiones):
+    resultados = {}
+    for nombre, texto, filtros in BUSQUEDAS:
+        for orden in ("recientes", "rank"):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                encontrados = dao.buscar(texto, limite=50, orden=orden, **filtros)
+                tiempos.append(time.perf_counter() - inicio)
+            mediana = statistics.median(tiempos)
+            resultados[f"{nombre} ({orden})"] = {"segundos": mediana, "encontrados": len(encontrados)}
+            marca = "" if mediana < OBJETIVO else "  > 10 ms"
+            print(f"{nombre:<18} {orden:<10} {mediana * 1000:>9.2f} ms {len(encontrados):>4} filas{marca}")
+    return resultados
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movimientos", type=int, default=MOVIMIENTOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    opciones = parser.parse_args(argumentos)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "buscar.db")
+        inicio = time.perf_counter()
+        crear_sqlite(ruta, opciones.movimientos)
+        print(f"{opciones.movimientos} movimientos grabados en {time.perf_counter() - inicio:.1f} s")
+        with DaoSqlite(ruta) as dao:
+            resultados = medir(dao, opciones.repeticiones)
+
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8") as f:
+            json.dump({"movimientos": opciones.movimientos, "resultados": resultados}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Tiempos de los modelos y los DAO sobre libros sinteticos de distintos
+tamaños (ver benchmarks.libro). El resultado se escribe en JSON y se puede
+comparar con otro guardado antes para ver si algo se ha vuelto mas lento:
+
+    python -m benchmarks.bench_daos --salida base.json
+    python -m benchmarks.bench_daos --base base.json
+
+Con --base el proceso acaba con codigo 1 si alguna prueba tarda mas de
+tolerancia (por defecto un 25%) sobre lo guardado.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from kakebo.modelos import (DaoCSV, DaoSqlite, DaoBinario, Ingreso, Gasto, Instrumentacion, COLUMNAS_ORDEN,
+                            importar_csv, cargar_numpy)
+from benchmarks.libro import generar_movimientos, crear_csv, crear_sqlite
+
+TAMANOS = (1_000, 100_000, 1_000_000)
+REPETICIONES = 3
+TOLERANCIA = 0.25
+# las pruebas de uno en uno no recorren todo el libro
+LECTURAS_SUELTAS = 10_000
+ESCRITURAS_SUELTAS = 1_000
+# paginas de leer_pagina, como las de ListaMovimientos
+PAGINAS = 50
+TAM_PAGINA = 100
+
+def cronometrar(funcion, repeticiones):
+    # el mejor de varios intentos es lo que menos depende del ruido de la maquina
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        transcurrido = time.perf_counter() - inicio
+        if mejor is None or transcurrido < mejor:
+            mejor = transcurrido
+    return mejor
+
+def pruebas_modelos(cantidad):
+    filas = [(m.concepto, m.fecha, m.cantidad, getattr(m, "categoria", None))
+             for m in generar_movimientos(cantidad)]
+
+    def crear():
+        for concepto, fecha, importe, categoria in filas:
+            if categoria is None:
+                Ingreso(concepto, fecha, importe)
+            else:
+                Gasto(concepto, fecha, importe, categoria)
+
+    yield "movimiento_crear", cantidad, crear
+
+def pruebas_csv(directorio, cantidad):
+    ruta = os.path.join(directorio, f"libro_{cantidad}.csv")
+    crear_csv(ruta, cantidad)
+    sueltas = min(cantidad, LECTURAS_SUELTAS)
+
+    def leer():
+        dao = DaoCSV(ruta)
+        for _ in range(sueltas):
+            dao.leer()
+
+    def recorrer():
+        for _ in DaoCSV(ruta):
+            pass
+
+    def resumen():
+        DaoCSV(ruta).resumen()
+
+    yield "csv_leer", sueltas, leer
+    yield "csv_recorrer", cantidad, recorrer
+    yield "csv_resumen", cantidad, resumen
+
+def pruebas_sqlite(directorio, cantidad, instrumentar=False):
+    ruta = os.path.join(directorio, f"libro_{cantidad}.db")
+    crear_sqlite(ruta, cantidad)
+    dao = DaoSqlite(ruta, instrumentacion=Instrumentacion(umbral_lenta=None) if instrumentar else None)
+    aleatorio = random.Random(cantidad)
+    ids = [aleatorio.randint(1, cantidad) for _ in range(min(cantidad, LECTURAS_SUELTAS))]
+
+    def leer():
+        for id in ids:
+            dao.leer(id)
+
+    def leer_todo():
+        dao.leerTodo()
+
+    def gasto_mayor():
+        dao.leer_gasto_mayor(200)
+
+    def resumen():
+        dao.resumen()
+
+    def saldo():
+        for _ in range(100):
+            dao.saldo()
+            dao.resumen_mes(2024, 12)
+
+    def por_categoria():
+        dao.leer_columnar().por_categoria()
+
+    def paginas_saltando(orden, descendente):
+        # cada pagina contando filas desde el principio, como un salto de la barra
+        def funcion():
+            for inicio in range(0, cantidad, max(cantidad // PAGINAS, 1)):
+                dao.leer_pagina(inicio, TAM_PAGINA, orden, descendente)
+        return funcion
+
+    def paginas_seguidas(orden, descendente):
+        # cada pagina a partir de la anterior, como al bajar por la lista
+        def funcion():
+            pagina = dao.leer_pagina(cantidad // 2, TAM_PAGINA, orden, descendente)
+            for _ in range(PAGINAS):
+                if not pagina:
+                    break
+                pagina = dao.leer_pagina(0, TAM_PAGINA, orden, descendente, despues_de=pagina[-1])
+        return funcion
+
+    # lo que escribe va al final para no cambiar el libro de las demas
+    movimientos = list(generar_movimientos(min(cantidad, ESCRITURAS_SUELTAS), semilla=1))
+
+    def grabar():
+        for movimiento in movimientos:
+            movimiento.id = None
+            dao.grabar(movimiento)
+
+    try:
+        yield "sqlite_leer", len(ids), leer
+        yield "sqlite_leerTodo", cantidad, leer_todo
+        yield "sqlite_leer_gasto_mayor", cantidad, gasto_mayor
+        yield "sqlite_resumen", cantidad, resumen
+        yield "columnar_por_categoria", cantidad, por_categoria
+        yield "sqlite_saldo_y_mes", 100, saldo
+        for orden in COLUMNAS_ORDEN:
+            for descendente in (False, True):
+                sufijo = f"{orden}_desc" if descendente else orden
+                yield f"sqlite_pagina_{sufijo}", PAGINAS, paginas_saltando(orden, descendente)
+                yield f"sqlite_siguiente_{sufijo}", PAGINAS, paginas_seguidas(orden, descendente)
+        yield "sqlite_grabar", len(movimientos), grabar
+    finally:
+        dao.close()
+
+def pruebas_importar(directorio, cantidad):
+    # con los indices, el resumen y la busqueda que mantiene cada alta
+    ruta_csv = os.path.join(directorio, f"importar_{cantidad}.csv")
+    ruta = os.path.join(directorio, f"importado_{cantidad}.db")
+    crear_csv(ruta_csv, cantidad)
+
+    def importar():
+        # cada repeticion empieza con la base de datos vacia
+        for nombre in os.listdir(directorio):
+            if nombre.startswith(os.path.basename(ruta)):
+                os.remove(os.path.join(directorio, nombre))
+        with DaoSqlite(ruta) as dao:
+            importar_csv(ruta_csv, dao)
+
+    yield "sqlite_importar_csv", cantidad, importar
+
+def pruebas_binario(directorio, cantidad):
+    ruta = os.path.join(directorio, f"libro_{cantidad}.kbin")
+    movimientos = list(generar_movimientos(cantidad))
+    aleatorio = random.Random(cantidad)
+    ids = [aleatorio.randint(1, cantidad) for _ in range(min(cantidad, LECTURAS_SUELTAS))]
+
+    def grabar_lote():
+        # cada repeticion empieza con el fichero vacio
+        for nombre in os.listdir(directorio):
+            if nombre.startswith(os.path.basename(ruta)):
+                os.remove(os.path.join(directorio, nombre))
+        for movimiento in movimientos:
+            movimiento.id = None
+        with DaoBinario(ruta) as dao:
+            dao.grabar_lote(movimientos)
+
+    def leer():
+        for id in ids:
+            dao.leer(id)
+
+    def leer_todo():
+        dao.leerTodo()
+
+    def por_categoria():
+        dao.leer_columnar().por_categoria()
+
+    yield "binario_grabar_lote", cantidad, grabar_lote
+    dao = DaoBinario(ruta)
+    try:
+        yield "binario_leer", len(ids), leer
+        yield "binario_leerTodo", cantidad, leer_todo
+        yield "binario_por_categoria", cantidad, por_categoria
+    finally:
+        dao.close()
+
+def medir(tamanos, repeticiones, instrumentar=False, aviso=print):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for cantidad in tamanos:
+            tamano = resultados[str(cantidad)] = {}
+            for grupo in (pruebas_modelos(cantidad), pruebas_csv(directorio, cantidad),
+                          pruebas_sqlite(directorio, cantidad, instrumentar),
+                          pruebas_importar(directorio, cantidad),
+                          pruebas_binario(directorio, cantidad)):
+                for nombre, operaciones, funcion in grupo:
+                    segundos = cronometrar(funcion, repeticiones)
+                    tamano[nombre] = {"segundos": segundos, "operaciones": operaciones}
+                    aviso(f"{cantidad:>10} {nombre:<32} {segundos * 1000:>12.2f} ms")
+    return resultados
+
+def entorno():
+    numpy = cargar_numpy()
+    return {"python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": numpy.__version__ if numpy is not None else None,
+            "plataforma": platform.platform()}
+
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    """
+    Lista de (tamano, prueba, segundos_base, segundos, cambio) para las
+    pruebas que estan en los dos resultados y han empeorado mas de
+    tolerancia. cambio es la proporcion sobre la base (0.3 es un 30% mas).
+    """
+    regresiones = []
+    for tamano, pruebas in resultados.items():
+        for nombre, medida in pruebas.items():
+            anterior = base.get(tamano, {}).get(nombre)
+            if not anterior or not anterior["segundos"]:
+                continue
+            cambio = medida["segundos"] / anterior["segundos"] - 1
+            if cambio > tolerancia:
+                regresiones.append((tamano, nombre, anterior["segundos"], medida["segundos"], cambio))
+    return regresiones
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    parser.add_argument("--base", help="fichero JSON con resultados anteriores para comparar")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="medir DaoSqlite con Instrumentacion, para ver lo que cuesta")
+    opciones = parser.parse_args(argumentos)
+
+    informe = {"entorno": entorno(), "resultados": medir(opciones.tamanos, opciones.repeticiones, opciones.instrumentar)}
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2)
+
+    if opciones.base:
+        with open(opciones.base, encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+        regresiones = comparar(informe["resultados"], base, opciones.tolerancia)
+        for tamano, nombre, anterior, actual, cambio in regresiones:
+            print(f"REGRESION {tamano:>10} {nombre:<32} {anterior * 1000:.2f} ms -> {actual * 1000:.2f} ms (+{cambio:.0%})")
+        if regresiones:
+            return 1
+        print("Sin regresiones respecto a la base")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
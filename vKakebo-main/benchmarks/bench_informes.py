@@ -0,0 +1,68 @@
+"""
+Tiempo de kakebo.informes.informe segun el numero de procesos sobre un
+libro sintetico de varios años, con la aceleracion respecto a hacerlo en
+serie. Como referencia da tambien DaoSqlite.resumen(), que agrega en SQLite.
+
+    python -m benchmarks.bench_informes
+    python -m benchmarks.bench_informes --movimientos 2000000 --procesos 1 2 4 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from kakebo.informes import informe
+from kakebo.modelos import DaoSqlite
+from benchmarks.libro import crear_sqlite
+
+MOVIMIENTOS = 500_000
+REPETICIONES = 3
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+def main(argumentos=None):
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movimientos", type=int, default=MOVIMIENTOS)
+    parser.add_argument("--procesos", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cpus} | ({8} if cpus >= 8 else set())))
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    opciones = parser.parse_args(argumentos)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "informes.db")
+        inicio = time.perf_counter()
+        crear_sqlite(ruta, opciones.movimientos)
+        print(f"{opciones.movimientos} movimientos grabados en {time.perf_counter() - inicio:.1f} s, {cpus} CPUs")
+
+        with DaoSqlite(ruta) as dao:
+            resultados["sqlite"] = cronometrar(dao.resumen, opciones.repeticiones)
+        print(f"{'resumen() en SQLite':<22} {resultados['sqlite'] * 1000:>10.1f} ms")
+
+        for procesos in opciones.procesos:
+            segundos = cronometrar(lambda: informe(ruta, procesos=procesos), opciones.repeticiones)
+            resultados[procesos] = segundos
+            serie = resultados.get(1)
+            aceleracion = f"x{serie / segundos:.2f}" if serie else ""
+            aviso = "  (mas procesos que CPUs)" if procesos > cpus else ""
+            print(f"{f'{procesos} procesos':<22} {segundos * 1000:>10.1f} ms {aceleracion:>7}{aviso}")
+
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8") as f:
+            json.dump({"movimientos": opciones.movimientos, "cpus": cpus,
+                       "resultados": {str(clave): valor for clave, valor in resultados.items()}}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
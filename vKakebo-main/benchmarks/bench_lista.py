@@ -0,0 +1,79 @@
+"""
+Tiempo de pintar ListaMovimientos segun crece la tabla. Como solo existen
+las filas visibles, el tiempo debe ser el mismo con mil que con cien mil
+movimientos, y ordenando por cualquier columna en los dos sentidos.
+
+    python -m benchmarks.bench_lista
+"""
+import os
+import random
+import tempfile
+import time
+import tkinter as tk
+
+from kakebo import WIDTH
+from kakebo.modelos import DaoSqlite, COLUMNAS_ORDEN
+from kakebo.vistas import ListaMovimientos
+from benchmarks.libro import crear_sqlite
+
+TAMANOS = (1_000, 10_000, 100_000)
+REPETICIONES = 20
+
+def medir(root, ruta, orden="fecha", descendente=False):
+    dao = DaoSqlite(ruta)
+    lista = ListaMovimientos(root, dao, WIDTH)
+    lista.orden = orden
+    lista.descendente = descendente
+    lista.pack()
+
+    inicio = time.perf_counter()
+    lista.refrescar()
+    root.update()
+    primer_pintado = time.perf_counter() - inicio
+
+    aleatorio = random.Random(0)
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        lista.ir_a(aleatorio.randrange(lista.total))
+        root.update()
+    salto = (time.perf_counter() - inicio) / REPETICIONES
+
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        lista.mover(1)
+        root.update()
+    linea = (time.perf_counter() - inicio) / REPETICIONES
+
+    # bajar de pagina en pagina lee cada una a partir de la anterior
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        lista.mover(lista.tam_pagina)
+        root.update()
+    pagina = (time.perf_counter() - inicio) / REPETICIONES
+
+    lista.destroy()
+    dao.close()
+    return primer_pintado, salto, linea, pagina
+
+def main():
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        print(f"No hay pantalla disponible: {error}")
+        return
+
+    print(f"{'movimientos':>12} {'orden':>15} {'pintar (ms)':>12} {'saltar (ms)':>12} {'linea (ms)':>12} {'pagina (ms)':>12}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for movimientos in TAMANOS:
+            ruta = os.path.join(directorio, f"lista_{movimientos}.db")
+            crear_sqlite(ruta, movimientos)
+            for orden in COLUMNAS_ORDEN:
+                for descendente in (False, True):
+                    primer_pintado, salto, linea, pagina = medir(root, ruta, orden, descendente)
+                    nombre = f"{orden} desc" if descendente else orden
+                    print(f"{movimientos:>12} {nombre:>15} {primer_pintado * 1000:>12.2f} "
+                          f"{salto * 1000:>12.2f} {linea * 1000:>12.2f} {pagina * 1000:>12.2f}")
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
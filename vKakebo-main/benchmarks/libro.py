@@ -0,0 +1,70 @@
+"""
+Libros de movimientos sinteticos para los benchmarks. Con la misma semilla
+y el mismo tamaño siempre salen los mismos movimientos.
+
+El reparto imita un kakebo de verdad: una nomina al mes y algun ingreso
+suelto, muchos gastos pequeños de necesidad, menos de ocio y cultura y
+pocos extras pero de mas importe.
+"""
+import csv
+import random
+from datetime import date
+
+from kakebo.modelos import DaoSqlite, CABECERA_CSV, CODIFICACION_CSV, Ingreso, Gasto, CategoriaGastos
+
+INICIO = date(2015, 1, 1)
+FIN = date(2024, 12, 31)
+
+# categoria, peso, importe medio
+REPARTO_GASTOS = (
+    (CategoriaGastos.NECESIDAD, 55, 35),
+    (CategoriaGastos.OCIO_VICIO, 20, 25),
+    (CategoriaGastos.CULTURA, 10, 20),
+    (CategoriaGastos.EXTRAS, 15, 120),
+)
+PROPORCION_INGRESOS = 0.05
+
+CONCEPTOS = {
+    CategoriaGastos.NECESIDAD: ("Compra semanal", "Recibo de la luz", "Farmacia", "Gasolina", "Alquiler"),
+    CategoriaGastos.OCIO_VICIO: ("Cena con amigos", "Cervezas", "Suscripcion streaming", "Cafe"),
+    CategoriaGastos.CULTURA: ("Libro", "Entradas de cine", "Museo", "Concierto"),
+    CategoriaGastos.EXTRAS: ("Reparacion del coche", "Regalo", "Viaje", "Electrodomestico"),
+}
+CONCEPTOS_INGRESO = ("Nomina", "Venta de segunda mano", "Devolucion", "Regalo recibido")
+
+def generar_movimientos(cantidad, semilla=0, desde=INICIO, hasta=FIN):
+    """
+    Genera cantidad movimientos ordenados por fecha entre desde y hasta.
+    """
+    aleatorio = random.Random(semilla)
+    inicio = desde.toordinal()
+    dias = hasta.toordinal() - inicio + 1
+    categorias = [categoria for categoria, _, _ in REPARTO_GASTOS]
+    pesos = [peso for _, peso, _ in REPARTO_GASTOS]
+    medias = {categoria: media for categoria, _, media in REPARTO_GASTOS}
+
+    # las fechas se sortean primero para que el libro vaya en orden, como se apunta
+    ordinales = sorted(inicio + aleatorio.randrange(dias) for _ in range(cantidad))
+    for numero, ordinal in enumerate(ordinales):
+        fecha = date.fromordinal(ordinal)
+        if aleatorio.random() < PROPORCION_INGRESOS:
+            concepto = aleatorio.choice(CONCEPTOS_INGRESO)
+            importe = round(aleatorio.uniform(1200, 2500) if concepto == "Nomina" else aleatorio.uniform(10, 300), 2)
+            yield Ingreso(f"{concepto} {numero}", fecha, importe)
+        else:
+            categoria = aleatorio.choices(categorias, pesos)[0]
+            importe = round(aleatorio.expovariate(1 / medias[categoria]) + 0.5, 2)
+            yield Gasto(f"{aleatorio.choice(CONCEPTOS[categoria])} {numero}", fecha, importe, categoria)
+
+def crear_csv(ruta, cantidad, semilla=0):
+    # mismo formato que DaoCSV.grabar pero sin abrir el fichero por cada fila
+    with open(ruta, "w", newline="", encoding=CODIFICACION_CSV) as f:
+        f.write(CABECERA_CSV)
+        writer = csv.writer(f, delimiter=",", quotechar='"')
+        for movimiento in generar_movimientos(cantidad, semilla):
+            categoria = movimiento.categoria.value if isinstance(movimiento, Gasto) else ""
+            writer.writerow((movimiento.concepto, movimiento.fecha, movimiento.cantidad, categoria))
+
+def crear_sqlite(ruta, cantidad, semilla=0):
+    with DaoSqlite(ruta) as dao:
+        dao.grabar_lote(generar_movimientos(cantidad, semilla), tam_lote=5000)
@@ -1,9 +1,109 @@
+-- fecha es el ordinal del dia (date.toordinal) y cantidad va en centimos
 CREATE TABLE "movimientos" (
 	"id"	INTEGER,
 	"tipo_movimiento"	TEXT NOT NULL,
 	"concepto"	TEXT NOT NULL,
-	"fecha"	TEXT NOT NULL,
-	"cantidad"	REAL NOT NULL,
+	"fecha"	INTEGER NOT NULL,
+	"cantidad"	INTEGER NOT NULL,
 	"categoria"	INTEGER,
 	PRIMARY KEY("id" AUTOINCREMENT)
-);
\ No newline at end of file
+);
+
+CREATE INDEX "idx_movimientos_fecha" ON "movimientos" ("fecha");
+CREATE INDEX "idx_movimientos_tipo_cantidad" ON "movimientos" ("tipo_movimiento", "cantidad");
+CREATE INDEX "idx_movimientos_categoria_fecha" ON "movimientos" ("categoria", "fecha");
+-- para ordenar las paginas de la lista por cualquier columna
+CREATE INDEX "idx_movimientos_concepto" ON "movimientos" ("concepto");
+CREATE INDEX "idx_movimientos_cantidad" ON "movimientos" ("cantidad");
+CREATE INDEX "idx_movimientos_categoria" ON "movimientos" (ifnull("categoria", 0));
+-- filtrar por tipo ya en orden de fecha, sin ordenar lo que cumple el filtro
+CREATE INDEX "idx_movimientos_tipo_fecha" ON "movimientos" ("tipo_movimiento", "fecha");
+
+CREATE TABLE "importaciones" (
+	"origen"	TEXT NOT NULL,
+	"posicion"	INTEGER NOT NULL,
+	"filas"	INTEGER NOT NULL,
+	PRIMARY KEY("origen")
+);
+
+-- totales por mes y saldo, los mantienen los triggers de movimientos
+-- (los ingresos van con categoria 0)
+CREATE TABLE "resumen_mensual" (
+	"anio"	INTEGER NOT NULL,
+	"mes"	INTEGER NOT NULL,
+	"tipo_movimiento"	TEXT NOT NULL,
+	"categoria"	INTEGER NOT NULL,
+	"total"	INTEGER NOT NULL,
+	"n"	INTEGER NOT NULL,
+	PRIMARY KEY("anio", "mes", "tipo_movimiento", "categoria")
+) WITHOUT ROWID;
+
+CREATE TABLE "saldo" (
+	"id"	INTEGER NOT NULL CHECK("id" = 1),
+	"ingresos"	INTEGER NOT NULL,
+	"gastos"	INTEGER NOT NULL,
+	"n"	INTEGER NOT NULL,
+	PRIMARY KEY("id")
+);
+
+INSERT INTO "saldo" ("id", "ingresos", "gastos", "n") VALUES (1, 0, 0, 0);
+
+CREATE TRIGGER resumen_alta AFTER INSERT ON movimientos
+BEGIN
+	INSERT OR IGNORE INTO resumen_mensual (anio, mes, tipo_movimiento, categoria, total, n)
+		VALUES (CAST(strftime('%Y', NEW.fecha + 1721424.5) AS INTEGER), CAST(strftime('%m', NEW.fecha + 1721424.5) AS INTEGER), NEW.tipo_movimiento, coalesce(NEW.categoria, 0), 0, 0);
+	UPDATE resumen_mensual SET total = total + NEW.cantidad, n = n + 1 WHERE anio = CAST(strftime('%Y', NEW.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', NEW.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = NEW.tipo_movimiento AND categoria = coalesce(NEW.categoria, 0);
+	UPDATE saldo
+		SET ingresos = ingresos + CASE NEW.tipo_movimiento WHEN 'I' THEN NEW.cantidad ELSE 0 END,
+		    gastos = gastos + CASE NEW.tipo_movimiento WHEN 'G' THEN NEW.cantidad ELSE 0 END,
+		    n = n + 1;
+END;
+
+CREATE TRIGGER resumen_baja AFTER DELETE ON movimientos
+BEGIN
+	UPDATE resumen_mensual SET total = total - OLD.cantidad, n = n - 1 WHERE anio = CAST(strftime('%Y', OLD.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', OLD.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = OLD.tipo_movimiento AND categoria = coalesce(OLD.categoria, 0);
+	DELETE FROM resumen_mensual WHERE anio = CAST(strftime('%Y', OLD.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', OLD.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = OLD.tipo_movimiento AND categoria = coalesce(OLD.categoria, 0) AND n = 0;
+	UPDATE saldo
+		SET ingresos = ingresos - CASE OLD.tipo_movimiento WHEN 'I' THEN OLD.cantidad ELSE 0 END,
+		    gastos = gastos - CASE OLD.tipo_movimiento WHEN 'G' THEN OLD.cantidad ELSE 0 END,
+		    n = n - 1;
+END;
+
+CREATE TRIGGER resumen_cambio
+AFTER UPDATE OF tipo_movimiento, fecha, cantidad, categoria ON movimientos
+BEGIN
+	UPDATE resumen_mensual SET total = total - OLD.cantidad, n = n - 1 WHERE anio = CAST(strftime('%Y', OLD.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', OLD.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = OLD.tipo_movimiento AND categoria = coalesce(OLD.categoria, 0);
+	DELETE FROM resumen_mensual WHERE anio = CAST(strftime('%Y', OLD.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', OLD.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = OLD.tipo_movimiento AND categoria = coalesce(OLD.categoria, 0) AND n = 0;
+	UPDATE saldo
+		SET ingresos = ingresos - CASE OLD.tipo_movimiento WHEN 'I' THEN OLD.cantidad ELSE 0 END,
+		    gastos = gastos - CASE OLD.tipo_movimiento WHEN 'G' THEN OLD.cantidad ELSE 0 END,
+		    n = n - 1;
+	INSERT OR IGNORE INTO resumen_mensual (anio, mes, tipo_movimiento, categoria, total, n)
+		VALUES (CAST(strftime('%Y', NEW.fecha + 1721424.5) AS INTEGER), CAST(strftime('%m', NEW.fecha + 1721424.5) AS INTEGER), NEW.tipo_movimiento, coalesce(NEW.categoria, 0), 0, 0);
+	UPDATE resumen_mensual SET total = total + NEW.cantidad, n = n + 1 WHERE anio = CAST(strftime('%Y', NEW.fecha + 1721424.5) AS INTEGER) AND mes = CAST(strftime('%m', NEW.fecha + 1721424.5) AS INTEGER) AND tipo_movimiento = NEW.tipo_movimiento AND categoria = coalesce(NEW.categoria, 0);
+	UPDATE saldo
+		SET ingresos = ingresos + CASE NEW.tipo_movimiento WHEN 'I' THEN NEW.cantidad ELSE 0 END,
+		    gastos = gastos + CASE NEW.tipo_movimiento WHEN 'G' THEN NEW.cantidad ELSE 0 END,
+		    n = n + 1;
+END;
+
+-- busqueda de texto en los conceptos (FTS5), sin copia del texto
+CREATE VIRTUAL TABLE movimientos_fts USING fts5(concepto, content='movimientos', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+
+CREATE TRIGGER movimientos_fts_alta AFTER INSERT ON movimientos
+BEGIN
+	INSERT INTO movimientos_fts (rowid, concepto) VALUES (NEW.id, NEW.concepto);
+END;
+
+CREATE TRIGGER movimientos_fts_baja AFTER DELETE ON movimientos
+BEGIN
+	INSERT INTO movimientos_fts (movimientos_fts, rowid, concepto) VALUES ('delete', OLD.id, OLD.concepto);
+END;
+
+CREATE TRIGGER movimientos_fts_cambio AFTER UPDATE OF concepto ON movimientos
+BEGIN
+	INSERT INTO movimientos_fts (movimientos_fts, rowid, concepto) VALUES ('delete', OLD.id, OLD.concepto);
+	INSERT INTO movimientos_fts (rowid, concepto) VALUES (NEW.id, NEW.concepto);
+END;
+
+PRAGMA user_version = 8;
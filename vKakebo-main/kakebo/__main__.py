@@ -0,0 +1,263 @@
+"""
+Linea de ordenes de kakebo para trabajar con la base de datos sin la
+ventana: importar y exportar, informes, busquedas y mantenimiento.
+
+    python -m kakebo importar movimientos.csv
+    python -m kakebo exportar --formato json --desde 2024-01-01 > 2024.json
+    python -m kakebo informe --agrupacion anio
+    python -m kakebo buscar farmacia --limite 10
+    python -m kakebo compactar
+
+Solo usa kakebo.modelos y kakebo.informes: no importa tkinter, asi que arranca en
+milisegundos y funciona en servidores sin pantalla. kakebo.informes (y con el
+concurrent.futures y multiprocessing) solo se importa para informe --procesos.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import timedelta
+
+from kakebo import PATH_DATABASE
+from kakebo.modelos import (DaoSqlite, DaoBinario, Ingreso, Gasto, CategoriaGastos, MARCA_BINARIO,
+                            ORDENES_BUSQUEDA, fecha_iso, importar_csv)
+
+COLUMNAS_MOVIMIENTO = ("id", "tipo", "concepto", "fecha", "cantidad", "categoria")
+COLUMNAS_INFORME = (("periodo", "ingresos") + tuple(cat.name.lower() for cat in CategoriaGastos)
+                    + ("gastos", "ahorro", "movimientos"))
+TIPOS = {"ingreso": Ingreso, "gasto": Gasto}
+# sin tildes en la linea de ordenes
+AGRUPACIONES = {"mes": "mes", "semana": "semana", "anio": "año"}
+TAM_LOTE = 5000
+
+def fecha(texto):
+    try:
+        return fecha_iso(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha no valida, se espera AAAA-MM-DD: {texto}")
+
+def categoria(texto):
+    try:
+        return CategoriaGastos[texto.upper()]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"categoria desconocida: {texto}")
+
+def fila_movimiento(movimiento):
+    # el csv lleva las columnas de DaoCSV (y alguna mas), se puede volver a importar
+    es_gasto = isinstance(movimiento, Gasto)
+    return {"id": movimiento.id,
+            "tipo": "G" if es_gasto else "I",
+            "concepto": movimiento.concepto,
+            "fecha": movimiento.fecha.isoformat(),
+            "cantidad": movimiento.cantidad,
+            "categoria": movimiento.categoria.value if es_gasto else None}
+
+def fila_informe(totales):
+    fila = {"periodo": totales["periodo"], "ingresos": round(totales["ingresos"], 2)}
+    for cat, cantidad in totales["gastos"].items():
+        fila[cat.name.lower()] = round(cantidad, 2)
+    fila["gastos"] = round(sum(totales["gastos"].values()), 2)
+    fila["ahorro"] = round(totales["ahorro"], 2)
+    fila["movimientos"] = totales["movimientos"]
+    return fila
+
+def escribir(filas, columnas, formato, salida):
+    """
+    Escribe las filas (diccionarios) segun van llegando, en csv con
+    cabecera o como una lista JSON. Devuelve cuantas ha escrito.
+    """
+    escritas = 0
+    if formato == "csv":
+        writer = csv.DictWriter(salida, columnas, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        for fila in filas:
+            writer.writerow(fila)
+            escritas += 1
+    else:
+        salida.write("[")
+        for fila in filas:
+            salida.write(",\n" if escritas else "\n")
+            salida.write(json.dumps(fila, ensure_ascii=False))
+            escritas += 1
+        salida.write("\n]\n" if escritas else "]\n")
+    return escritas
+
+def volcar(filas, columnas, opciones):
+    # a un fichero se escribe en uno temporal que solo sustituye al destino al terminar
+    if opciones.salida in (None, "-"):
+        return escribir(filas, columnas, opciones.formato, sys.stdout)
+    temporal = f"{opciones.salida}.tmp"
+    try:
+        with open(temporal, "w", newline="", encoding="utf-8") as f:
+            escritas = escribir(filas, columnas, opciones.formato, f)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    os.replace(temporal, opciones.salida)
+    return escritas
+
+def movimientos(dao, opciones, tam_lote=TAM_LOTE):
+    # paginas de filtrar una detras de otra, cada una empieza donde acabo la anterior
+    filtros = {"desde": opciones.desde, "hasta": opciones.hasta,
+               "tipo": TIPOS.get(opciones.tipo), "categorias": opciones.categoria}
+    pagina = dao.filtrar(limite=tam_lote, **filtros)
+    while pagina:
+        yield from pagina
+        if len(pagina) < tam_lote:
+            return
+        ultimo = pagina[-1]
+        pagina = dao.filtrar(limite=tam_lote, despues_de=(ultimo.fecha, ultimo.id), **filtros)
+
+def meses_enteros(desde, hasta):
+    return (desde is None or desde.day == 1) and (hasta is None or (hasta + timedelta(days=1)).day == 1)
+
+def abrir(opciones, crear=False):
+    if not crear and not os.path.exists(opciones.db):
+        raise FileNotFoundError(f"No existe la base de datos {opciones.db}")
+    return DaoSqlite(opciones.db)
+
+def orden_importar(opciones):
+    def progreso(filas, leidos, total):
+        print(f"{filas} movimientos, {leidos * 100 // max(total, 1)}%", file=sys.stderr)
+
+    with abrir(opciones, crear=True) as dao:
+        importadas = importar_csv(opciones.csv, dao, opciones.lote,
+                                  progreso if opciones.progreso else None,
+                                  reanudar=not opciones.desde_cero)
+    print(f"{importadas} movimientos importados")
+
+def orden_exportar(opciones):
+    with abrir(opciones) as dao:
+        escritas = volcar(map(fila_movimiento, movimientos(dao, opciones, opciones.lote)),
+                          COLUMNAS_MOVIMIENTO, opciones)
+    if opciones.salida not in (None, "-"):
+        print(f"{escritas} movimientos exportados")
+
+def orden_informe(opciones):
+    if opciones.procesos is not None:
+        from kakebo.informes import informe
+        abrir(opciones).close()
+        filas = informe(opciones.db, opciones.desde, opciones.hasta, AGRUPACIONES[opciones.agrupacion],
+                        opciones.procesos)
+        volcar(map(fila_informe, filas), COLUMNAS_INFORME, opciones)
+        return
+    with abrir(opciones) as dao:
+        if opciones.agrupacion == "mes" and meses_enteros(opciones.desde, opciones.hasta):
+            # meses enteros: de resumen_mensual, sin recorrer los movimientos
+            filas = dao.resumen_meses(opciones.desde, opciones.hasta)
+        else:
+            filas = dao.resumen(opciones.desde, opciones.hasta, AGRUPACIONES[opciones.agrupacion])
+        volcar(map(fila_informe, filas), COLUMNAS_INFORME, opciones)
+
+def orden_buscar(opciones):
+    with abrir(opciones) as dao:
+        encontrados = dao.buscar(opciones.texto, opciones.limite, opciones.desde, opciones.hasta,
+                                 TIPOS.get(opciones.tipo), opciones.categoria,
+                                 prefijo=not opciones.exacto, orden=opciones.orden)
+        volcar(map(fila_movimiento, encontrados), COLUMNAS_MOVIMIENTO, opciones)
+
+def orden_compactar(opciones):
+    if not os.path.exists(opciones.db):
+        raise FileNotFoundError(f"No existe la base de datos {opciones.db}")
+    with open(opciones.db, "rb") as f:
+        binario = f.read(len(MARCA_BINARIO)) == MARCA_BINARIO
+
+    if binario:
+        with DaoBinario(opciones.db) as dao:
+            print(f"{dao.compactar()} movimientos borrados quitados")
+    else:
+        antes = os.path.getsize(opciones.db)
+        with DaoSqlite(opciones.db) as dao:
+            dao.compactar()
+        print(f"{antes} -> {os.path.getsize(opciones.db)} bytes")
+
+def orden_comprobar(opciones):
+    with abrir(opciones) as dao:
+        diferencias = dao.comprobar_resumen()
+        for clave, guardado, calculado in diferencias:
+            print(f"{clave}: guardado {guardado}, calculado {calculado}")
+        if diferencias and opciones.reparar:
+            dao.reconstruir_resumen()
+            print("resumen reconstruido")
+            return 0
+    if diferencias:
+        return 1
+    print("el resumen cuadra")
+    return 0
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="python -m kakebo", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=PATH_DATABASE, help=f"base de datos (por defecto {PATH_DATABASE})")
+    ordenes = parser.add_subparsers(dest="orden", required=True)
+
+    def salida(orden):
+        orden.add_argument("--formato", choices=("csv", "json"), default="csv")
+        orden.add_argument("-o", "--salida", help="fichero de salida, por defecto la salida estandar")
+
+    def filtros(orden):
+        orden.add_argument("--desde", type=fecha)
+        orden.add_argument("--hasta", type=fecha)
+        orden.add_argument("--tipo", choices=tuple(TIPOS))
+        orden.add_argument("--categoria", type=categoria, action="append",
+                           help="necesidad, cultura, ocio_vicio o extras; se puede repetir")
+
+    orden = ordenes.add_parser("importar", help="importa un csv de DaoCSV, por lotes y reanudable")
+    orden.add_argument("csv")
+    orden.add_argument("--lote", type=int, default=TAM_LOTE)
+    orden.add_argument("--desde-cero", action="store_true",
+                       help="olvida el punto de control y empieza por la primera fila")
+    orden.add_argument("--progreso", action="store_true", help="avance por la salida de errores")
+    orden.set_defaults(funcion=orden_importar)
+
+    orden = ordenes.add_parser("exportar", help="movimientos ordenados por fecha")
+    salida(orden)
+    filtros(orden)
+    orden.add_argument("--lote", type=int, default=TAM_LOTE)
+    orden.set_defaults(funcion=orden_exportar)
+
+    orden = ordenes.add_parser("informe", help="hoja Kakebo por periodos")
+    salida(orden)
+    orden.add_argument("--desde", type=fecha)
+    orden.add_argument("--hasta", type=fecha)
+    orden.add_argument("--agrupacion", choices=tuple(AGRUPACIONES), default="mes")
+    orden.add_argument("--procesos", type=int,
+                       help="recorre los movimientos repartiendo los años entre procesos (0: tantos como CPUs)")
+    orden.set_defaults(funcion=orden_informe)
+
+    orden = ordenes.add_parser("buscar", help="busca palabras en los conceptos")
+    salida(orden)
+    filtros(orden)
+    orden.add_argument("texto")
+    orden.add_argument("--limite", type=int, default=50)
+    orden.add_argument("--orden", choices=tuple(ORDENES_BUSQUEDA), default="recientes",
+                       help="recientes primero (por defecto, el rapido) o rank por relevancia")
+    orden.add_argument("--exacto", action="store_true", help="palabras completas, no como prefijo")
+    orden.set_defaults(funcion=orden_buscar)
+
+    orden = ordenes.add_parser("compactar", help="VACUUM de SQLite o compactar un fichero de DaoBinario")
+    orden.set_defaults(funcion=orden_compactar)
+
+    orden = ordenes.add_parser("comprobar", help="compara el resumen mensual con los movimientos")
+    orden.add_argument("--reparar", action="store_true", help="si no cuadra, lo reconstruye")
+    orden.set_defaults(funcion=orden_comprobar)
+
+    return parser
+
+def main(argumentos=None):
+    parser = crear_parser()
+    opciones = parser.parse_args(argumentos)
+    try:
+        return opciones.funcion(opciones) or 0
+    except BrokenPipeError:
+        # la salida se ha cerrado antes de tiempo (| head): no es un error
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except (OSError, ValueError, sqlite3.Error) as error:
+        print(f"{parser.prog}: error: {error}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,280 @@
+import queue
+import threading
+import time
 import tkinter as tk
-from kakebo.vistas import FormMovimiento
+from tkinter import messagebox
+from kakebo.vistas import FormMovimiento, ListaMovimientos
 from kakebo.modelos import DaoSqlite
-from kakebo import PATH_DATABASE
+from kakebo import PATH_DATABASE, WIDTH
+
+INTERVALO_REVISION = 100 # ms entre revisiones de escrituras terminadas
+INTERVALO_APERTURA = 10 # ms entre revisiones mientras se abre la base de datos
+INTERVALO_CAMBIOS = 1.0 # s entre comprobaciones de cambios de otros procesos
+
+class EscritorDiferido:
+    """
+    Graba los movimientos en un hilo propio para que la ventana no espere al
+    disco. Lo que se acumula en la cola mientras se graba el lote anterior
+    se graba junto en una sola transaccion; si falla se graban de uno en
+    uno, para que solo se pierdan los que dan error. Los resultados se
+    recogen con terminados() desde el hilo de Tk.
+    Mientras no hay nada que grabar comprueba si otro proceso ha cambiado la
+    base de datos, desde la misma conexion con la que graba.
+    """
+    FIN = object()
+
+    def __init__(self, dao, tam_cola=1000, tam_lote=500, intervalo_cambios=INTERVALO_CAMBIOS):
+        self.dao = dao
+        self.tam_lote = tam_lote
+        self.intervalo_cambios = intervalo_cambios
+        self.pendientes = queue.Queue(maxsize=tam_cola)
+        self.resultados = queue.Queue()
+        self.hilo = threading.Thread(target=self.__trabajar, name="escritor-kakebo", daemon=True)
+        self.hilo.start()
+
+    def grabar(self, movimiento):
+        # si la cola esta llena espera a que el hilo haga sitio
+        self.pendientes.put(movimiento)
+
+    def terminados(self):
+        """
+        Lista de (lote, error) grabados desde la ultima llamada; error es
+        None si el lote se grabo bien.
+        """
+        terminados = []
+        while True:
+            try:
+                terminados.append(self.resultados.get_nowait())
+            except queue.Empty:
+                return terminados
+
+    def cerrar(self):
+        """
+        Espera a que se grabe todo lo pendiente y termina el hilo.
+        """
+        if self.hilo.is_alive():
+            self.pendientes.put(self.FIN)
+            self.hilo.join()
+
+    def __trabajar(self):
+        fin = False
+        self.dao.comprobar_cambios()
+        while not fin:
+            lote = []
+            try:
+                movimiento = self.pendientes.get(timeout=self.intervalo_cambios)
+            except queue.Empty:
+                self.dao.comprobar_cambios()
+                continue
+            while movimiento is not self.FIN:
+                lote.append(movimiento)
+                if len(lote) == self.tam_lote:
+                    break
+                try:
+                    movimiento = self.pendientes.get_nowait()
+                except queue.Empty:
+                    break
+            fin = movimiento is self.FIN
+
+            if lote:
+                self.__grabar(lote)
+
+    def __grabar(self, lote):
+        try:
+            self.dao.grabar_lote(lote)
+            self.resultados.put((lote, None))
+            return
+        except Exception:
+            # el lote se ha deshecho entero, se busca el que falla
+            pass
+        grabados = []
+        for movimiento in lote:
+            try:
+                self.dao.grabar_lote([movimiento])
+                grabados.append(movimiento)
+            except Exception as error:
+                self.resultados.put(([movimiento], error))
+        if grabados:
+            self.resultados.put((grabados, None))
+
+class TareaDiferida:
+    """
+    Ejecuta funcion en un hilo propio. El resultado, o la excepcion si
+    falla, se recoge con terminada() desde el hilo de Tk sin esperar.
+    """
+    def __init__(self, funcion, *argumentos, nombre="tarea-kakebo"):
+        self.resultado = queue.Queue(maxsize=1)
+        self.hilo = threading.Thread(target=self.__trabajar, args=(funcion, argumentos), name=nombre, daemon=True)
+        self.hilo.start()
+
+    def terminada(self):
+        """
+        (resultado, error) la primera vez que se llama despues de acabar,
+        None mientras sigue trabajando o si ya se recogio.
+        """
+        try:
+            return self.resultado.get_nowait()
+        except queue.Empty:
+            return None
+
+    def esperar(self):
+        self.hilo.join()
+
+    def __trabajar(self, funcion, argumentos):
+        try:
+            self.resultado.put((funcion(*argumentos), None))
+        except Exception as error:
+            self.resultado.put((None, error))
+
+def cerrar_apertura(terminada, pendientes):
+    """
+    Para cerrar sin haber recogido la apertura de la base de datos
+    (terminada es lo que devuelve TareaDiferida.terminada()): graba los
+    movimientos pendientes y cierra el dao. Devuelve el aviso para el
+    usuario si algo se ha quedado sin grabar, o None.
+    """
+    if terminada is None:
+        return None
+    resultado, error = terminada
+    if error is not None:
+        if pendientes:
+            return (f"No se ha podido abrir la base de datos: {error}\n"
+                    f"{len(pendientes)} movimientos se han quedado sin grabar.")
+        return None
+
+    dao = resultado[0]
+    try:
+        if pendientes:
+            dao.grabar_lote(pendientes)
+    except Exception as error:
+        return f"No se han podido grabar {len(pendientes)} movimientos: {error}"
+    finally:
+        dao.close()
+    return None
 
 class Controller(tk.Tk):
-    def __init__(self):
+    """
+    Ventana principal. Arranca en este orden para que se vea cuanto antes:
+    la lista vacia con un aviso, el formulario cuando la ventana ya esta
+    pintada y, en un hilo, abrir (y migrar si hace falta) la base de datos
+    y leer la primera pagina. En tiempos quedan los segundos desde el
+    inicio hasta el primer pintado y hasta que se puede usar.
+    """
+    def __init__(self, ruta=PATH_DATABASE):
+        self.inicio = time.perf_counter()
         super().__init__()
         self.title("Minikakebo")
+        self.tiempos = {}
+        self.dao = None
+        self.escritor = None
+        self.form = None
+        self.error_apertura = None
+        # lo que se graba antes de tener la base de datos abierta
+        self.pendientes = []
+        # los eventos llegan desde el hilo del escritor, se pasan a Tk por cola
+        self.eventos = queue.Queue()
+
+        self.lista = ListaMovimientos(self, None, WIDTH)
+        self.lista.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.lista.avisar("Abriendo movimientos...")
+        self.apertura = TareaDiferida(self.__abrir, ruta, nombre="apertura-kakebo")
+
+        self.bind("<Map>", self.__mapeada)
+        self.protocol("WM_DELETE_WINDOW", self.cerrar)
+        self.after(INTERVALO_APERTURA, self.revisarEscrituras)
+
+    def __abrir(self, ruta):
+        # en el hilo de apertura: conectar, migrar y leer lo que se ve primero
+        dao = DaoSqlite(ruta)
+        try:
+            return dao, self.lista.leer_inicio(dao)
+        except BaseException:
+            dao.close()
+            raise
+
+    def __mapeada(self, ev):
+        # <Map> de la ventana llega tambien por cada hijo que se muestra
+        if ev.widget is not self or "primer_pintado" in self.tiempos:
+            return
+        self.update_idletasks()
+        self.tiempos["primer_pintado"] = time.perf_counter() - self.inicio
+        self.after_idle(self.__construir_form)
+
+    def __construir_form(self):
         self.form = FormMovimiento(self, self.grabaMovimiento)
         self.form.pack()
-        self.dao = DaoSqlite(PATH_DATABASE)
+        self.__comprobar_interactiva()
+
+    def __abierta(self, resultado, error):
+        if error is not None:
+            self.error_apertura = error
+            self.lista.avisar("No se ha podido abrir la base de datos")
+            aviso = f"No se ha podido abrir la base de datos: {error}"
+            if self.pendientes:
+                aviso += f"\n{len(self.pendientes)} movimientos se han quedado sin grabar."
+            self.pendientes = []
+            messagebox.showerror("Minikakebo", aviso)
+            return
+        self.dao, inicio = resultado
+        self.dao.suscribir(self.eventos.put)
+        self.escritor = EscritorDiferido(self.dao)
+        for movimiento in self.pendientes:
+            self.escritor.grabar(movimiento)
+        self.pendientes = []
+        self.lista.mostrar(self.dao, *inicio)
+        self.__comprobar_interactiva()
+
+    def __comprobar_interactiva(self):
+        if self.form is not None and self.dao is not None and "interactivo" not in self.tiempos:
+            self.update_idletasks()
+            self.tiempos["interactivo"] = time.perf_counter() - self.inicio
         
     def grabaMovimiento(self, movimiento):
         print("Por aqui pasa")
         print(movimiento)
-        self.dao.grabar(movimiento)
-        # leer todos los movvimientos 
-        # enviar todos los movimientos al componente listaMovimientos
-        
\ No newline at end of file
+        if self.error_apertura is not None:
+            messagebox.showerror("Minikakebo", f"No se puede grabar, la base de datos no se ha podido abrir: {self.error_apertura}")
+        elif self.escritor is None:
+            self.pendientes.append(movimiento)
+        else:
+            self.escritor.grabar(movimiento)
+
+    def revisarEscrituras(self):
+        if self.escritor is None:
+            terminada = self.apertura.terminada()
+            if terminada is None:
+                self.after(INTERVALO_APERTURA, self.revisarEscrituras)
+                return
+            self.__abierta(*terminada)
+            if self.escritor is None:
+                # no se ha podido abrir, no hay escrituras que revisar
+                return
+
+        errores = [(lote, error) for lote, error in self.escritor.terminados() if error is not None]
+        if errores:
+            # un solo aviso aunque hayan fallado varios movimientos
+            fallidos = sum(len(lote) for lote, _ in errores)
+            messagebox.showerror("Minikakebo", f"No se han podido grabar {fallidos} movimientos: {errores[0][1]}")
+
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.eventos.get_nowait())
+            except queue.Empty:
+                break
+        self.lista.aplicar(eventos)
+        self.after(INTERVALO_REVISION, self.revisarEscrituras)
+
+    def cerrar(self):
+        # una migracion a medias no se corta: se espera a que acabe la apertura
+        self.apertura.esperar()
+        if self.dao is None:
+            aviso = cerrar_apertura(self.apertura.terminada(), self.pendientes)
+            self.pendientes = []
+            if aviso is not None:
+                messagebox.showerror("Minikakebo", aviso)
+        if self.escritor is not None:
+            self.escritor.cerrar()
+        if self.dao is not None:
+            self.dao.close()
+        self.destroy()
@@ -0,0 +1,104 @@
+"""
+Informes de muchos años repartidos entre procesos. Cada año (o cada mes
+si hay pocos años) es un tramo que un proceso recorre con su propia
+conexion de solo lectura, creando los movimientos y agrupandolos en
+Python; el proceso principal junta las sumas parciales en un
+ResumenKakebo.
+
+Para sumar sin mas, DaoSqlite.resumen() o resumen_meses() son mas rapidos:
+agregan en SQLite. Esto es para informes que necesitan cada Movimiento.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from kakebo.modelos import DaoSqlite, Gasto, ResumenKakebo, CATEGORIAS, FORMATOS_PERIODO, a_centimos
+
+TAM_LOTE = 5000
+
+def tramos(desde, hasta, minimo=1):
+    """
+    Parte las fechas de desde a hasta (incluidas) en años naturales, o en
+    meses si asi salen menos de minimo tramos. Las sumas de un periodo que
+    cae en dos tramos se juntan al final, el corte no cambia el resultado.
+    """
+    anios = [(max(desde, date(anio, 1, 1)), min(hasta, date(anio, 12, 31)))
+             for anio in range(desde.year, hasta.year + 1)]
+    if len(anios) >= minimo:
+        return anios
+    meses = []
+    inicio = desde
+    while inicio <= hasta:
+        siguiente = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        meses.append((inicio, min(hasta, siguiente - timedelta(days=1))))
+        inicio = siguiente
+    return meses
+
+def resumir_tramo(ruta, desde, hasta, agrupacion="mes", tam_lote=TAM_LOTE):
+    """
+    Sumas de los movimientos de desde a hasta por periodo y categoria, como
+    lista de (periodo, categoria, centimos, movimientos) con categoria 0
+    para los ingresos. Es lo que hace cada proceso; abre la base de datos en
+    solo lectura, asi que tiene que estar ya migrada.
+    """
+    formato = FORMATOS_PERIODO[agrupacion]
+    periodos = {}
+    grupos = {}
+    with DaoSqlite(ruta, solo_lectura=True) as dao:
+        for movimiento in dao.iterar(tam_lote, "fecha", desde, hasta):
+            # las fechas se repiten mucho y son el mismo objeto date
+            periodo = periodos.get(movimiento.fecha)
+            if periodo is None:
+                periodo = periodos[movimiento.fecha] = movimiento.fecha.strftime(formato)
+            clave = (periodo, movimiento.categoria.value if isinstance(movimiento, Gasto) else 0)
+            acumulado = grupos.get(clave)
+            if acumulado is None:
+                grupos[clave] = [a_centimos(movimiento.cantidad), 1]
+            else:
+                acumulado[0] += a_centimos(movimiento.cantidad)
+                acumulado[1] += 1
+    return [(periodo, categoria, total, movimientos)
+            for (periodo, categoria), (total, movimientos) in grupos.items()]
+
+def informe(ruta, desde=None, hasta=None, agrupacion="mes", procesos=None, tam_lote=TAM_LOTE):
+    """
+    Hoja Kakebo de cada periodo entre desde y hasta, con las mismas filas
+    que DaoSqlite.resumen(), repartiendo los años entre procesos. procesos
+    None usa tantos como CPUs; con 1 (o si no se pueden crear procesos) se
+    hace todo en este, en serie.
+    """
+    if agrupacion not in FORMATOS_PERIODO:
+        raise ValueError(f"No se puede agrupar por {agrupacion}")
+    # se abre una vez normal para migrar si hace falta y ver que fechas hay
+    with DaoSqlite(ruta) as dao:
+        extremos = dao.fechas_extremas()
+    if extremos is None:
+        return []
+    desde = extremos[0] if desde is None else max(desde, extremos[0])
+    hasta = extremos[1] if hasta is None else min(hasta, extremos[1])
+    if desde > hasta:
+        return []
+
+    procesos = procesos or os.cpu_count() or 1
+    partes = tramos(desde, hasta, procesos)
+    procesos = min(procesos, len(partes))
+    pool = None
+    if procesos > 1:
+        try:
+            pool = ProcessPoolExecutor(procesos)
+        except (ImportError, NotImplementedError, OSError):
+            # plataformas sin multiprocessing completo
+            pool = None
+
+    if pool is None:
+        parciales = [resumir_tramo(ruta, inicio, fin, agrupacion, tam_lote) for inicio, fin in partes]
+    else:
+        with pool:
+            parciales = list(pool.map(resumir_tramo, *zip(*((ruta, inicio, fin, agrupacion, tam_lote)
+                                                            for inicio, fin in partes))))
+
+    resumen = ResumenKakebo()
+    for parcial in parciales:
+        for periodo, categoria, total, movimientos in parcial:
+            resumen.sumar(periodo, CATEGORIAS.get(categoria), total / 100, movimientos)
+    return resumen.filas()
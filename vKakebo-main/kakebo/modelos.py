@@ -1,10 +1,28 @@
 from datetime import date
 from enum import Enum
+from functools import lru_cache
 import csv
 import sqlite3
 import os
+import io
+import mmap
+import struct
+import zlib
+from array import array
+
+import random
+import threading
+import time
+import bisect
+import logging
+import re
+from pathlib import Path
+from collections import OrderedDict, namedtuple, deque
+from contextlib import contextmanager
 
 class Movimiento:
+    __slots__ = ("concepto", "fecha", "cantidad", "id")
+
     def __init__(self, concepto, fecha, cantidad, id=None):
         self.concepto = concepto
         self.fecha = fecha
@@ -13,6 +31,19 @@ class Movimiento:
 
         self.validar_tipos()
         self.validar_inputs()
+
+    @classmethod
+    def desde_fila(cls, concepto, fecha, cantidad, id=None):
+        """
+        Crea el movimiento sin validarlo. Solo para filas que vienen de
+        nuestro propio almacenamiento, que ya se validaron al grabarlas.
+        """
+        movimiento = cls.__new__(cls)
+        movimiento.concepto = concepto
+        movimiento.fecha = fecha
+        movimiento.cantidad = cantidad
+        movimiento.id = id
+        return movimiento
         
     def validar_tipos(self):
         if not isinstance(self.concepto, str):
@@ -24,18 +55,21 @@ class Movimiento:
         if not (isinstance(self.cantidad, float) or isinstance(self.cantidad, int)):
             raise TypeError("Cantidad debe ser numerica.")
 
-    def validar_inputs(self):
+    def validar_inputs(self, hoy=None):
+        # hoy se puede dar ya calculado al validar muchos movimientos seguidos
         if self.cantidad == 0:
             raise ValueError("La cantidad no puede ser 0")
         if len(self.concepto) < 5:
             raise ValueError("El concepto no puede estar vacio, o menor de 5 caracteres")   
-        if self.fecha > date.today():
+        if self.fecha > (hoy or date.today()):
             raise ValueError("La fecha no puede ser posterior al dia de hoy")      
         
     def __repr__(self):
         return f"Movimiento: {self.fecha} {self.concepto} {self.cantidad:.2f}"
 
 class Ingreso(Movimiento):     
+    __slots__ = ()
+
     def __repr__(self):
         return f"Ingreso: {self.fecha} {self.concepto} {self.cantidad:.2f}"
     
@@ -45,12 +79,20 @@ class Ingreso(Movimiento):
         return self.concepto == other.concepto and self.cantidad == other.cantidad and self.fecha == other.fecha
         
 class Gasto(Movimiento):
+    __slots__ = ("categoria",)
+
     def __init__(self, concepto, fecha, cantidad, categoria, id=None):
         super().__init__(concepto, fecha, cantidad, id)
 
         self.categoria = categoria
         self.validar_categoria()
 
+    @classmethod
+    def desde_fila(cls, concepto, fecha, cantidad, categoria, id=None):
+        movimiento = super().desde_fila(concepto, fecha, cantidad, id)
+        movimiento.categoria = categoria
+        return movimiento
+
     def validar_categoria(self):
         if not isinstance(self.categoria, CategoriaGastos):
             raise TypeError("Categoria debe ser CategoriaGastos.")
@@ -69,17 +111,312 @@ class CategoriaGastos(Enum):
     OCIO_VICIO = 3
     EXTRAS = 4
 
+CATEGORIAS = {cat.value: cat for cat in CategoriaGastos}
+
+@lru_cache(maxsize=4096)
+def fecha_iso(texto):
+    # en un libro de cuentas las fechas se repiten mucho, date es inmutable
+    # y se puede compartir entre movimientos
+    return date.fromisoformat(texto)
+
+@lru_cache(maxsize=4096)
+def fecha_ordinal(ordinal):
+    # lo mismo para las fechas que vienen de SQLite como ordinal
+    return date.fromordinal(ordinal)
+
+# Formatos de strftime, validos tanto en Python como en SQLite
+FORMATOS_PERIODO = {"mes": "%Y-%m", "semana": "%Y-%W", "año": "%Y"}
+EPOCA_ORDINAL = date(1970, 1, 1).toordinal()
+# Dia juliano del ordinal 0, para que SQLite entienda las fechas guardadas
+# como ordinal: strftime(formato, fecha + JULIANO_ORDINAL)
+JULIANO_ORDINAL = 1721424.5
+
+def a_centimos(cantidad):
+    return round(cantidad * 100)
+
+def a_ordinal(fecha):
+    # como cuando la columna era texto, tambien se admite la fecha en ISO
+    if isinstance(fecha, str):
+        fecha = fecha_iso(fecha)
+    return fecha.toordinal()
+
+class ResumenKakebo:
+    """
+    Acumula ingresos, gastos por categoria y ahorro de cada periodo.
+    """
+    def __init__(self):
+        self.periodos = {}
+
+    def sumar(self, periodo, categoria, cantidad, movimientos=1):
+        # categoria None es un ingreso
+        if periodo not in self.periodos:
+            self.periodos[periodo] = {"periodo": periodo,
+                                      "ingresos": 0,
+                                      "gastos": {cat: 0 for cat in CategoriaGastos},
+                                      "movimientos": 0}
+        totales = self.periodos[periodo]
+        if categoria is None:
+            totales["ingresos"] += cantidad
+        else:
+            totales["gastos"][categoria] += cantidad
+        totales["movimientos"] += movimientos
+
+    def filas(self):
+        filas = []
+        for periodo in sorted(self.periodos):
+            totales = self.periodos[periodo]
+            totales["ahorro"] = totales["ingresos"] - sum(totales["gastos"].values())
+            filas.append(totales)
+        return filas
+
+@lru_cache(maxsize=None)
+def cargar_numpy():
+    """
+    El modulo numpy, o None si no esta instalado. Se importa la primera vez
+    que hace falta: importarlo cuesta decenas de ms y la mayoria de las
+    ordenes y el arranque de la ventana no lo usan.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class MovimientosFrame:
+    """
+    Movimientos guardados por columnas para informes: un array por campo en
+    lugar de un objeto por movimiento. Si NumPy esta instalado los calculos
+    se hacen sobre los mismos buffers sin copiarlos; si no, en Python puro.
+    """
+    def __init__(self):
+        self.ids = array("q")
+        self.cantidades = array("d")
+        self.fechas = array("i")        # date.toordinal()
+        self.categorias = array("b")    # CategoriaGastos.value, 0 en ingresos
+        self.tipos = bytearray()        # mapa de bits, 1 si es gasto
+        self.conceptos = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def agregar(self, id, es_gasto, concepto, ordinal, cantidad, categoria=0):
+        posicion = len(self.ids)
+        if posicion % 8 == 0:
+            self.tipos.append(0)
+        if es_gasto:
+            self.tipos[posicion >> 3] |= 1 << (posicion & 7)
+        self.ids.append(id)
+        self.conceptos.append(concepto)
+        self.fechas.append(ordinal)
+        self.cantidades.append(cantidad)
+        self.categorias.append(categoria)
+
+    def es_gasto(self, posicion):
+        return bool(self.tipos[posicion >> 3] >> (posicion & 7) & 1)
+
+    def movimiento(self, posicion):
+        fecha = date.fromordinal(self.fechas[posicion])
+        if self.es_gasto(posicion):
+            return Gasto.desde_fila(self.conceptos[posicion], fecha, self.cantidades[posicion],
+                                    CATEGORIAS[self.categorias[posicion]], self.ids[posicion])
+        return Ingreso.desde_fila(self.conceptos[posicion], fecha, self.cantidades[posicion], self.ids[posicion])
+
+    def __mascara_gastos(self):
+        # mapa de bits -> array de 0/1, uno por movimiento
+        numpy = cargar_numpy()
+        bits = numpy.unpackbits(numpy.frombuffer(self.tipos, dtype=numpy.uint8), bitorder="little")
+        return bits[:len(self)].astype(bool)
+
+    def total(self, tipo=None):
+        """
+        Suma de cantidades, de todos los movimientos o solo de Ingreso o Gasto.
+        """
+        numpy = cargar_numpy()
+        if len(self) == 0:
+            return 0
+        if numpy is not None:
+            cantidades = numpy.frombuffer(self.cantidades, dtype="d")
+            if tipo is None:
+                return float(cantidades.sum())
+            gastos = self.__mascara_gastos()
+            return float(cantidades[gastos if tipo is Gasto else ~gastos].sum())
+
+        if tipo is None:
+            return sum(self.cantidades)
+        buscado = tipo is Gasto
+        return sum(cantidad for posicion, cantidad in enumerate(self.cantidades) if self.es_gasto(posicion) == buscado)
+
+    def filtrar(self, desde=None, hasta=None, tipo=None, categorias=None):
+        """
+        Nuevo frame con los movimientos entre desde y hasta (incluidos), de
+        un tipo (Ingreso o Gasto) y/o de alguna de las categorias dadas.
+        """
+        numpy = cargar_numpy()
+        desde = desde.toordinal() if desde is not None else None
+        hasta = hasta.toordinal() if hasta is not None else None
+        valores = {cat.value for cat in categorias} if categorias is not None else None
+
+        if numpy is not None and len(self) > 0:
+            seleccion = numpy.ones(len(self), dtype=bool)
+            fechas = numpy.frombuffer(self.fechas, dtype="i")
+            if desde is not None:
+                seleccion &= fechas >= desde
+            if hasta is not None:
+                seleccion &= fechas <= hasta
+            if tipo is not None:
+                gastos = self.__mascara_gastos()
+                seleccion &= gastos if tipo is Gasto else ~gastos
+            if valores is not None:
+                seleccion &= numpy.isin(numpy.frombuffer(self.categorias, dtype="b"), list(valores))
+            return self.__tomar_mascara(seleccion)
+
+        buscado = tipo is Gasto
+        posiciones = [posicion for posicion, ordinal in enumerate(self.fechas)
+                      if (desde is None or ordinal >= desde)
+                      and (hasta is None or ordinal <= hasta)
+                      and (tipo is None or self.es_gasto(posicion) == buscado)
+                      and (valores is None or self.categorias[posicion] in valores)]
+        return self.__tomar(posiciones)
+
+    def __tomar(self, posiciones):
+        frame = MovimientosFrame()
+        for posicion in posiciones:
+            frame.agregar(self.ids[posicion], self.es_gasto(posicion), self.conceptos[posicion],
+                         self.fechas[posicion], self.cantidades[posicion], self.categorias[posicion])
+        return frame
+
+    def __tomar_mascara(self, seleccion):
+        # columna a columna con NumPy, sin pasar por agregar fila a fila
+        numpy = cargar_numpy()
+        frame = MovimientosFrame()
+        for nombre in ("ids", "cantidades", "fechas", "categorias"):
+            columna = getattr(self, nombre)
+            elegidos = numpy.frombuffer(columna, dtype=columna.typecode)[seleccion]
+            setattr(frame, nombre, array(columna.typecode, elegidos.tobytes()))
+        frame.tipos = bytearray(numpy.packbits(self.__mascara_gastos()[seleccion], bitorder="little").tobytes())
+        frame.conceptos = [self.conceptos[posicion] for posicion in numpy.flatnonzero(seleccion).tolist()]
+        return frame
+
+    def por_categoria(self):
+        """
+        Total de gastos de cada categoria.
+        """
+        numpy = cargar_numpy()
+        totales = {cat: 0 for cat in CategoriaGastos}
+        if len(self) == 0:
+            return totales
+        if numpy is not None:
+            sumas = numpy.bincount(numpy.frombuffer(self.categorias, dtype="b"),
+                                   weights=numpy.frombuffer(self.cantidades, dtype="d"),
+                                   minlength=len(CATEGORIAS) + 1)
+            for cat in CategoriaGastos:
+                totales[cat] = float(sumas[cat.value])
+            return totales
+
+        for categoria, cantidad in zip(self.categorias, self.cantidades):
+            if categoria:
+                totales[CATEGORIAS[categoria]] += cantidad
+        return totales
+
+    def por_mes(self):
+        """
+        Hoja Kakebo de cada mes, con el mismo formato que DaoSqlite.resumen().
+        """
+        numpy = cargar_numpy()
+        resumen = ResumenKakebo()
+        if len(self) == 0:
+            return resumen.filas()
+
+        if numpy is not None:
+            # meses desde 1970 de cada fecha y clave mes * 8 + categoria
+            dias = numpy.frombuffer(self.fechas, dtype="i").astype("i8") - EPOCA_ORDINAL
+            meses = dias.astype("datetime64[D]").astype("datetime64[M]").astype("i8")
+            claves, grupos = numpy.unique(meses * 8 + numpy.frombuffer(self.categorias, dtype="b"),
+                                          return_inverse=True)
+            sumas = numpy.bincount(grupos, weights=numpy.frombuffer(self.cantidades, dtype="d"))
+            cuentas = numpy.bincount(grupos)
+            for clave, total, movimientos in zip(claves.tolist(), sumas.tolist(), cuentas.tolist()):
+                mes, categoria = divmod(clave, 8)
+                periodo = f"{1970 + mes // 12:04d}-{mes % 12 + 1:02d}"
+                resumen.sumar(periodo, CATEGORIAS.get(categoria), total, movimientos)
+            return resumen.filas()
+
+        periodos = {}
+        grupos = {}
+        for ordinal, categoria, cantidad in zip(self.fechas, self.categorias, self.cantidades):
+            if ordinal not in periodos:
+                periodos[ordinal] = date.fromordinal(ordinal).strftime(FORMATOS_PERIODO["mes"])
+            clave = (periodos[ordinal], categoria)
+            acumulado = grupos.get(clave)
+            if acumulado is None:
+                grupos[clave] = [cantidad, 1]
+            else:
+                acumulado[0] += cantidad
+                acumulado[1] += 1
+        for (periodo, categoria), (total, movimientos) in grupos.items():
+            resumen.sumar(periodo, CATEGORIAS.get(categoria), total, movimientos)
+        return resumen.filas()
+
+# palabras de un texto de busqueda (letras, numeros y _ en cualquier idioma)
+PALABRA = re.compile(r"\w+")
+
+CABECERA_CSV = "concepto,fecha,cantidad,categoria\n"
+CODIFICACION_CSV = "utf-8"
+CATEGORIAS_CSV = {str(cat.value): cat for cat in CategoriaGastos}
+
+# Fichero indice de DaoCSV: cabecera (marca, bytes del csv indexados, huella
+# de esos bytes) y un registro (byte de inicio, fecha como ordinal) por cada
+# fila del csv
+CABECERA_INDICE = struct.Struct("<4sQI")
+REGISTRO_INDICE = struct.Struct("<Qi")
+MARCA_INDICE = b"KID2"
+# la huella es el crc32 del principio y del final de lo indexado: cambia si el
+# csv se ha reescrito aunque sea igual de largo, y no si solo se ha añadido
+BYTES_HUELLA = 4096
+
 class DaoCSV:
-    def __init__(self, ruta):
+    def __init__(self, ruta, indexar=False):
         self.ruta = ruta
         if not os.path.exists(self.ruta):
-            with open(self.ruta, "w", newline="") as f:
-                f.write("concepto,fecha,cantidad,categoria\n")
+            with open(self.ruta, "w", newline="", encoding=CODIFICACION_CSV) as f:
+                f.write(CABECERA_CSV)
         self.puntero_lectura = 0
+        # Byte del fichero donde empieza el siguiente registro a leer, None
+        # mientras no se haya leido la cabecera.
+        self.__posicion = None
+        self.__campos = None
 
+        # Indice para acceso directo. Se construye la primera vez que se
+        # necesita y, si indexar es True, se guarda en ruta + ".idx" para no
+        # tener que recorrer el csv en la siguiente ejecucion.
+        self.indexar = indexar
+        self.ruta_indice = ruta + ".idx"
+        self.__inicios = None
+        self.__fechas = None
+        self.__meses = None
+        self.__indexado = 0
+        self.__huella = None
+        self.__estado = None
+        self.__mapa = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.close()
+
+    def close(self):
+        if self.__mapa is not None:
+            self.__mapa.close()
+            self.__mapa = None
 
     def grabar(self, movimiento):
-        with open(self.ruta, "a", newline="") as f:
+        if self.__inicios is not None:
+            # ponerse al dia por si otro proceso ha escrito en el fichero
+            self.__actualizar_indice()
+
+        with open(self.ruta, "a", newline="", encoding=CODIFICACION_CSV) as f:
+            inicio = f.tell()
             writer = csv.writer(f, delimiter=",", quotechar='"')
             if isinstance(movimiento, Ingreso):
                 #f.write(f"{movimiento.concepto},{movimiento.fecha},{movimiento.cantidad},\n")
@@ -87,123 +424,1872 @@ class DaoCSV:
             elif isinstance(movimiento, Gasto):
                 #f.write(f"{movimiento.concepto},{movimiento.fecha},{movimiento.cantidad},{movimiento.categoria.value}\n")
                 writer.writerow([movimiento.concepto, movimiento.fecha, movimiento.cantidad, movimiento.categoria.value])
+            else:
+                return
+            f.flush()
+            final = f.tell()
+
+        if self.__inicios is not None and self.__indexado == inicio:
+            self.__anotar([(inicio, movimiento.fecha.toordinal())], final)
 
     def leer(self):
-        with open(self.ruta, "r") as f:
-            reader = csv.DictReader(f)
-            contador = 0
-            for registro in reader:
-                if registro['categoria'] == "":
-                    # instanciar Ingreso con los datos de registro
-                    variable = Ingreso(registro['concepto'], 
-                                       date.fromisoformat(registro['fecha']),
-                                       float(registro['cantidad']))
-                elif registro['categoria'] in [str(cat.value) for cat in CategoriaGastos]:
-                    # instanciar Gasto con los datos de registro
-                    variable = Gasto(registro['concepto'], 
-                                       date.fromisoformat(registro['fecha']),
-                                       float(registro['cantidad']),
-                                       CategoriaGastos(int(registro['categoria'])))
-
-                if contador == self.puntero_lectura:
-                    self.puntero_lectura += 1
-                    return variable
-                contador += 1
+        registros = iter(self)
+        try:
+            return next(registros, None)
+        finally:
+            registros.close()
+
+    def reset(self):
+        self.puntero_lectura = 0
+        self.__posicion = None
+
+    def __iter__(self):
+        """
+        Recorre los movimientos desde el punto en el que se quedo la ultima
+        lectura. Cada llamada reanuda con seek en lugar de volver a leer el
+        fichero desde el principio; reset() vuelve al primer registro.
+        """
+        for fila, posicion in self.__filas(self.__posicion):
+            movimiento = self.__a_movimiento(fila)
+            self.__posicion = posicion
+            self.puntero_lectura += 1
+            yield movimiento
 
+    def __filas(self, posicion=None):
+        with open(self.ruta, "rb") as f:
+            # csv.reader pide las lineas de una en una, asi f.tell() siempre
+            # apunta justo detras del ultimo registro entregado
+            reader = csv.reader(iter(lambda: f.readline().decode(CODIFICACION_CSV), ""))
+            self.__campos = next(reader, None)
+            if posicion is not None:
+                f.seek(posicion)
+
+            for fila in reader:
+                yield fila, f.tell()
+
+    def leer_lotes(self, tam_lote=5000, posicion=None):
+        """
+        Genera listas de hasta tam_lote movimientos ya validados junto con el
+        byte donde empieza el registro siguiente, para poder continuar desde
+        ahi con posicion. No mueve el puntero de leer().
+        """
+        hoy = date.today()
+        lote = []
+        for fila, siguiente in self.__filas(posicion):
+            lote.append(self.__a_movimiento(fila, hoy))
+            if len(lote) == tam_lote:
+                yield lote, siguiente
+                lote = []
+        if lote:
+            yield lote, siguiente
+
+    def resumen(self, desde=None, hasta=None, agrupacion="mes"):
+        """
+        Mismo resultado que DaoSqlite.resumen calculado en una sola pasada por
+        el fichero, sin crear un movimiento por fila.
+        """
+        formato = FORMATOS_PERIODO[agrupacion]
+        resumen = ResumenKakebo()
+        fechas = {}
+        columnas = None
+        for fila, _ in self.__filas():
+            if columnas is None:
+                columnas = [self.__campos.index(campo) for campo in ("fecha", "cantidad", "categoria")]
+            texto_fecha, cantidad, categoria = (fila[columna] for columna in columnas)
+
+            if texto_fecha not in fechas:
+                fecha = date.fromisoformat(texto_fecha)
+                fechas[texto_fecha] = (fecha, fecha.strftime(formato))
+            fecha, periodo = fechas[texto_fecha]
+            if (desde is not None and fecha < desde) or (hasta is not None and fecha > hasta):
+                continue
+
+            resumen.sumar(periodo, CATEGORIAS_CSV[categoria] if categoria else None, float(cantidad))
+        return resumen.filas()
+
+    def total_filas(self):
+        self.__actualizar_indice()
+        return len(self.__inicios)
+
+    def leer_fila(self, numero):
+        """
+        Devuelve el movimiento de la fila numero (empezando en 0) sin recorrer
+        las anteriores, o None si no existe.
+        """
+        self.__actualizar_indice()
+        if not 0 <= numero < len(self.__inicios):
             return None
+        return self.__leer_mapa(numero, numero + 1)[0]
+
+    def leer_pagina(self, inicio, cantidad):
+        self.__actualizar_indice()
+        final = min(inicio + cantidad, len(self.__inicios))
+        if inicio >= final:
+            return []
+        return self.__leer_mapa(inicio, final)
+
+    def fila_de_mes(self, anio, mes):
+        """
+        Numero de la primera fila del fichero con fecha en el mes indicado,
+        o None si no hay ninguna.
+        """
+        self.__actualizar_indice()
+        return self.__meses.get((anio, mes))
+
+    def __leer_mapa(self, primera, ultima):
+        if self.__mapa is None or len(self.__mapa) < self.__indexado:
+            self.close()
+            with open(self.ruta, "rb") as f:
+                self.__mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        desde = self.__inicios[primera]
+        hasta = self.__inicios[ultima] if ultima < len(self.__inicios) else self.__indexado
+        # se decodifica directamente del mapa, sin copiar antes a bytes
+        texto = str(memoryview(self.__mapa)[desde:hasta], CODIFICACION_CSV)
+        return [self.__a_movimiento(fila) for fila in csv.reader(io.StringIO(texto, newline="\n"))]
+
+    def __actualizar_indice(self):
+        estado = os.stat(self.ruta)
+        longitud = estado.st_size
+        if self.__inicios is None:
+            self.__cargar_indice(longitud)
+        elif (estado.st_ino, estado.st_mtime_ns, longitud) != self.__estado:
+            if self.__estado is not None and estado.st_ino != self.__estado[0]:
+                # otro fichero con el mismo nombre (os.replace): el mapa es del anterior
+                self.close()
+            if longitud < self.__indexado or self.__calcular_huella(self.__indexado) != self.__huella:
+                # el fichero ha cambiado por completo, se indexa de nuevo
+                self.__cargar_indice(longitud, desde_fichero=False)
+        if longitud > self.__indexado:
+            self.__indexar_desde(self.__indexado)
+        self.__estado = (estado.st_ino, estado.st_mtime_ns, longitud)
+
+    def __calcular_huella(self, indexado):
+        with open(self.ruta, "rb") as f:
+            huella = zlib.crc32(f.read(min(indexado, BYTES_HUELLA)))
+            f.seek(max(indexado - BYTES_HUELLA, 0))
+            return zlib.crc32(f.read(min(indexado, BYTES_HUELLA)), huella)
+
+    def __cargar_indice(self, longitud, desde_fichero=True):
+        # el mapa puede tener los bytes de antes, se vuelve a abrir al leer
+        self.close()
+        self.__inicios = array("Q")
+        self.__fechas = array("i")
+        self.__meses = {}
+        self.__indexado = 0
+        self.__huella = None
+
+        with open(self.ruta, "rb") as f:
+            self.__campos = next(csv.reader([f.readline().decode(CODIFICACION_CSV)]), None)
+            fin_cabecera = f.tell()
+
+        if desde_fichero and self.indexar and os.path.exists(self.ruta_indice):
+            with open(self.ruta_indice, "rb") as f:
+                cabecera = f.read(CABECERA_INDICE.size)
+                datos = f.read()
+            if len(cabecera) == CABECERA_INDICE.size:
+                marca, indexado, huella = CABECERA_INDICE.unpack(cabecera)
+                if (marca == MARCA_INDICE and indexado <= longitud
+                        and huella == self.__calcular_huella(indexado)):
+                    registros = list(REGISTRO_INDICE.iter_unpack(datos))
+                    self.__registrar(registros, indexado, huella)
+                    return
+
+        self.__huella = self.__calcular_huella(fin_cabecera)
+        if self.indexar:
+            with open(self.ruta_indice, "wb") as f:
+                f.write(CABECERA_INDICE.pack(MARCA_INDICE, fin_cabecera, self.__huella))
+        self.__indexado = fin_cabecera
+
+    def __indexar_desde(self, inicio):
+        columna_fecha = self.__campos.index("fecha")
+        registros = []
+        with open(self.ruta, "rb") as f:
+            f.seek(inicio)
+            reader = csv.reader(iter(lambda: f.readline().decode(CODIFICACION_CSV), ""))
+            for fila in reader:
+                registros.append((inicio, date.fromisoformat(fila[columna_fecha]).toordinal()))
+                inicio = f.tell()
+        self.__anotar(registros, inicio)
+
+    def __anotar(self, registros, indexado):
+        self.__registrar(registros, indexado, self.__calcular_huella(indexado))
+        if self.indexar:
+            with open(self.ruta_indice, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                f.write(b"".join(REGISTRO_INDICE.pack(*registro) for registro in registros))
+                f.seek(0)
+                f.write(CABECERA_INDICE.pack(MARCA_INDICE, indexado, self.__huella))
+
+    def __registrar(self, registros, indexado, huella):
+        anterior = None
+        for inicio, ordinal in registros:
+            if ordinal != anterior:
+                fecha = date.fromordinal(ordinal)
+                self.__meses.setdefault((fecha.year, fecha.month), len(self.__inicios))
+                anterior = ordinal
+            self.__inicios.append(inicio)
+            self.__fechas.append(ordinal)
+        self.__indexado = indexado
+        self.__huella = huella
+
+    def __a_movimiento(self, fila, hoy=None):
+        registro = dict(zip(self.__campos, fila))
+        if registro['categoria'] == "":
+            # instanciar Ingreso con los datos de registro
+            movimiento = Ingreso.desde_fila(registro['concepto'], 
+                                            fecha_iso(registro['fecha']),
+                                            float(registro['cantidad']))
+        elif registro['categoria'] in CATEGORIAS_CSV:
+            # instanciar Gasto con los datos de registro
+            movimiento = Gasto.desde_fila(registro['concepto'], 
+                                          fecha_iso(registro['fecha']),
+                                          float(registro['cantidad']),
+                                          CATEGORIAS_CSV[registro['categoria']])
+        else:
+            raise ValueError(f"Categoria desconocida en {self.ruta}: {registro['categoria']}")
+
+        # el csv puede venir de fuera, se valida como en el constructor
+        movimiento.validar_tipos()
+        movimiento.validar_inputs(hoy)
+        return movimiento
             
-class DaoSqlite:
+# Ficheros de DaoBinario. La cabecera lleva la marca, la version, el tamaño
+# de registro, la generacion del fichero de conceptos y el mayor id dado
+# antes de la ultima compactacion. Cada registro: id, fecha (ordinal),
+# cantidad (centimos), inicio y longitud del concepto en el fichero de
+# conceptos, categoria (0 en ingresos) y marcas.
+CABECERA_BINARIO = struct.Struct("<4sHHHq")
+REGISTRO_BINARIO = struct.Struct("<qiqQIBB")
+ID_BINARIO = struct.Struct("<q")
+MARCA_BINARIO = b"KBIN"
+VERSION_BINARIO = 1
+BORRADO = 1
+
+class DaoBinario:
+    """
+    Movimientos en registros de tamaño fijo empaquetados con struct y los
+    conceptos uno tras otro en un segundo fichero. Solo se escribe al final:
+    borrar() marca el registro y compactar() reescribe los ficheros sin los
+    borrados ni los conceptos que ya no se usan. Se lee con mmap, el
+    registro n esta siempre en la misma posicion. Pensado para un unico
+    proceso escribiendo.
+    """
     def __init__(self, ruta):
         self.ruta = ruta
+        if not os.path.exists(self.ruta):
+            with open(self.ruta, "wb") as f:
+                f.write(CABECERA_BINARIO.pack(MARCA_BINARIO, VERSION_BINARIO, REGISTRO_BINARIO.size, 0, 0))
+            open(f"{self.ruta}.0.conceptos", "wb").close()
+        self.__mapa = None
+        self.__mapa_conceptos = None
+        self.__leer_cabecera()
+
+    def __leer_cabecera(self):
+        with open(self.ruta, "rb") as f:
+            marca, version, tamano, generacion, ultimo_id = CABECERA_BINARIO.unpack(f.read(CABECERA_BINARIO.size))
+            if marca != MARCA_BINARIO or version != VERSION_BINARIO or tamano != REGISTRO_BINARIO.size:
+                raise ValueError(f"{self.ruta} no es un fichero de DaoBinario")
+            # un registro a medio escribir al final no cuenta; puede que el
+            # escritor lo este terminando, asi que abrir no lo toca
+            tamano = os.fstat(f.fileno()).st_size
+            self.__total = (tamano - CABECERA_BINARIO.size) // REGISTRO_BINARIO.size
+            if self.__total:
+                f.seek(self.__desplazamiento(self.__total - 1))
+                ultimo_id = max(ultimo_id, ID_BINARIO.unpack(f.read(ID_BINARIO.size))[0])
+        self.__generacion = generacion
+        self.__ultimo_id = ultimo_id
+        self.ruta_conceptos = f"{self.ruta}.{generacion}.conceptos"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.close()
+
+    def close(self):
+        for mapa in (self.__mapa, self.__mapa_conceptos):
+            if mapa is not None:
+                mapa.close()
+        self.__mapa = None
+        self.__mapa_conceptos = None
+
+    def __desplazamiento(self, numero):
+        return CABECERA_BINARIO.size + numero * REGISTRO_BINARIO.size
+
+    def __registros(self):
+        # se vuelve a mapear solo si se ha escrito desde la ultima vez
+        if self.__mapa is None or len(self.__mapa) < self.__desplazamiento(self.__total):
+            if self.__mapa is not None:
+                self.__mapa.close()
+            with open(self.ruta, "rb") as f:
+                self.__mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.__mapa
+
+    def __conceptos(self, final):
+        if self.__mapa_conceptos is None or len(self.__mapa_conceptos) < final:
+            if self.__mapa_conceptos is not None:
+                self.__mapa_conceptos.close()
+            with open(self.ruta_conceptos, "rb") as f:
+                self.__mapa_conceptos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.__mapa_conceptos
+
+    def __categoria(self, movimiento):
+        if isinstance(movimiento, Ingreso):
+            return 0
+        elif isinstance(movimiento, Gasto):
+            return movimiento.categoria.value
+        raise TypeError("Movimiento debe ser Ingreso o Gasto.")
+
+    def grabar(self, movimiento):
+        if movimiento.id is None:
+            self.grabar_lote((movimiento,))
+            return
+
+        numero = self.__numero(movimiento.id)
+        if numero is not None:
+            _, _, _, inicio, longitud, _, marcas = REGISTRO_BINARIO.unpack_from(self.__registros(), self.__desplazamiento(numero))
+        if numero is None or marcas & BORRADO:
+            raise ValueError(f"No existe el movimiento {movimiento.id} en {self.ruta}")
+        concepto = movimiento.concepto.encode(CODIFICACION_CSV)
+        if concepto != self.__concepto_bytes(inicio, longitud):
+            # el concepto anterior queda sin usar hasta compactar
+            with open(self.ruta_conceptos, "ab") as f:
+                inicio = f.tell()
+                f.write(concepto)
+        with open(self.ruta, "r+b") as f:
+            f.seek(self.__desplazamiento(numero))
+            f.write(REGISTRO_BINARIO.pack(movimiento.id, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad),
+                                          inicio, len(concepto), self.__categoria(movimiento), marcas))
+
+    def grabar_lote(self, movimientos):
+        """
+        Añade al final los movimientos nuevos (id None) con una sola
+        escritura por fichero y graba uno a uno los que ya tienen id.
+        Devuelve los ids en el mismo orden de entrada.
+        """
+        movimientos = list(movimientos)
+        # antes los que ya existen: si cambia su concepto se añade al
+        # fichero de conceptos y los nuevos tienen que ir detras
+        for movimiento in movimientos:
+            if movimiento.id is not None:
+                self.grabar(movimiento)
+
+        ids = []
+        altas = []
+        registros = []
+        conceptos = []
+        with open(self.ruta_conceptos, "ab") as f:
+            inicio = f.tell()
+        id = self.__ultimo_id
+        for movimiento in movimientos:
+            if movimiento.id is not None:
+                ids.append(movimiento.id)
+                continue
+            categoria = self.__categoria(movimiento)
+            concepto = movimiento.concepto.encode(CODIFICACION_CSV)
+            id += 1
+            registros.append(REGISTRO_BINARIO.pack(id, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad),
+                                                   inicio, len(concepto), categoria, 0))
+            conceptos.append(concepto)
+            inicio += len(concepto)
+            altas.append(movimiento)
+            ids.append(id)
+
+        if altas:
+            # primero los conceptos: un registro nunca apunta a texto que no este escrito
+            with open(self.ruta_conceptos, "ab") as f:
+                f.write(b"".join(conceptos))
+            with open(self.ruta, "r+b") as f:
+                # detras del ultimo registro entero: lo que quede a medias de
+                # un corte se sobrescribe o se corta
+                f.seek(self.__desplazamiento(self.__total))
+                f.write(b"".join(registros))
+                f.truncate()
+            primero = self.__ultimo_id + 1
+            for desplazamiento, movimiento in enumerate(altas):
+                movimiento.id = primero + desplazamiento
+            self.__ultimo_id += len(altas)
+            self.__total += len(altas)
+        return ids
+
+    def borrar(self, id):
+        numero = self.__numero(id)
+        if numero is None:
+            return
+        posicion = self.__desplazamiento(numero) + REGISTRO_BINARIO.size - 1
+        marcas = self.__registros()[posicion]
+        with open(self.ruta, "r+b") as f:
+            f.seek(posicion)
+            f.write(bytes((marcas | BORRADO,)))
+
+    def leer(self, id):
+        numero = self.__numero(id)
+        if numero is None:
+            return None
+        return self.leer_fila(numero)
+
+    def total_filas(self):
+        """
+        Numero de registros del fichero, contando los borrados hasta que se
+        compacte.
+        """
+        return self.__total
+
+    def leer_fila(self, numero):
+        """
+        Movimiento del registro numero (empezando en 0) leido directamente de
+        su posicion, o None si no existe o esta borrado.
+        """
+        if not 0 <= numero < self.__total:
+            return None
+        registro = REGISTRO_BINARIO.unpack_from(self.__registros(), self.__desplazamiento(numero))
+        if registro[6] & BORRADO:
+            return None
+        return self.__a_movimiento(registro, self.__conceptos(registro[3] + registro[4]))
+
+    def __numero(self, id):
+        # sin compactar el id n esta en el registro n - 1; despues hay huecos
+        # pero los ids siguen ordenados y se busca por biseccion
+        if id is None or not 0 < id <= self.__ultimo_id or not self.__total:
+            return None
+        mapa = self.__registros()
+        numero = min(id, self.__total) - 1
+        if ID_BINARIO.unpack_from(mapa, self.__desplazamiento(numero))[0] == id:
+            return numero
+        bajo, alto = 0, numero
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if ID_BINARIO.unpack_from(mapa, self.__desplazamiento(medio))[0] < id:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if ID_BINARIO.unpack_from(mapa, self.__desplazamiento(bajo))[0] == id:
+            return bajo
+        return None
+
+    def __concepto_bytes(self, inicio, longitud):
+        if not longitud:
+            return b""
+        return self.__conceptos(inicio + longitud)[inicio:inicio + longitud]
+
+    def __a_movimiento(self, registro, conceptos):
+        id, fecha, cantidad, inicio, longitud, categoria, _ = registro
+        # para textos tan cortos cortar el mapa y decodificar es mas rapido
+        # que pasar por un memoryview
+        concepto = conceptos[inicio:inicio + longitud].decode(CODIFICACION_CSV)
+        if categoria:
+            return Gasto.desde_fila(concepto, fecha_ordinal(fecha), cantidad / 100, CATEGORIAS[categoria], id)
+        return Ingreso.desde_fila(concepto, fecha_ordinal(fecha), cantidad / 100, id)
+
+    def __bloques(self, tam_lote):
+        """
+        Genera listas de hasta tam_lote registros (tuplas) sin los borrados.
+        Usa su propio mapa, asi se puede seguir grabando mientras se recorre.
+        Recorre los registros que habia al empezar.
+        """
+        total = self.__total
+        if not total:
+            return
+        with open(self.ruta, "rb") as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for primero in range(0, total, tam_lote):
+                ultimo = min(primero + tam_lote, total)
+                with memoryview(mapa)[self.__desplazamiento(primero):self.__desplazamiento(ultimo)] as vista:
+                    bloque = [registro for registro in REGISTRO_BINARIO.iter_unpack(vista)
+                              if not registro[6] & BORRADO]
+                yield bloque
+        finally:
+            mapa.close()
+
+    def leerTodo(self, stream=False, tam_lote=5000):
+        """
+        Lista de todos los movimientos no borrados, en el orden en que se
+        grabaron. Con stream=True devuelve un generador (ver iterar).
+        """
+        if stream:
+            return self.iterar(tam_lote)
+        return list(self.iterar(tam_lote))
+
+    def iterar(self, tam_lote=5000):
+        for bloque in self.__bloques(tam_lote):
+            if not bloque:
+                continue
+            conceptos = self.__conceptos(max(registro[3] + registro[4] for registro in bloque))
+            movimientos = [self.__a_movimiento(registro, conceptos) for registro in bloque]
+            yield from movimientos
+
+    def leer_columnar(self, tam_lote=5000):
+        """
+        Los movimientos no borrados en un MovimientosFrame, sin crear un
+        objeto por movimiento.
+        """
+        frame = MovimientosFrame()
+        for bloque in self.__bloques(tam_lote):
+            if not bloque:
+                continue
+            conceptos = self.__conceptos(max(registro[3] + registro[4] for registro in bloque))
+            for id, fecha, cantidad, inicio, longitud, categoria, _ in bloque:
+                frame.agregar(id, categoria != 0, conceptos[inicio:inicio + longitud].decode(CODIFICACION_CSV),
+                              fecha, cantidad / 100, categoria)
+        return frame
+
+    def compactar(self, tam_lote=5000):
+        """
+        Reescribe los ficheros sin los registros borrados ni los conceptos
+        sin usar. Los ids no cambian. El fichero de conceptos nuevo lleva
+        otro nombre (generacion) y el de registros se sustituye al final,
+        asi un corte a medias deja los ficheros anteriores como estaban.
+        Devuelve cuantos registros se han quitado.
+        """
+        generacion = self.__generacion + 1
+        ruta_conceptos = f"{self.ruta}.{generacion}.conceptos"
+        temporal = f"{self.ruta}.tmp"
+        quedan = 0
+        with open(temporal, "wb") as registros, open(ruta_conceptos, "wb") as conceptos:
+            registros.write(CABECERA_BINARIO.pack(MARCA_BINARIO, VERSION_BINARIO, REGISTRO_BINARIO.size,
+                                                  generacion, self.__ultimo_id))
+            inicio = 0
+            for bloque in self.__bloques(tam_lote):
+                empaquetados = []
+                textos = []
+                for id, fecha, cantidad, anterior, longitud, categoria, marcas in bloque:
+                    textos.append(self.__concepto_bytes(anterior, longitud))
+                    empaquetados.append(REGISTRO_BINARIO.pack(id, fecha, cantidad, inicio, longitud, categoria, marcas))
+                    inicio += longitud
+                conceptos.write(b"".join(textos))
+                registros.write(b"".join(empaquetados))
+                quedan += len(bloque)
+            for f in (conceptos, registros):
+                f.flush()
+                os.fsync(f.fileno())
+
+        quitados = self.__total - quedan
+        anterior = self.ruta_conceptos
+        self.close()
+        os.replace(temporal, self.ruta)
+        os.remove(anterior)
+        self.__leer_cabecera()
+        return quitados
+
+def anio_mes(fecha):
+    # año y mes como enteros a partir de la fecha ordinal, en SQL
+    return (f"CAST(strftime('%Y', {fecha} + {JULIANO_ORDINAL}) AS INTEGER)",
+            f"CAST(strftime('%m', {fecha} + {JULIANO_ORDINAL}) AS INTEGER)")
+
+def sumar_en_resumen(fila, signo):
+    """
+    Cuerpo de trigger que suma (signo "+") o resta (signo "-") la fila NEW u
+    OLD de movimientos en resumen_mensual y en saldo. Los ingresos van con
+    categoria 0 para que formen parte de la clave primaria.
+    """
+    anio, mes = anio_mes(f"{fila}.fecha")
+    clave = (f"anio = {anio} AND mes = {mes} AND tipo_movimiento = {fila}.tipo_movimiento "
+             f"AND categoria = coalesce({fila}.categoria, 0)")
+    sentencias = []
+    if signo == "+":
+        sentencias.append(f"""INSERT OR IGNORE INTO resumen_mensual (anio, mes, tipo_movimiento, categoria, total, n)
+                VALUES ({anio}, {mes}, {fila}.tipo_movimiento, coalesce({fila}.categoria, 0), 0, 0);""")
+    sentencias.append(f"UPDATE resumen_mensual SET total = total {signo} {fila}.cantidad, n = n {signo} 1 WHERE {clave};")
+    if signo == "-":
+        sentencias.append(f"DELETE FROM resumen_mensual WHERE {clave} AND n = 0;")
+    sentencias.append(f"""UPDATE saldo
+                   SET ingresos = ingresos {signo} CASE {fila}.tipo_movimiento WHEN 'I' THEN {fila}.cantidad ELSE 0 END,
+                       gastos = gastos {signo} CASE {fila}.tipo_movimiento WHEN 'G' THEN {fila}.cantidad ELSE 0 END,
+                       n = n {signo} 1;""")
+    return "\n            ".join(sentencias)
+
+def calcular_resumen_mensual(where=""):
+    return f"""SELECT {", ".join(anio_mes("fecha"))}, tipo_movimiento, coalesce(categoria, 0), SUM(cantidad), COUNT(*)
+                 FROM movimientos {where}
+                GROUP BY 1, 2, 3, 4"""
+
+# Lo que deberian tener resumen_mensual y saldo, calculado desde movimientos
+CALCULAR_RESUMEN_MENSUAL = calcular_resumen_mensual()
+CALCULAR_SALDO = """SELECT coalesce(SUM(CASE tipo_movimiento WHEN 'I' THEN cantidad END), 0) AS ingresos,
+                           coalesce(SUM(CASE tipo_movimiento WHEN 'G' THEN cantidad END), 0) AS gastos,
+                           COUNT(*) AS n
+                      FROM movimientos"""
+RECONSTRUIR_RESUMEN = [
+    "DELETE FROM resumen_mensual",
+    f"INSERT INTO resumen_mensual (anio, mes, tipo_movimiento, categoria, total, n) {CALCULAR_RESUMEN_MENSUAL}",
+    "DELETE FROM saldo",
+    f"INSERT INTO saldo (id, ingresos, gastos, n) SELECT 1, * FROM ({CALCULAR_SALDO})",
+]
+
+# Carga masiva (ver DaoSqlite.carga_masiva): sin los triggers de alta, lo
+# insertado (id > ?1) se suma despues con una sentencia por tabla
+TRIGGERS_ALTA = ("resumen_alta", "movimientos_fts_alta")
+SUMAR_ALTAS = [
+    f"""INSERT INTO resumen_mensual (anio, mes, tipo_movimiento, categoria, total, n)
+        {calcular_resumen_mensual("WHERE id > ?1")}
+        ON CONFLICT (anio, mes, tipo_movimiento, categoria)
+        DO UPDATE SET total = total + excluded.total, n = n + excluded.n""",
+    f"""UPDATE saldo SET ingresos = saldo.ingresos + altas.ingresos, gastos = saldo.gastos + altas.gastos,
+                         n = saldo.n + altas.n
+          FROM ({CALCULAR_SALDO} WHERE id > ?1) AS altas""",
+]
+SUMAR_ALTAS_BUSQUEDA = "INSERT INTO movimientos_fts (rowid, concepto) SELECT id, concepto FROM movimientos WHERE id > ?"
+
+# Busqueda de texto en los conceptos con FTS5. La tabla no guarda copia del
+# texto (content='movimientos'), los triggers le pasan cada cambio
+CREAR_BUSQUEDA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS movimientos_fts
+        USING fts5(concepto, content='movimientos', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS movimientos_fts_alta AFTER INSERT ON movimientos
+        BEGIN
+            INSERT INTO movimientos_fts (rowid, concepto) VALUES (NEW.id, NEW.concepto);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS movimientos_fts_baja AFTER DELETE ON movimientos
+        BEGIN
+            INSERT INTO movimientos_fts (movimientos_fts, rowid, concepto) VALUES ('delete', OLD.id, OLD.concepto);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS movimientos_fts_cambio AFTER UPDATE OF concepto ON movimientos
+        BEGIN
+            INSERT INTO movimientos_fts (movimientos_fts, rowid, concepto) VALUES ('delete', OLD.id, OLD.concepto);
+            INSERT INTO movimientos_fts (rowid, concepto) VALUES (NEW.id, NEW.concepto);
+        END""",
+    "INSERT INTO movimientos_fts (movimientos_fts) VALUES ('rebuild')",
+]
+
+def crear_busqueda(con):
+    # no todos los SQLite traen FTS5; sin el, buscar() usa LIKE
+    try:
+        con.execute(CREAR_BUSQUEDA[0])
+    except sqlite3.OperationalError:
+        return
+    for sentencia in CREAR_BUSQUEDA[1:]:
+        con.execute(sentencia)
+
+# Cada migracion es la lista de sentencias que lleva el esquema de la version
+# n a la n+1; la version aplicada se guarda en PRAGMA user_version. Una
+# sentencia puede ser tambien una funcion que recibe la conexion.
+MIGRACIONES = [
+    # 1: esquema inicial, el de datos/create_database.sql
+    [
+        """CREATE TABLE IF NOT EXISTS "movimientos" (
+            "id"	INTEGER,
+            "tipo_movimiento"	TEXT NOT NULL,
+            "concepto"	TEXT NOT NULL,
+            "fecha"	TEXT NOT NULL,
+            "cantidad"	REAL NOT NULL,
+            "categoria"	INTEGER,
+            PRIMARY KEY("id" AUTOINCREMENT)
+        )""",
+    ],
+    # 2: indices para los filtros por fecha, tipo/cantidad y categoria
+    [
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_tipo_cantidad ON movimientos (tipo_movimiento, cantidad)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_categoria_fecha ON movimientos (categoria, fecha)",
+    ],
+    # 3: punto de control de las importaciones desde csv (ver importar_csv)
+    [
+        """CREATE TABLE IF NOT EXISTS "importaciones" (
+            "origen"	TEXT NOT NULL,
+            "posicion"	INTEGER NOT NULL,
+            "filas"	INTEGER NOT NULL,
+            PRIMARY KEY("origen")
+        )""",
+    ],
+    # 4: cantidad en centimos y fecha como ordinal (date.toordinal), las dos
+    # INTEGER. SQLite no cambia el tipo de una columna: se copia la tabla,
+    # conservando ids y el contador de AUTOINCREMENT, y se rehacen los indices
+    [
+        """CREATE TABLE "movimientos_enteros" (
+            "id"	INTEGER,
+            "tipo_movimiento"	TEXT NOT NULL,
+            "concepto"	TEXT NOT NULL,
+            "fecha"	INTEGER NOT NULL,
+            "cantidad"	INTEGER NOT NULL,
+            "categoria"	INTEGER,
+            PRIMARY KEY("id" AUTOINCREMENT)
+        )""",
+        f"""INSERT INTO movimientos_enteros (id, tipo_movimiento, concepto, fecha, cantidad, categoria)
+            SELECT id, tipo_movimiento, concepto,
+                   CAST(round(julianday(fecha) - {JULIANO_ORDINAL}) AS INTEGER),
+                   CAST(round(cantidad * 100) AS INTEGER),
+                   categoria
+              FROM movimientos""",
+        "DELETE FROM sqlite_sequence WHERE name = 'movimientos_enteros'",
+        """INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'movimientos_enteros', seq FROM sqlite_sequence WHERE name = 'movimientos'""",
+        "DROP TABLE movimientos",
+        "ALTER TABLE movimientos_enteros RENAME TO movimientos",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_tipo_cantidad ON movimientos (tipo_movimiento, cantidad)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_categoria_fecha ON movimientos (categoria, fecha)",
+    ],
+    # 5: totales por mes y saldo, mantenidos por triggers para leerlos sin
+    # recorrer movimientos
+    [
+        """CREATE TABLE IF NOT EXISTS "resumen_mensual" (
+            "anio"	INTEGER NOT NULL,
+            "mes"	INTEGER NOT NULL,
+            "tipo_movimiento"	TEXT NOT NULL,
+            "categoria"	INTEGER NOT NULL,
+            "total"	INTEGER NOT NULL,
+            "n"	INTEGER NOT NULL,
+            PRIMARY KEY("anio", "mes", "tipo_movimiento", "categoria")
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS "saldo" (
+            "id"	INTEGER NOT NULL CHECK("id" = 1),
+            "ingresos"	INTEGER NOT NULL,
+            "gastos"	INTEGER NOT NULL,
+            "n"	INTEGER NOT NULL,
+            PRIMARY KEY("id")
+        )""",
+        *RECONSTRUIR_RESUMEN,
+        f"""CREATE TRIGGER IF NOT EXISTS resumen_alta AFTER INSERT ON movimientos
+        BEGIN
+            {sumar_en_resumen("NEW", "+")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS resumen_baja AFTER DELETE ON movimientos
+        BEGIN
+            {sumar_en_resumen("OLD", "-")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS resumen_cambio
+        AFTER UPDATE OF tipo_movimiento, fecha, cantidad, categoria ON movimientos
+        BEGIN
+            {sumar_en_resumen("OLD", "-")}
+            {sumar_en_resumen("NEW", "+")}
+        END""",
+    ],
+    # 6: busqueda de texto en los conceptos, si SQLite tiene FTS5
+    [
+        crear_busqueda,
+    ],
+    # 7: indices para leer_pagina por cualquier columna sin ordenar la tabla
+    [
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_concepto ON movimientos (concepto)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_cantidad ON movimientos (cantidad)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_categoria ON movimientos (ifnull(categoria, 0))",
+    ],
+    # 8: filtrar por tipo paginando por fecha sin ordenar todo lo que cumple
+    # el filtro (con categoria ya lo hace idx_movimientos_categoria_fecha)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_tipo_fecha ON movimientos (tipo_movimiento, fecha)",
+    ],
+]
+
+def migrar(con):
+    """
+    Aplica las migraciones pendientes, todas en una transaccion. Devuelve
+    la version del esquema resultante.
+    """
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRACIONES):
+        return version
+
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        # otro proceso puede haber migrado mientras esperabamos el bloqueo
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        for sentencias in MIGRACIONES[version:]:
+            for sentencia in sentencias:
+                if callable(sentencia):
+                    sentencia(con)
+                else:
+                    con.execute(sentencia)
+        con.execute(f"PRAGMA user_version = {max(version, len(MIGRACIONES))}")
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+    return max(version, len(MIGRACIONES))
+
+SELECT_MOVIMIENTO = "SELECT id, tipo_movimiento, concepto, fecha, cantidad, categoria FROM movimientos"
+INSERT_MOVIMIENTO = "INSERT INTO movimientos (tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?)"
+UPDATE_MOVIMIENTO = "UPDATE movimientos set concepto = ?, fecha = ?, cantidad = ?, categoria = ? WHERE id = ?"
+DELETE_MOVIMIENTO = "DELETE FROM movimientos where id = ?"
+ORDENES = {"id": "id", "fecha": "fecha, id"}
+# en rowid descendente FTS5 va dando las coincidencias sin tener que ordenarlas
+ORDENES_BUSQUEDA = {"rank": "movimientos_fts.rank, movimientos_fts.rowid DESC",
+                    "recientes": "movimientos_fts.rowid DESC"}
+# columnas por las que se puede ordenar una pagina (ver DaoSqlite.leer_pagina)
+# y la expresion por la que se ordena, la misma de su indice; los ingresos
+# (categoria NULL) van con categoria 0 para poder compararlos
+COLUMNAS_ORDEN = {"fecha": "fecha", "concepto": "concepto", "cantidad": "cantidad",
+                  "categoria": "ifnull(categoria, 0)"}
+
+# Aviso de un cambio en movimientos. tipo es "insertado", "actualizado",
+# "borrado" o "externo" (cambios de otra conexion, sin id ni movimiento).
+Evento = namedtuple("Evento", "tipo id movimiento")
+
+ESPERA_BLOQUEO = 5.0     # s que SQLite espera a que se libere la base de datos
+REINTENTOS_BLOQUEO = 5   # reintentos si aun asi sigue bloqueada
+
+def esta_bloqueada(error):
+    # SQLITE_BUSY (5) o SQLITE_LOCKED (6)
+    return (getattr(error, "sqlite_errorcode", None) in (5, 6)
+            or "locked" in str(error) or "busy" in str(error))
+
+# Limites superiores (segundos) de los tramos del histograma de latencias
+TRAMOS_LATENCIA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+FASES = ("conectar", "ejecutar", "traer", "hidratar")
+# Metodos de DaoSqlite que se miden. iterar no, porque es un generador: su
+# tiempo cuenta dentro de leerTodo
+METODOS_MEDIDOS = ("leer", "grabar", "grabar_lote", "borrar", "borrar_lote", "leerTodo",
+                   "resumen", "leer_columnar", "contar", "leer_pagina", "leer_gasto_mayor",
+                   "filtrar", "buscar", "saldo", "resumen_mes", "resumen_meses")
+SENTENCIAS_EXPLICABLES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+registro_sql = logging.getLogger("kakebo.sql")
+
+class Medida:
+    __slots__ = ("metodo", "inicio", "filas", "fases", "sentencias")
+
+    def __init__(self, metodo):
+        self.metodo = metodo
+        self.inicio = time.perf_counter()
+        self.filas = 0
+        self.fases = dict.fromkeys(FASES, 0.0)
+        # (sql, parametros, cursor) de cada sentencia ejecutada
+        self.sentencias = []
+
+class Instrumentacion:
+    """
+    Tiempos de un DaoSqlite: por cada metodo, histograma de latencias, filas
+    leidas y reparto del tiempo entre conectar, ejecutar, traer filas y
+    crear los movimientos. Las sentencias que pasan de umbral_lenta segundos
+    se escriben en el log "kakebo.sql" con su EXPLAIN QUERY PLAN y se
+    guardan las ultimas max_lentas.
+    """
+    def __init__(self, umbral_lenta=0.1, max_lentas=50):
+        self.umbral_lenta = umbral_lenta
+        self.__local = threading.local()
+        self.__cerrojo = threading.Lock()
+        self.__metodos = {}
+        self.__lentas = deque(maxlen=max_lentas)
+
+    def __pila(self):
+        pila = getattr(self.__local, "pila", None)
+        if pila is None:
+            pila = self.__local.pila = []
+        return pila
+
+    def medir(self, nombre, metodo):
+        def medido(*argumentos, **opciones):
+            pila = self.__pila()
+            medida = Medida(nombre)
+            pila.append(medida)
+            try:
+                return metodo(*argumentos, **opciones)
+            finally:
+                pila.pop()
+                self.__terminar(medida, pila[-1] if pila else None)
+        medido.__name__ = nombre
+        medido.__doc__ = metodo.__doc__
+        return medido
+
+    def sumar(self, fase, segundos, filas=0):
+        pila = self.__pila()
+        if pila:
+            pila[-1].fases[fase] += segundos
+            pila[-1].filas += filas
+
+    def anotar_sentencia(self, sql, parametros, cursor):
+        pila = self.__pila()
+        if pila:
+            pila[-1].sentencias.append((sql, parametros, cursor))
+
+    def __terminar(self, medida, exterior):
+        segundos = time.perf_counter() - medida.inicio
+        if exterior is not None:
+            # el metodo que ha llamado a este tambien ha pasado por ahi
+            for fase, tiempo in medida.fases.items():
+                exterior.fases[fase] += tiempo
+            exterior.filas += medida.filas
+
+        with self.__cerrojo:
+            datos = self.__metodos.get(medida.metodo)
+            if datos is None:
+                datos = self.__metodos[medida.metodo] = {
+                    "llamadas": 0, "filas": 0, "total": 0.0, "maximo": 0.0,
+                    "histograma": [0] * (len(TRAMOS_LATENCIA) + 1),
+                    "fases": dict.fromkeys(FASES, 0.0)}
+            datos["llamadas"] += 1
+            datos["filas"] += medida.filas
+            datos["total"] += segundos
+            datos["maximo"] = max(datos["maximo"], segundos)
+            datos["histograma"][bisect.bisect_left(TRAMOS_LATENCIA, segundos)] += 1
+            for fase, tiempo in medida.fases.items():
+                datos["fases"][fase] += tiempo
+
+        if self.umbral_lenta is not None:
+            vistas = set()
+            for sql, parametros, cursor in medida.sentencias:
+                if cursor.tiempo >= self.umbral_lenta and sql not in vistas:
+                    vistas.add(sql)
+                    self.__anotar_lenta(medida.metodo, sql, parametros, cursor)
+
+    def __anotar_lenta(self, metodo, sql, parametros, cursor):
+        plan = None
+        if sql.lstrip().upper().startswith(SENTENCIAS_EXPLICABLES):
+            if parametros is None:
+                # de executemany solo se sabe cuantos parametros hay
+                parametros = (None,) * sql.count("?")
+            try:
+                # sin pasar por ConexionMedida para no medir la propia explicacion
+                filas = sqlite3.Connection.execute(cursor.connection, f"EXPLAIN QUERY PLAN {sql}", parametros)
+                plan = [fila[3] for fila in filas]
+            except sqlite3.Error:
+                pass
+        lenta = {"metodo": metodo, "sql": " ".join(sql.split()), "segundos": cursor.tiempo, "plan": plan}
+        with self.__cerrojo:
+            self.__lentas.append(lenta)
+        registro_sql.warning("Consulta lenta en %s (%.3f s): %s | plan: %s",
+                             metodo, cursor.tiempo, lenta["sql"], "; ".join(plan or ()))
+
+    def estadisticas(self):
+        with self.__cerrojo:
+            metodos = {}
+            for nombre, datos in self.__metodos.items():
+                tramos = [f"<={limite * 1000:g}ms" for limite in TRAMOS_LATENCIA] + [f">{TRAMOS_LATENCIA[-1] * 1000:g}ms"]
+                metodos[nombre] = {"llamadas": datos["llamadas"],
+                                   "filas": datos["filas"],
+                                   "total": datos["total"],
+                                   "media": datos["total"] / datos["llamadas"],
+                                   "maximo": datos["maximo"],
+                                   "histograma": dict(zip(tramos, datos["histograma"])),
+                                   "fases": dict(datos["fases"])}
+            return {"metodos": metodos, "lentas": list(self.__lentas), "umbral_lenta": self.umbral_lenta}
+
+    def reiniciar(self):
+        with self.__cerrojo:
+            self.__metodos.clear()
+            self.__lentas.clear()
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que suma a la Instrumentacion de su conexion el tiempo de ejecutar
+    y de traer filas. tiempo es lo que lleva gastado esta sentencia.
+    """
+    tiempo = 0.0
+
+    def __medir(self, fase, inicio, filas=0):
+        segundos = time.perf_counter() - inicio
+        self.tiempo += segundos
+        self.connection.instrumentacion.sumar(fase, segundos, filas)
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self.__medir("ejecutar", inicio)
+            self.connection.instrumentacion.anotar_sentencia(sql, parametros, self)
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            self.__medir("ejecutar", inicio)
+            self.connection.instrumentacion.anotar_sentencia(sql, None, self)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self.__medir("traer", inicio, fila is not None)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self.__medir("traer", inicio, len(filas))
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self.__medir("traer", inicio, len(filas))
+        return filas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        fila = super().__next__()
+        self.__medir("traer", inicio, 1)
+        return fila
+
+class ConexionMedida(sqlite3.Connection):
+    # la Instrumentacion se asigna al crear la conexion en DaoSqlite
+    instrumentacion = None
+
+    def execute(self, sql, parametros=()):
+        return self.cursor(CursorMedido).execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor(CursorMedido).executemany(sql, parametros)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.instrumentacion.sumar("ejecutar", time.perf_counter() - inicio)
+
+class DaoSqlite:
+    def __init__(self, ruta, cached_statements=128, tam_cache=0, concurrente=False,
+                 solo_lectura=False, espera=ESPERA_BLOQUEO, reintentos=REINTENTOS_BLOQUEO,
+                 instrumentacion=None):
+        self.ruta = ruta
+        # Una conexion por hilo que se mantiene abierta entre llamadas. Las
+        # consultas son siempre el mismo texto, asi que sqlite3 reutiliza
+        # las sentencias preparadas de su cache (cached_statements).
+        self.cached_statements = cached_statements
+
+        # concurrente: varios procesos leyendo mientras otro escribe. Usa el
+        # diario WAL (los lectores no bloquean al escritor ni al reves) con
+        # synchronous=NORMAL. solo_lectura abre las conexiones en modo ro.
+        self.concurrente = concurrente
+        self.solo_lectura = solo_lectura
+        self.espera = espera
+        self.reintentos = reintentos
+        self.__local = threading.local()
+        self.__conexiones = []
+        self.__cerrojo = threading.Lock()
+        self.__migrado = False
+        self.__consultas = {}
+        self.__suscriptores = []
+        # si la base de datos tiene la tabla de busqueda FTS5, se mira una vez
+        self.__busqueda = None
+
+        # Cache LRU opcional de leer(id) con las filas ya leidas. grabar y
+        # borrar quitan las filas que cambian y los cambios de otras
+        # conexiones se detectan con PRAGMA data_version.
+        self.tam_cache = tam_cache
+        self.__cache = OrderedDict()
+        # cambia con cada invalidacion; una fila leida antes no se guarda
+        self.__generacion_cache = 0
+        self.__cerrojo_cache = threading.Lock()
+        self.__aciertos = 0
+        self.__fallos = 0
+        self.__expulsiones = 0
+
+        # Con una Instrumentacion se sustituyen en esta instancia los metodos
+        # medidos y las conexiones llevan cursores que miden. Sin ella no
+        # cambia nada y no cuesta nada.
+        self.instrumentacion = instrumentacion
+        if instrumentacion is not None:
+            for nombre in METODOS_MEDIDOS:
+                setattr(self, nombre, instrumentacion.medir(nombre, getattr(self, nombre)))
+            self.__a_movimiento = self.__hidratar_midiendo(self.__a_movimiento)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.close()
+
+    def __conexion(self):
+        con = getattr(self.__local, "con", None)
+        if con is None:
+            inicio = time.perf_counter()
+            factoria = sqlite3.Connection if self.instrumentacion is None else ConexionMedida
+            # check_same_thread=False solo para poder cerrarlas desde close();
+            # cada hilo usa exclusivamente la suya.
+            if self.solo_lectura:
+                con = sqlite3.connect(f"{Path(self.ruta).absolute().as_uri()}?mode=ro", uri=True,
+                                      timeout=self.espera,
+                                      cached_statements=self.cached_statements,
+                                      check_same_thread=False,
+                                      factory=factoria)
+            else:
+                con = sqlite3.connect(self.ruta,
+                                      timeout=self.espera,
+                                      cached_statements=self.cached_statements,
+                                      check_same_thread=False,
+                                      factory=factoria)
+            if self.instrumentacion is not None:
+                con.instrumentacion = self.instrumentacion
+            if self.concurrente:
+                con.execute("PRAGMA synchronous = NORMAL")
+
+            with self.__cerrojo:
+                if not self.__migrado and not self.solo_lectura:
+                    if self.concurrente:
+                        # queda guardado en el fichero para todas las conexiones
+                        self.reintentar(con.execute, "PRAGMA journal_mode = WAL")
+                    self.reintentar(migrar, con)
+                    self.__migrado = True
+                self.__conexiones.append(con)
+            self.__local.con = con
+            # movimientos que han recibido id y eventos pendientes de la
+            # transaccion en curso
+            self.__local.altas = []
+            self.__local.eventos = []
+            self.__local.tocados = []
+            if self.instrumentacion is not None:
+                self.instrumentacion.sumar("conectar", time.perf_counter() - inicio)
+        return con
+
+    def close(self):
+        with self.__cerrojo:
+            conexiones = self.__conexiones
+            self.__conexiones = []
+        for con in conexiones:
+            con.close()
+        self.__local = threading.local()
     
     def leer(self, id):
-        con = sqlite3.connect(self.ruta)
-        cur = con.cursor()
-        
-        query = "SELECT id, tipo_movimiento, concepto, fecha, cantidad, categoria FROM movimientos WHERE id = ?"
-        
-        res = cur.execute(query, (id,))
-        valores = res.fetchone()
-        con.close()
+        con = self.__conexion()
+
+        if self.tam_cache:
+            valores = self.__leer_con_cache(con, id)
+        else:
+            valores = self.__leer_fila(con, id)
         
         if valores:
-            if valores[1] == "I":
-                return Ingreso(valores[2], date.fromisoformat(valores[3]), valores[4], valores[0])
-            elif valores[1] == "G":
-                return Gasto(valores[2], date.fromisoformat(valores[3]), valores[4], CategoriaGastos(valores[5]), valores[0])
+            return self.__a_movimiento(valores)
 
         return None
+
+    def __leer_fila(self, con, id):
+        cur = con.execute(f"{SELECT_MOVIMIENTO} WHERE id = ?", (id,))
+        valores = cur.fetchone()
+        # cerrar el cursor libera el bloqueo de lectura de la sentencia
+        cur.close()
+        return valores
+
+    def __leer_con_cache(self, con, id):
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        with self.__cerrojo_cache:
+            if getattr(self.__local, "version", None) != version:
+                # alguien ha escrito desde otra conexion, o es la primera
+                # vez que este hilo consulta la cache
+                self.__cache.clear()
+                self.__local.version = version
+
+            valores = self.__cache.get(id)
+            if valores is not None:
+                self.__cache.move_to_end(id)
+                self.__aciertos += 1
+                return valores
+            self.__fallos += 1
+            generacion = self.__generacion_cache
+
+        valores = self.__leer_fila(con, id)
+        if valores is not None:
+            with self.__cerrojo_cache:
+                if generacion != self.__generacion_cache:
+                    # se ha invalidado mientras se leia, puede ser antigua
+                    return valores
+                self.__cache[id] = valores
+                if len(self.__cache) > self.tam_cache:
+                    self.__cache.popitem(last=False)
+                    self.__expulsiones += 1
+        return valores
+
+    def __invalidar(self, ids=None):
+        if not self.tam_cache:
+            return
+        with self.__cerrojo_cache:
+            self.__generacion_cache += 1
+            if ids is None:
+                self.__cache.clear()
+            else:
+                for id in ids:
+                    self.__cache.pop(id, None)
+
+    def __tocar(self, ids):
+        # Se quitan de la cache ya y otra vez despues del commit: mientras la
+        # transaccion esta abierta otro hilo todavia lee la fila anterior y
+        # la puede volver a guardar.
+        if not self.tam_cache:
+            return
+        ids = list(ids)
+        self.__invalidar(ids)
+        self.__local.tocados.extend(ids)
+
+    def estadisticas_cache(self):
+        with self.__cerrojo_cache:
+            return {"capacidad": self.tam_cache,
+                    "entradas": len(self.__cache),
+                    "aciertos": self.__aciertos,
+                    "fallos": self.__fallos,
+                    "expulsiones": self.__expulsiones}
     
-    def grabar(self, movimiento):
-        con = sqlite3.connect(self.ruta)
-        cur = con.cursor()
-        
+    def estadisticas(self):
+        """
+        Copia de lo medido por la Instrumentacion (ver Instrumentacion.estadisticas),
+        o None si el dao no se creo con una.
+        """
+        if self.instrumentacion is None:
+            return None
+        return self.instrumentacion.estadisticas()
+
+    def __hidratar_midiendo(self, a_movimiento):
+        instrumentacion = self.instrumentacion
+
+        def hidratar(valores):
+            inicio = time.perf_counter()
+            movimiento = a_movimiento(valores)
+            instrumentacion.sumar("hidratar", time.perf_counter() - inicio)
+            return movimiento
+        return hidratar
+    
+    @contextmanager
+    def transaccion(self):
+        """
+        Agrupa varias escrituras en una sola transaccion (un unico commit).
+        Si ya hay una transaccion abierta en la conexion del hilo se une a
+        ella y la confirma quien la abrio. Los eventos de los cambios se
+        envian a los suscriptores despues del commit.
+        """
+        con = self.__conexion()
+        if con.in_transaction:
+            yield con
+            return
+
+        self.reintentar(con.execute, "BEGIN IMMEDIATE")
+        try:
+            yield con
+            self.reintentar(con.commit)
+        except BaseException:
+            con.rollback()
+            # los ids dados en la transaccion ya no valen
+            for movimiento in self.__local.altas:
+                movimiento.id = None
+            self.__local.altas = []
+            self.__local.eventos = []
+            self.__local.tocados = []
+            # lo leido durante la transaccion puede no existir ya
+            self.__invalidar()
+            raise
+
+        eventos = self.__local.eventos
+        tocados = self.__local.tocados
+        self.__local.altas = []
+        self.__local.eventos = []
+        self.__local.tocados = []
+        if tocados:
+            self.__invalidar(tocados)
+        self.__notificar(eventos)
+
+    @contextmanager
+    def carga_masiva(self):
+        """
+        Transaccion para grabar muchas altas seguidas, como importar_csv.
+        Dentro no estan los triggers que suman cada alta en resumen_mensual,
+        saldo y la busqueda: al terminar se suma todo lo insertado con una
+        sentencia por tabla y se vuelven a crear, en la misma transaccion,
+        asi que las demas conexiones nunca los ven quitados. Dentro solo
+        deben hacerse altas.
+        """
+        with self.transaccion() as con:
+            ultimo = con.execute("SELECT coalesce(max(id), 0) FROM movimientos").fetchone()[0]
+            marcas = ", ".join("?" * len(TRIGGERS_ALTA))
+            triggers = dict(con.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                                        f"AND name IN ({marcas})", TRIGGERS_ALTA).fetchall())
+            for nombre in triggers:
+                con.execute(f"DROP TRIGGER {nombre}")
+            yield con
+            for sentencia in SUMAR_ALTAS:
+                con.execute(sentencia, (ultimo,))
+            if "movimientos_fts_alta" in triggers:
+                con.execute(SUMAR_ALTAS_BUSQUEDA, (ultimo,))
+            for sql in triggers.values():
+                con.execute(sql)
+
+    def reintentar(self, funcion, *argumentos):
+        """
+        Llama a funcion y, si la base de datos sigue bloqueada por otro
+        proceso tras la espera de SQLite, reintenta con esperas cada vez
+        mayores.
+        """
+        pausa = 0.05
+        for intento in range(self.reintentos + 1):
+            try:
+                return funcion(*argumentos)
+            except sqlite3.OperationalError as error:
+                if intento == self.reintentos or not esta_bloqueada(error):
+                    raise
+            time.sleep(pausa * random.uniform(0.5, 1.5))
+            pausa *= 2
+
+    def suscribir(self, funcion):
+        """
+        funcion(evento) se llamara con un Evento por cada movimiento
+        insertado, actualizado o borrado, desde el hilo que hizo el cambio.
+        """
+        self.__suscriptores.append(funcion)
+
+    def desuscribir(self, funcion):
+        self.__suscriptores.remove(funcion)
+
+    def comprobar_cambios(self):
+        """
+        Envia un evento "externo" si otra conexion ha confirmado cambios desde
+        la ultima comprobacion. Los commits de la conexion de este mismo hilo
+        no cuentan, por eso conviene llamarlo desde el hilo que graba.
+        Devuelve True si ha habido cambios.
+        """
+        version = self.__conexion().execute("PRAGMA data_version").fetchone()[0]
+        anterior = getattr(self.__local, "version_eventos", None)
+        self.__local.version_eventos = version
+        if anterior is None or anterior == version:
+            return False
+
+        self.__invalidar()
+        self.__notificar([Evento("externo", None, None)])
+        return True
+
+    def __notificar(self, eventos):
+        for evento in eventos:
+            for funcion in list(self.__suscriptores):
+                funcion(evento)
+
+    def __anotar(self, tipo, id, movimiento=None):
+        if self.__suscriptores:
+            self.__local.eventos.append(Evento(tipo, id, movimiento))
+
+    def __tipo_y_categoria(self, movimiento):
         if isinstance(movimiento, Ingreso):
-            tipo_mv = "I"
-            categoria = None
+            return "I", None
         elif isinstance(movimiento, Gasto):
-            tipo_mv = "G"
-            categoria = movimiento.categoria.value
-            
-        
-        if movimiento.id is None:
-            query = "INSERT INTO movimientos (tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?)"
-            
-            cur.execute(query, (tipo_mv, movimiento.concepto, movimiento.fecha, movimiento.cantidad, categoria))
-            
-        else:
-            query = "UPDATE movimientos set concepto = ?, fecha = ?, cantidad = ?, categoria = ? WHERE id = ?"
-            
-            cur.execute(query, (movimiento.concepto, movimiento.fecha, movimiento.cantidad, categoria, movimiento.id))
-            
-        
-        con.commit()
-        con.close()
+            return "G", movimiento.categoria.value
+        raise TypeError("Movimiento debe ser Ingreso o Gasto.")
+
+    def grabar(self, movimiento):
+        tipo_mv, categoria = self.__tipo_y_categoria(movimiento)
+
+        with self.transaccion() as con:
+            if movimiento.id is None:
+                cur = con.execute(INSERT_MOVIMIENTO, (tipo_mv, movimiento.concepto, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad), categoria))
+                movimiento.id = cur.lastrowid
+                self.__local.altas.append(movimiento)
+                self.__anotar("insertado", movimiento.id, movimiento)
+            else:
+                con.execute(UPDATE_MOVIMIENTO, (movimiento.concepto, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad), categoria, movimiento.id))
+                self.__tocar((movimiento.id,))
+                self.__anotar("actualizado", movimiento.id, movimiento)
+
+    def grabar_lote(self, movimientos, tam_lote=500):
+        """
+        Graba cualquier iterable de movimientos en una sola transaccion. Las
+        altas (id None) y las modificaciones se envian por separado con
+        executemany en bloques de tam_lote filas.
+        Devuelve los ids en el mismo orden de entrada.
+        """
+        ids = []
+        altas = []
+        insertados = []
+        cambios = []
+        cambiados = []
+
+        with self.transaccion() as con:
+            for movimiento in movimientos:
+                tipo_mv, categoria = self.__tipo_y_categoria(movimiento)
+                if movimiento.id is None:
+                    altas.append((tipo_mv, movimiento.concepto, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad), categoria))
+                    insertados.append((len(ids), movimiento))
+                    ids.append(None)
+                    if len(altas) == tam_lote:
+                        self.__insertar_altas(con, altas, insertados, ids)
+                else:
+                    cambios.append((movimiento.concepto, a_ordinal(movimiento.fecha), a_centimos(movimiento.cantidad), categoria, movimiento.id))
+                    cambiados.append(movimiento)
+                    ids.append(movimiento.id)
+                    if len(cambios) == tam_lote:
+                        self.__actualizar_cambios(con, cambios, cambiados)
+
+            if altas:
+                self.__insertar_altas(con, altas, insertados, ids)
+            if cambios:
+                self.__actualizar_cambios(con, cambios, cambiados)
+
+        return ids
+
+    def __actualizar_cambios(self, con, cambios, cambiados):
+        con.executemany(UPDATE_MOVIMIENTO, cambios)
+        self.__tocar(movimiento.id for movimiento in cambiados)
+        for movimiento in cambiados:
+            self.__anotar("actualizado", movimiento.id, movimiento)
+        cambios.clear()
+        cambiados.clear()
+
+    def __insertar_altas(self, con, altas, insertados, ids):
+        con.executemany(INSERT_MOVIMIENTO, altas)
+        # Dentro de la transaccion nadie mas escribe y la tabla es
+        # AUTOINCREMENT, asi que los ids del bloque son consecutivos.
+        ultimo = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+        primero = ultimo - len(altas) + 1
+        for desplazamiento, (posicion, movimiento) in enumerate(insertados):
+            movimiento.id = ids[posicion] = primero + desplazamiento
+            self.__anotar("insertado", movimiento.id, movimiento)
+        self.__local.altas.extend(movimiento for _, movimiento in insertados)
+        altas.clear()
+        insertados.clear()
         
     def borrar(self, id):
-        con = sqlite3.connect(self.ruta)
-        cur = con.cursor()
-        
-        query = "DELETE FROM movimientos where id = ?"
-        cur.execute(query, (id,))
-        con.commit()
-        con.close()
+        with self.transaccion() as con:
+            if con.execute(DELETE_MOVIMIENTO, (id,)).rowcount:
+                self.__anotar("borrado", id)
+            self.__tocar((id,))
+
+    def borrar_lote(self, ids, tam_lote=500):
+        """
+        Borra todos los ids en una sola transaccion. Devuelve cuantos
+        movimientos se han borrado.
+        """
+        borrados = 0
+        with self.transaccion() as con:
+            lote = []
+            for id in ids:
+                lote.append(id)
+                if len(lote) == tam_lote:
+                    borrados += self.__borrar_ids(con, lote)
+            if lote:
+                borrados += self.__borrar_ids(con, lote)
+        return borrados
+
+    def __borrar_ids(self, con, lote):
+        # RETURNING da solo los ids que existian, los demas no se avisan
+        marcas = ", ".join("?" * len(lote))
+        borrados = [id for id, in con.execute(f"DELETE FROM movimientos WHERE id IN ({marcas}) RETURNING id", lote)]
+        self.__tocar(borrados)
+        for id in borrados:
+            self.__anotar("borrado", id)
+        lote.clear()
+        return len(borrados)
      
-    def leerTodo(self):
-        con = sqlite3.connect(self.ruta)
-        cur = con.cursor()
+    def leerTodo(self, stream=False, tam_lote=500):
+        """
+        Devuelve la lista de todos los movimientos ordenados por id. Con
+        stream=True devuelve un generador (ver iterar) en lugar de la lista.
+        """
+        if stream:
+            return self.iterar(tam_lote)
+        return list(self.iterar(tam_lote))
 
-        query = "SELECT id, tipo_movimiento, concepto, fecha, cantidad, categoria FROM movimientos"
+    def iterar(self, tam_lote=500, orden="id", desde=None, hasta=None):
+        """
+        Genera los movimientos de uno en uno leyendo de la base de datos en
+        bloques de tam_lote filas, sin cargar la tabla entera en memoria.
+        orden puede ser "id" o "fecha". desde y hasta (incluidos) limitan
+        las fechas.
+        """
+        where, parametros = self.__rango_fechas(desde, hasta)
+        query = f"{SELECT_MOVIMIENTO} {where} ORDER BY {ORDENES[orden]}"
 
-        res = cur.execute(query)
-        valores = res.fetchall() # para coger de la base de datos 
-        con.close()
-        
-        lista_completa= []
-        for valor in valores :
-            if valor[1] == "I":
-                lista_completa.append(Ingreso(valor[2], date.fromisoformat(valor[3]), valor[4], valor[0]))
-                
-            elif valor[1] == "G":
-                lista_completa.append(Gasto(valor[2], date.fromisoformat(valor[3]), valor[4], CategoriaGastos(valor[5]), valores[0]))
-                
-        return lista_completa
-
-    def leer_gasto_mayor(self,valor):
-
-        con = sqlite3.connect(self.ruta)
-        cur = con.cursor()
-
-        query="SELECT id, tipo_movimiento, concepto, fecha, cantidad, categoria FROM movimientos WHERE cantidad > ? AND tipo_movimiento=?"
-
-        res = cur.execute(query, (valor,"G"))
-        filas = res.fetchall()
-        con.close()
-
-        for valores in filas:
-            if valores[1]=="G":
-                id=valores[0]
-                Gasto(valores[2], date.fromisoformat(valores[3]), valores[4], CategoriaGastos(valores[5]), valores[0])
-                #print(id, valores[1],DaoSqlite.leer(self,id))       
-       
-        
\ No newline at end of file
+        cur = self.__conexion().execute(query, parametros)
+        try:
+            filas = cur.fetchmany(tam_lote)
+            while filas:
+                for fila in filas:
+                    yield self.__a_movimiento(fila)
+                filas = cur.fetchmany(tam_lote)
+        finally:
+            cur.close()
+
+    def __a_movimiento(self, valores):
+        # en la base de datos: fecha como ordinal y cantidad en centimos
+        if valores[1] == "I":
+            return Ingreso.desde_fila(valores[2], fecha_ordinal(valores[3]), valores[4] / 100, valores[0])
+        elif valores[1] == "G":
+            return Gasto.desde_fila(valores[2], fecha_ordinal(valores[3]), valores[4] / 100, CATEGORIAS[valores[5]], valores[0])
+
+    def resumen(self, desde=None, hasta=None, agrupacion="mes"):
+        """
+        Hoja Kakebo de cada periodo entre desde y hasta (ambos incluidos):
+        ingresos, gastos por categoria, ahorro y numero de movimientos.
+        agrupacion puede ser "mes", "semana" o "año". La agregacion la hace
+        SQLite y solo se traen a Python las sumas.
+        """
+        where, parametros = self.__rango_fechas(desde, hasta)
+
+        query = f"""SELECT strftime(?, fecha + {JULIANO_ORDINAL}) AS periodo, categoria, SUM(cantidad), COUNT(*)
+                      FROM movimientos {where}
+                     GROUP BY periodo, tipo_movimiento, categoria"""
+
+        resumen = ResumenKakebo()
+        for periodo, categoria, total, movimientos in self.__conexion().execute(query, [FORMATOS_PERIODO[agrupacion]] + parametros):
+            resumen.sumar(periodo, CATEGORIAS.get(categoria), total / 100, movimientos)
+        return resumen.filas()
+
+    def __rango_fechas(self, desde, hasta):
+        condiciones = []
+        parametros = []
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(a_ordinal(desde))
+        if hasta is not None:
+            condiciones.append("fecha <= ?")
+            parametros.append(a_ordinal(hasta))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return where, parametros
+
+    def leer_columnar(self, desde=None, hasta=None, tam_lote=5000):
+        """
+        Carga los movimientos entre desde y hasta en un MovimientosFrame,
+        ordenados por fecha, sin crear un objeto por movimiento.
+        """
+        where, parametros = self.__rango_fechas(desde, hasta)
+
+        frame = MovimientosFrame()
+        cur = self.__conexion().execute(f"{SELECT_MOVIMIENTO} {where} ORDER BY {ORDENES['fecha']}", parametros)
+        try:
+            filas = cur.fetchmany(tam_lote)
+            while filas:
+                for id, tipo_mv, concepto, fecha, cantidad, categoria in filas:
+                    frame.agregar(id, tipo_mv == "G", concepto, fecha, cantidad / 100, categoria or 0)
+                filas = cur.fetchmany(tam_lote)
+        finally:
+            cur.close()
+        return frame
+
+    def punto_control(self, origen):
+        """
+        (posicion, filas) de la ultima importacion confirmada desde origen,
+        o None si no hay ninguna.
+        """
+        return self.__conexion().execute("SELECT posicion, filas FROM importaciones WHERE origen = ?",
+                                         (origen,)).fetchone()
+
+    def guardar_punto_control(self, origen, posicion, filas):
+        # dentro de la transaccion del lote, asi lote y punto de control
+        # se confirman o se pierden juntos
+        with self.transaccion() as con:
+            con.execute("INSERT OR REPLACE INTO importaciones (origen, posicion, filas) VALUES (?, ?, ?)",
+                        (origen, posicion, filas))
+
+    def borrar_punto_control(self, origen):
+        with self.transaccion() as con:
+            con.execute("DELETE FROM importaciones WHERE origen = ?", (origen,))
+
+    def saldo(self):
+        """
+        Ingresos, gastos, saldo y numero de todos los movimientos, de la
+        tabla saldo que mantienen los triggers: cuesta lo mismo con cualquier
+        numero de movimientos.
+        """
+        ingresos, gastos, movimientos = self.__conexion().execute(
+            "SELECT ingresos, gastos, n FROM saldo").fetchone()
+        return {"ingresos": ingresos / 100,
+                "gastos": gastos / 100,
+                "saldo": (ingresos - gastos) / 100,
+                "movimientos": movimientos}
+
+    def resumen_mes(self, anio, mes):
+        """
+        Hoja Kakebo de un mes como las filas de resumen(), leida de
+        resumen_mensual. None si el mes no tiene movimientos.
+        """
+        filas = self.__resumen_guardado("WHERE anio = ? AND mes = ?", (anio, mes))
+        return filas[0] if filas else None
+
+    def resumen_meses(self, desde=None, hasta=None):
+        """
+        Lo mismo que resumen() por meses, pero desde resumen_mensual y sin
+        recorrer movimientos. desde y hasta cogen el mes entero de la fecha
+        dada. Cada fila lleva ademas el saldo acumulado al final del mes.
+        """
+        condiciones = []
+        parametros = []
+        if desde is not None:
+            condiciones.append("(anio, mes) >= (?, ?)")
+            parametros.extend((desde.year, desde.month))
+        if hasta is not None:
+            condiciones.append("(anio, mes) <= (?, ?)")
+            parametros.extend((hasta.year, hasta.month))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self.__resumen_guardado(where, parametros)
+
+        acumulado = 0
+        if desde is not None:
+            acumulado = self.__conexion().execute(
+                """SELECT coalesce(SUM(CASE tipo_movimiento WHEN 'I' THEN total ELSE -total END), 0)
+                     FROM resumen_mensual WHERE (anio, mes) < (?, ?)""", (desde.year, desde.month)).fetchone()[0] / 100
+        for fila in filas:
+            acumulado += fila["ahorro"]
+            fila["saldo"] = acumulado
+        return filas
+
+    def __resumen_guardado(self, where, parametros):
+        resumen = ResumenKakebo()
+        query = f"SELECT anio, mes, categoria, total, n FROM resumen_mensual {where}"
+        for anio, mes, categoria, total, movimientos in self.__conexion().execute(query, parametros):
+            resumen.sumar(f"{anio:04d}-{mes:02d}", CATEGORIAS.get(categoria), total / 100, movimientos)
+        return resumen.filas()
+
+    def reconstruir_resumen(self):
+        """
+        Rehace resumen_mensual y saldo a partir de movimientos.
+        """
+        with self.transaccion() as con:
+            for sentencia in RECONSTRUIR_RESUMEN:
+                con.execute(sentencia)
+
+    def comprobar_resumen(self):
+        """
+        Compara resumen_mensual y saldo con lo que sale de sumar movimientos.
+        Devuelve la lista de diferencias (clave, guardado, calculado), vacia
+        si todo cuadra. La clave es (anio, mes, tipo_movimiento, categoria)
+        con (total, n) o "saldo" con (ingresos, gastos, n).
+        """
+        con = self.__conexion()
+        propia = not con.in_transaction
+        if propia:
+            # las dos lecturas de la misma foto de la base de datos
+            con.execute("BEGIN")
+        try:
+            guardado = {fila[:4]: fila[4:] for fila in con.execute(
+                "SELECT anio, mes, tipo_movimiento, categoria, total, n FROM resumen_mensual")}
+            calculado = {fila[:4]: fila[4:] for fila in con.execute(CALCULAR_RESUMEN_MENSUAL)}
+            guardado["saldo"] = con.execute("SELECT ingresos, gastos, n FROM saldo").fetchone()
+            calculado["saldo"] = con.execute(CALCULAR_SALDO).fetchone()
+        finally:
+            if propia:
+                con.rollback()
+
+        return [(clave, guardado.get(clave), calculado.get(clave))
+                for clave in sorted(guardado.keys() | calculado.keys(), key=str)
+                if guardado.get(clave) != calculado.get(clave)]
+
+    def compactar(self):
+        """
+        VACUUM: rehace el fichero sin las paginas que dejan libres los
+        borrados y actualiza las estadisticas del planificador. Con WAL
+        vacia tambien el diario. No puede haber una transaccion abierta.
+        """
+        con = self.__conexion()
+        self.reintentar(con.execute, "VACUUM")
+        if self.concurrente:
+            self.reintentar(con.execute, "PRAGMA wal_checkpoint(TRUNCATE)")
+        con.execute("PRAGMA optimize")
+
+    def contar(self):
+        return self.__conexion().execute("SELECT COUNT(*) FROM movimientos").fetchone()[0]
+
+    def fechas_extremas(self):
+        """
+        (primera, ultima) fecha de los movimientos, None si no hay ninguno.
+        """
+        primera, ultima = self.__conexion().execute("SELECT MIN(fecha), MAX(fecha) FROM movimientos").fetchone()
+        if primera is None:
+            return None
+        return fecha_ordinal(primera), fecha_ordinal(ultima)
+
+    def leer_pagina(self, inicio, cantidad, orden="fecha", descendente=False, despues_de=None, antes_de=None):
+        """
+        Los movimientos de las posiciones inicio a inicio + cantidad segun el
+        orden por la columna indicada, que hace SQLite con su indice. Pensado
+        para listas que solo muestran unas filas de la tabla.
+        Para la pagina que sigue a una ya leida se da en despues_de su ultimo
+        movimiento, y para la anterior en antes_de el primero; entonces no se
+        usa inicio y cuesta lo mismo por lejos que este.
+        """
+        if orden not in COLUMNAS_ORDEN:
+            raise ValueError(f"No se puede ordenar por {orden}")
+        expresion = COLUMNAS_ORDEN[orden]
+        referencia = despues_de if antes_de is None else antes_de
+        # hacia atras se lee en el sentido contrario y se le da la vuelta
+        if antes_de is not None:
+            descendente = not descendente
+        sentido = "DESC" if descendente else "ASC"
+        orden_sql = f"ORDER BY {expresion} {sentido}, id {sentido}"
+
+        if referencia is None:
+            query = f"{SELECT_MOVIMIENTO} {orden_sql} LIMIT ? OFFSET ?"
+            parametros = (cantidad, inicio)
+        else:
+            # lo que queda con el mismo valor y despues lo de los valores
+            # siguientes: asi las dos partes buscan en el indice, con
+            # (expresion, id) > (?, ?) SQLite lo recorreria desde el principio.
+            # UNION ALL no asegura el orden de las filas, el ORDER BY de fuera
+            # si, y solo ordena las 2 * cantidad filas como mucho
+            mayor = "<" if descendente else ">"
+            query = f"""SELECT * FROM (
+                            SELECT * FROM ({SELECT_MOVIMIENTO} WHERE {expresion} = ?1 AND id {mayor} ?2
+                                           ORDER BY id {sentido} LIMIT ?3)
+                            UNION ALL
+                            SELECT * FROM ({SELECT_MOVIMIENTO} WHERE {expresion} {mayor} ?1 {orden_sql} LIMIT ?3))
+                        {orden_sql} LIMIT ?3"""
+            parametros = (self.__valor_orden(referencia, orden), referencia.id, cantidad)
+
+        pagina = [self.__a_movimiento(valores) for valores in self.__conexion().execute(query, parametros)]
+        if antes_de is not None:
+            pagina.reverse()
+        return pagina
+
+    def __valor_orden(self, movimiento, orden):
+        # el valor de la columna de orden como esta guardado
+        if orden == "fecha":
+            return a_ordinal(movimiento.fecha)
+        if orden == "cantidad":
+            return a_centimos(movimiento.cantidad)
+        if orden == "concepto":
+            return movimiento.concepto
+        return movimiento.categoria.value if isinstance(movimiento, Gasto) else 0
+
+    def leer_gasto_mayor(self, valor):
+        """
+        Lista de los gastos con cantidad mayor que valor.
+        """
+        query = f"{SELECT_MOVIMIENTO} WHERE cantidad > ? AND tipo_movimiento = ? ORDER BY id"
+
+        return [self.__a_movimiento(valores) for valores in self.__conexion().execute(query, (a_centimos(valor), "G"))]
+
+    def filtrar(self, desde=None, hasta=None, tipo=None, categorias=None, min_cantidad=None,
+                max_cantidad=None, texto=None, limite=50, despues_de=None):
+        """
+        Pagina de hasta limite movimientos que cumplen todos los filtros
+        dados, ordenada por fecha e id. tipo es Ingreso o Gasto, categorias
+        una lista de CategoriaGastos y texto se busca dentro del concepto.
+        Para pedir la pagina siguiente se pasa en despues_de el (fecha, id)
+        del ultimo movimiento recibido, asi cada pagina cuesta lo mismo por
+        lejos que este.
+        """
+        condiciones, parametros = self.__condiciones(desde, hasta, tipo, categorias, min_cantidad, max_cantidad)
+        if texto is not None:
+            condiciones.append("concepto LIKE ? ESCAPE '\\'")
+            parametros.append("%" + texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if despues_de is not None:
+            condiciones.append("(fecha, id) > (?, ?)")
+            fecha, id = despues_de
+            parametros.extend((a_ordinal(fecha), id))
+        if limite is not None:
+            parametros.append(limite)
+
+        # el texto de la consulta solo depende de que filtros se usan; se
+        # guarda por forma para no montarlo de nuevo y para que sqlite3
+        # reutilice la sentencia preparada
+        forma = (tuple(condiciones), limite is not None)
+        query = self.__consultas.get(forma)
+        if query is None:
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+            query = f"{SELECT_MOVIMIENTO} {where} ORDER BY {ORDENES['fecha']}"
+            if limite is not None:
+                query += " LIMIT ?"
+            self.__consultas[forma] = query
+
+        return [self.__a_movimiento(valores) for valores in self.__conexion().execute(query, parametros)]
+
+    def __condiciones(self, desde, hasta, tipo, categorias, min_cantidad=None, max_cantidad=None):
+        condiciones = []
+        parametros = []
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(a_ordinal(desde))
+        if hasta is not None:
+            condiciones.append("fecha <= ?")
+            parametros.append(a_ordinal(hasta))
+        if tipo is not None:
+            condiciones.append("tipo_movimiento = ?")
+            parametros.append("G" if tipo is Gasto else "I")
+        if categorias:
+            # con varias, idx_movimientos_categoria_fecha da cada una en orden
+            # pero no todas juntas; con + SQLite no lo usa y va por fecha
+            columna = "+categoria" if len(categorias) > 1 else "categoria"
+            condiciones.append(f"{columna} IN ({', '.join('?' * len(categorias))})")
+            parametros.extend(cat.value for cat in categorias)
+        if min_cantidad is not None:
+            condiciones.append("cantidad >= ?")
+            parametros.append(a_centimos(min_cantidad))
+        if max_cantidad is not None:
+            condiciones.append("cantidad <= ?")
+            parametros.append(a_centimos(max_cantidad))
+        return condiciones, parametros
+
+    def buscar(self, texto, limite=50, desde=None, hasta=None, tipo=None, categorias=None,
+               prefijo=True, orden="recientes"):
+        """
+        Movimientos cuyo concepto contiene todas las palabras de texto, sin
+        distinguir mayusculas ni acentos. Con prefijo cada palabra vale
+        tambien como principio de otra ("farma" encuentra "Farmacia").
+        orden "recientes" da primero los ultimos grabados y "rank" lo mas
+        parecido (bm25). "rank" tiene que puntuar todas las coincidencias y
+        con una palabra comun en un libro grande tarda decenas de ms, por eso
+        no es el orden por defecto. Los demas filtros son los de filtrar().
+        """
+        if orden not in ORDENES_BUSQUEDA:
+            raise ValueError(f"No se puede ordenar la busqueda por {orden}")
+        palabras = PALABRA.findall(texto)
+        if not palabras:
+            return []
+        condiciones, parametros = self.__condiciones(desde, hasta, tipo, categorias)
+
+        if self.__hay_busqueda():
+            consulta = " ".join(f'"{palabra}"*' if prefijo else f'"{palabra}"' for palabra in palabras)
+            condiciones.insert(0, "movimientos_fts MATCH ?")
+            parametros.insert(0, consulta)
+            query = f"""SELECT m.id, m.tipo_movimiento, m.concepto, m.fecha, m.cantidad, m.categoria
+                          FROM movimientos_fts JOIN movimientos m ON m.id = movimientos_fts.rowid
+                         WHERE {' AND '.join(condiciones)}
+                         ORDER BY {ORDENES_BUSQUEDA[orden]} LIMIT ?"""
+        else:
+            # sin FTS5: LIKE por cada palabra en cualquier parte del concepto,
+            # sin relevancia y recorriendo la tabla
+            for palabra in palabras:
+                condiciones.append("concepto LIKE ? ESCAPE '\\'")
+                parametros.append("%" + palabra.replace("_", "\\_") + "%")
+            query = f"{SELECT_MOVIMIENTO} WHERE {' AND '.join(condiciones)} ORDER BY id DESC LIMIT ?"
+        parametros.append(limite)
+
+        return [self.__a_movimiento(valores) for valores in self.__conexion().execute(query, parametros)]
+
+    def __hay_busqueda(self):
+        if self.__busqueda is None:
+            self.__busqueda = self.__conexion().execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'movimientos_fts'").fetchone() is not None
+        return self.__busqueda
+
+def importar_csv(ruta_csv, dao, tam_lote=5000, progreso=None, reanudar=True):
+    """
+    Pasa los movimientos de un csv de DaoCSV a un DaoSqlite sin cargar el
+    fichero en memoria: lee, valida y graba por lotes de tam_lote, cada uno
+    en su propia transaccion junto con el punto de control. Si se corta, la
+    siguiente llamada sigue donde se quedo (y si el csv ha crecido, importa
+    solo lo nuevo). progreso(filas, bytes_leidos, bytes_totales) se llama
+    tras cada lote. Devuelve las filas importadas en esta llamada.
+    """
+    origen = os.path.abspath(ruta_csv)
+    if not reanudar:
+        dao.borrar_punto_control(origen)
+    punto = dao.punto_control(origen)
+    posicion, filas = punto if punto else (None, 0)
+
+    total = os.path.getsize(ruta_csv)
+    importadas = 0
+    for lote, posicion in DaoCSV(ruta_csv).leer_lotes(tam_lote, posicion):
+        filas += len(lote)
+        importadas += len(lote)
+        with dao.carga_masiva():
+            dao.grabar_lote(lote, tam_lote)
+            dao.guardar_punto_control(origen, posicion, filas)
+        if progreso is not None:
+            progreso(filas, posicion, total)
+    return importadas
+
+def exportar_csv(dao, ruta_csv, tam_lote=5000, progreso=None):
+    """
+    Escribe todos los movimientos de un DaoSqlite en un csv con el formato de
+    DaoCSV, leyendo por lotes. Se escribe en un fichero temporal que solo
+    sustituye al destino al terminar. progreso(filas, total) se llama tras
+    cada lote. Devuelve las filas exportadas.
+    """
+    total = dao.contar()
+    temporal = f"{ruta_csv}.tmp"
+    filas = 0
+    with open(temporal, "w", newline="", encoding=CODIFICACION_CSV) as f:
+        f.write(CABECERA_CSV)
+        writer = csv.writer(f, delimiter=",", quotechar='"')
+        lote = []
+        for movimiento in dao.iterar(tam_lote):
+            categoria = movimiento.categoria.value if isinstance(movimiento, Gasto) else ""
+            lote.append((movimiento.concepto, movimiento.fecha, movimiento.cantidad, categoria))
+            if len(lote) == tam_lote:
+                writer.writerows(lote)
+                filas += len(lote)
+                lote.clear()
+                if progreso is not None:
+                    progreso(filas, total)
+        writer.writerows(lote)
+        filas += len(lote)
+        if progreso is not None:
+            progreso(filas, total)
+    os.replace(temporal, ruta_csv)
+    return filas
@@ -1,5 +1,6 @@
 import tkinter as tk
 from tkinter import ttk
+from collections import OrderedDict
 from datetime import date
 from kakebo import WIDTH, PAD_DEFAULT
 from kakebo.modelos import CategoriaGastos, Ingreso, Gasto
@@ -279,8 +280,196 @@ class FormMovimiento(tk.Frame):
                                      self.cantidad.value)
                 
             self.acceptCommand(self.value)
-            
-            
-        
-            
-        
\ No newline at end of file
+
+
+class ListaMovimientos(tk.Frame):
+    """
+    Lista de movimientos que solo crea las filas visibles del Treeview y las
+    reutiliza al desplazarse. Los movimientos se piden al dao por paginas y
+    se guardan unas pocas en memoria; ordenar por columna lo hace SQLite.
+    Se puede crear sin dao y darselo despues con mostrar().
+    """
+    COLUMNAS = {"fecha": ("Fecha", 90), "concepto": ("Concepto", 250),
+                "cantidad": ("Cantidad", 90), "categoria": ("Categoria", 100)}
+
+    def __init__(self, parent, dao, W, filas=15, tam_pagina=100, paginas_en_memoria=5):
+        super().__init__(parent, width=W, padx=PAD_DEFAULT, pady=PAD_DEFAULT)
+        self.dao = dao
+        self.filas = filas
+        self.tam_pagina = tam_pagina
+        self.paginas_en_memoria = paginas_en_memoria
+
+        self.orden = "fecha"
+        self.descendente = False
+        self.total = 0
+        self.primera = 0
+        self.__paginas = OrderedDict()
+
+        self.tabla = ttk.Treeview(self, columns=list(self.COLUMNAS), show="headings",
+                                  height=filas, selectmode="browse")
+        for columna, (titulo, ancho) in self.COLUMNAS.items():
+            self.tabla.heading(columna, text=titulo, command=lambda columna=columna: self.ordenar(columna))
+            self.tabla.column(columna, width=ancho, anchor=tk.E if columna == "cantidad" else tk.W)
+        self.tabla.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.barra = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.__desplazar)
+        self.barra.pack(side=tk.LEFT, fill=tk.Y)
+
+        # las unicas filas que existen en el Treeview, se reciclan al pintar
+        self.__items = [self.tabla.insert("", tk.END) for _ in range(filas)]
+
+        self.tabla.bind("<MouseWheel>", self.__rueda)
+        self.tabla.bind("<Button-4>", lambda ev: self.mover(-3))
+        self.tabla.bind("<Button-5>", lambda ev: self.mover(3))
+        self.tabla.bind("<Up>", lambda ev: self.mover(-1))
+        self.tabla.bind("<Down>", lambda ev: self.mover(1))
+        self.tabla.bind("<Prior>", lambda ev: self.mover(-filas))
+        self.tabla.bind("<Next>", lambda ev: self.mover(filas))
+
+    def refrescar(self):
+        """
+        Vuelve a contar los movimientos y a pedir las filas visibles.
+        """
+        self.total = self.dao.contar()
+        self.__paginas.clear()
+        self.primera = max(0, min(self.primera, self.total - self.filas))
+        self.__pintar()
+
+    def leer_inicio(self, dao):
+        """
+        Total y pagina de las filas visibles, lo que necesita mostrar() para
+        pintar la primera vez. No toca Tk, se puede llamar desde otro hilo.
+        """
+        total = dao.contar()
+        numero = self.primera // self.tam_pagina
+        pagina = dao.leer_pagina(numero * self.tam_pagina, self.tam_pagina, self.orden, self.descendente)
+        return total, numero, pagina
+
+    def mostrar(self, dao, total, numero, pagina):
+        """
+        Pinta con lo leido por leer_inicio() y sigue leyendo de dao.
+        """
+        self.dao = dao
+        self.total = total
+        self.__paginas.clear()
+        self.__paginas[numero] = pagina
+        self.primera = max(0, min(self.primera, self.total - self.filas))
+        self.__pintar()
+
+    def avisar(self, texto):
+        """
+        Muestra texto en lugar de los movimientos, por ejemplo mientras se
+        cargan.
+        """
+        for item in self.__items[1:]:
+            self.tabla.detach(item)
+        self.tabla.move(self.__items[0], "", 0)
+        self.tabla.item(self.__items[0], values=("", texto, "", ""))
+        self.barra.set(0, 1)
+
+    def aplicar(self, eventos):
+        """
+        Actualiza la lista con los Evento del dao sin volver a leerla entera:
+        solo cambia el total y se repintan una vez las filas visibles.
+        """
+        cambios = False
+        for evento in eventos:
+            if evento.tipo == "externo":
+                self.refrescar()
+                return
+            if evento.tipo == "insertado":
+                self.total += 1
+            elif evento.tipo == "borrado":
+                self.total = max(0, self.total - 1)
+            cambios = True
+
+        if cambios:
+            self.__paginas.clear()
+            self.primera = max(0, min(self.primera, self.total - self.filas))
+            self.__pintar()
+
+    def ordenar(self, columna):
+        if self.dao is None:
+            # la primera pagina se esta leyendo con el orden actual
+            return
+        if columna == self.orden:
+            self.descendente = not self.descendente
+        else:
+            self.orden = columna
+            self.descendente = False
+        self.__paginas.clear()
+        self.primera = 0
+        self.__pintar()
+
+    def mover(self, filas):
+        self.ir_a(self.primera + filas)
+        return "break"
+
+    def ir_a(self, posicion):
+        posicion = max(0, min(posicion, self.total - self.filas))
+        if posicion != self.primera:
+            self.primera = posicion
+            self.__pintar()
+
+    @property
+    def seleccionado(self):
+        seleccion = self.tabla.selection()
+        if not seleccion:
+            return None
+        return self.movimiento(self.primera + self.__items.index(seleccion[0]))
+
+    def movimiento(self, posicion):
+        if not 0 <= posicion < self.total:
+            return None
+        numero, desplazamiento = divmod(posicion, self.tam_pagina)
+        pagina = self.__paginas.get(numero)
+        if pagina is None:
+            pagina = self.__leer_pagina(numero)
+            self.__paginas[numero] = pagina
+            if len(self.__paginas) > self.paginas_en_memoria:
+                self.__paginas.popitem(last=False)
+        else:
+            self.__paginas.move_to_end(numero)
+        return pagina[desplazamiento] if desplazamiento < len(pagina) else None
+
+    def __leer_pagina(self, numero):
+        # al desplazarse la pagina de al lado ya esta leida y se sigue desde
+        # ella; solo un salto lejos cuenta filas desde el principio
+        anterior = self.__paginas.get(numero - 1)
+        siguiente = self.__paginas.get(numero + 1)
+        if anterior is not None and len(anterior) == self.tam_pagina:
+            return self.dao.leer_pagina(0, self.tam_pagina, self.orden, self.descendente, despues_de=anterior[-1])
+        if siguiente:
+            return self.dao.leer_pagina(0, self.tam_pagina, self.orden, self.descendente, antes_de=siguiente[0])
+        return self.dao.leer_pagina(numero * self.tam_pagina, self.tam_pagina, self.orden, self.descendente)
+
+    def __pintar(self):
+        visibles = 0
+        for indice, item in enumerate(self.__items):
+            movimiento = self.movimiento(self.primera + indice)
+            if movimiento is None:
+                self.tabla.detach(item)
+                continue
+            self.tabla.move(item, "", indice)
+            self.tabla.item(item, values=self.__valores(movimiento))
+            visibles += 1
+
+        if self.total:
+            self.barra.set(self.primera / self.total, (self.primera + visibles) / self.total)
+        else:
+            self.barra.set(0, 1)
+
+    def __valores(self, movimiento):
+        if isinstance(movimiento, Gasto):
+            return (movimiento.fecha.strftime("%d/%m/%Y"), movimiento.concepto,
+                    f"{-movimiento.cantidad:.2f}", movimiento.categoria.name)
+        return (movimiento.fecha.strftime("%d/%m/%Y"), movimiento.concepto, f"{movimiento.cantidad:.2f}", "")
+
+    def __desplazar(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self.ir_a(round(float(cantidad) * self.total))
+        elif accion == "scroll":
+            self.mover(int(cantidad) * (self.filas if unidad == "pages" else 1))
+
+    def __rueda(self, ev):
+        return self.mover(-3 if ev.delta > 0 else 3)
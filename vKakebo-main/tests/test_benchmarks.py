@@ -0,0 +1,27 @@
+from benchmarks.libro import generar_movimientos
+from benchmarks.bench_daos import comparar
+from kakebo.modelos import Ingreso, Gasto
+
+def test_libro_sintetico_reproducible():
+    primero = [(m.concepto, m.fecha, m.cantidad) for m in generar_movimientos(200, semilla=7)]
+    segundo = [(m.concepto, m.fecha, m.cantidad) for m in generar_movimientos(200, semilla=7)]
+    assert primero == segundo
+    assert [fecha for _, fecha, _ in primero] == sorted(fecha for _, fecha, _ in primero)
+
+def test_libro_sintetico_reparto():
+    movimientos = list(generar_movimientos(2000))
+    ingresos = [m for m in movimientos if isinstance(m, Ingreso)]
+    gastos = [m for m in movimientos if isinstance(m, Gasto)]
+    assert 0 < len(ingresos) < len(gastos)
+    assert {m.categoria.value for m in gastos} == {1, 2, 3, 4}
+
+def test_comparar_con_la_base():
+    base = {"1000": {"leer": {"segundos": 1.0, "operaciones": 10},
+                     "grabar": {"segundos": 2.0, "operaciones": 10}}}
+    resultados = {"1000": {"leer": {"segundos": 1.1, "operaciones": 10},
+                           "grabar": {"segundos": 3.0, "operaciones": 10},
+                           "nueva": {"segundos": 5.0, "operaciones": 10}}}
+
+    regresiones = comparar(resultados, base, tolerancia=0.25)
+    assert [(tamano, nombre) for tamano, nombre, *_ in regresiones] == [("1000", "grabar")]
+    assert regresiones[0][4] == 0.5
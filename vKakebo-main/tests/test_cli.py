@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import date
+
+from kakebo.__main__ import main
+from kakebo.modelos import DaoCSV, DaoSqlite, DaoBinario, Ingreso, Gasto, CategoriaGastos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def libro_csv(ruta):
+    dao = DaoCSV(ruta)
+    dao.grabar(Ingreso("Nomina de enero", date(2024, 1, 31), 1500))
+    dao.grabar(Gasto("Compra en el mercado", date(2024, 1, 5), 45.5, CategoriaGastos.NECESIDAD))
+    dao.grabar(Gasto("Entradas de cine", date(2024, 2, 10), 18, CategoriaGastos.OCIO_VICIO))
+    dao.grabar(Gasto("Farmacia del barrio", date(2024, 2, 20), 12.25, CategoriaGastos.NECESIDAD))
+
+def python(*argumentos):
+    # otro interprete, sin los modulos que ya tiene cargados pytest
+    return subprocess.run([sys.executable, *argumentos], cwd=RAIZ, capture_output=True, text=True,
+                          env={**os.environ, "DISPLAY": ""})
+
+def test_cli_no_importa_tkinter():
+    resultado = python("-c", "import sys, kakebo.__main__; "
+                             "print(' '.join(m for m in sys.modules if 'tkinter' in m or m.startswith('kakebo')))")
+    assert resultado.returncode == 0, resultado.stderr
+    assert sorted(resultado.stdout.split()) == ["kakebo", "kakebo.__main__", "kakebo.modelos"]
+
+def test_cli_tiempo_de_importacion():
+    resultado = python("-X", "importtime", "-c", "import kakebo.__main__")
+    assert resultado.returncode == 0, resultado.stderr
+    # import time: propio | acumulado | modulo, en microsegundos
+    acumulado = {linea.split("|")[2].strip(): int(linea.split("|")[1])
+                 for linea in resultado.stderr.splitlines()[1:]}
+    assert "tkinter" not in acumulado
+    assert "numpy" not in acumulado
+    assert "concurrent.futures" not in acumulado
+    assert acumulado["kakebo.__main__"] < 500_000
+
+def test_cli_ayuda_sin_pantalla():
+    resultado = python("-m", "kakebo", "--help")
+    assert resultado.returncode == 0
+    assert "importar" in resultado.stdout
+
+def test_cli_importar_exportar_e_informe(tmp_path, capsys):
+    origen = str(tmp_path / "libro.csv")
+    libro_csv(origen)
+    db = str(tmp_path / "libro.db")
+
+    assert main(["--db", db, "importar", origen]) == 0
+    assert "4 movimientos importados" in capsys.readouterr().out
+
+    assert main(["--db", db, "exportar", "--lote", "2"]) == 0
+    lineas = capsys.readouterr().out.splitlines()
+    assert lineas[0] == "id,tipo,concepto,fecha,cantidad,categoria"
+    assert [linea.split(",")[3] for linea in lineas[1:]] == ["2024-01-05", "2024-01-31", "2024-02-10", "2024-02-20"]
+
+    # el csv exportado se puede volver a importar
+    copia = str(tmp_path / "copia.csv")
+    assert main(["--db", db, "exportar", "-o", copia]) == 0
+    capsys.readouterr()
+    assert main(["--db", str(tmp_path / "copia.db"), "importar", copia]) == 0
+    assert "4 movimientos importados" in capsys.readouterr().out
+
+    assert main(["--db", db, "exportar", "--formato", "json", "--tipo", "gasto",
+                 "--categoria", "necesidad", "--desde", "2024-02-01"]) == 0
+    assert json.loads(capsys.readouterr().out) == [
+        {"id": 4, "tipo": "G", "concepto": "Farmacia del barrio", "fecha": "2024-02-20",
+         "cantidad": 12.25, "categoria": 1}]
+
+    assert main(["--db", db, "informe", "--formato", "json"]) == 0
+    informe = json.loads(capsys.readouterr().out)
+    assert [fila["periodo"] for fila in informe] == ["2024-01", "2024-02"]
+    assert informe[0]["ahorro"] == 1454.5
+    assert informe[1]["gastos"] == 30.25
+
+    assert main(["--db", db, "informe", "--formato", "json", "--procesos", "2"]) == 0
+    assert json.loads(capsys.readouterr().out) == informe
+
+    assert main(["--db", db, "informe", "--agrupacion", "anio", "--hasta", "2024-02-15"]) == 0
+    lineas = capsys.readouterr().out.splitlines()
+    assert lineas[1].split(",")[0] == "2024"
+    assert lineas[1].split(",")[-1] == "3"
+
+def test_cli_buscar_y_comprobar(tmp_path, capsys):
+    origen = str(tmp_path / "libro.csv")
+    libro_csv(origen)
+    db = str(tmp_path / "libro.db")
+    main(["--db", db, "importar", origen])
+    capsys.readouterr()
+
+    assert main(["--db", db, "buscar", "farma", "--formato", "json"]) == 0
+    assert [fila["concepto"] for fila in json.loads(capsys.readouterr().out)] == ["Farmacia del barrio"]
+    assert main(["--db", db, "buscar", "farma", "--exacto"]) == 0
+    assert capsys.readouterr().out.splitlines()[1:] == []
+
+    assert main(["--db", db, "comprobar"]) == 0
+    with DaoSqlite(db) as dao:
+        with dao.transaccion() as con:
+            con.execute("UPDATE saldo SET n = n + 1")
+    assert main(["--db", db, "comprobar"]) == 1
+    assert main(["--db", db, "comprobar", "--reparar"]) == 0
+    assert main(["--db", db, "comprobar"]) == 0
+
+def test_cli_compactar(tmp_path, capsys):
+    db = str(tmp_path / "libro.db")
+    with DaoSqlite(db) as dao:
+        dao.grabar_lote([Ingreso(f"Ingreso numero {i}", date(2024, 1, 1), i + 1) for i in range(2000)])
+        dao.borrar_lote(range(1, 2001))
+    antes = os.path.getsize(db)
+    assert main(["--db", db, "compactar"]) == 0
+    assert os.path.getsize(db) < antes
+    capsys.readouterr()
+
+    ruta = str(tmp_path / "libro.bin")
+    with DaoBinario(ruta) as dao:
+        dao.grabar_lote([Ingreso(f"Ingreso numero {i}", date(2024, 1, 1), i + 1) for i in range(10)])
+        dao.borrar(3)
+    assert main(["--db", ruta, "compactar"]) == 0
+    assert capsys.readouterr().out.startswith("1 ")
+
+def test_cli_errores(tmp_path, capsys):
+    assert main(["--db", str(tmp_path / "no_existe.db"), "informe"]) == 1
+    assert "No existe" in capsys.readouterr().err
+    assert not os.path.exists(tmp_path / "no_existe.db")
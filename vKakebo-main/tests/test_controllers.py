@@ -0,0 +1,117 @@
+from datetime import date
+import threading
+from kakebo.controllers import EscritorDiferido
+from kakebo.modelos import DaoSqlite, Ingreso, Gasto, CategoriaGastos
+
+class DaoLento(DaoSqlite):
+    """
+    Dao que no graba hasta que se le deja, para acumular escrituras en cola.
+    """
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.puede_grabar = threading.Event()
+        self.lotes = []
+
+    def grabar_lote(self, movimientos, tam_lote=500):
+        self.puede_grabar.wait()
+        self.lotes.append(len(movimientos))
+        return super().grabar_lote(movimientos, tam_lote)
+
+def test_escritor_diferido_agrupa_y_vacia_al_cerrar(tmp_path):
+    dao = DaoLento(str(tmp_path / "escritor.db"))
+    escritor = EscritorDiferido(dao, tam_lote=50)
+
+    for dia in range(1, 11):
+        escritor.grabar(Ingreso(f"Ingreso del dia {dia}", date(2024, 1, dia), dia))
+    dao.puede_grabar.set()
+    escritor.cerrar()
+
+    assert not escritor.hilo.is_alive()
+    assert sum(dao.lotes) == 10
+    # lo que espero en la cola se grabo en menos transacciones que movimientos
+    assert len(dao.lotes) < 10
+    terminados = escritor.terminados()
+    assert all(error is None for lote, error in terminados)
+    assert sum(len(lote) for lote, error in terminados) == 10
+    assert dao.contar() == 10
+    dao.close()
+
+def test_escritor_diferido_informa_de_errores(tmp_path):
+    dao = DaoLento(str(tmp_path / "escritor.db"))
+    escritor = EscritorDiferido(dao)
+    buenos = [Ingreso(f"Ingreso correcto {dia}", date(2024, 1, dia), dia) for dia in range(1, 4)]
+
+    # mientras el primero espera a grabarse los demas se juntan en la cola,
+    # el que falla siempre en el mismo lote que alguno bueno
+    escritor.grabar(buenos[0])
+    escritor.grabar(buenos[1])
+    escritor.grabar("esto no es un movimiento")
+    escritor.grabar(buenos[2])
+    dao.puede_grabar.set()
+    escritor.cerrar()
+
+    terminados = escritor.terminados()
+    errores = [(lote, error) for lote, error in terminados if error is not None]
+    assert len(errores) == 1
+    assert errores[0][0] == ["esto no es un movimiento"]
+    assert isinstance(errores[0][1], TypeError)
+    assert [movimiento for lote, error in terminados if error is None for movimiento in lote] == buenos
+    assert dao.leerTodo() == buenos
+    dao.close()
+
+def test_escritor_diferido_detecta_cambios_de_otros_procesos(tmp_path):
+    import sqlite3
+    ruta = str(tmp_path / "escritor.db")
+    dao = DaoSqlite(ruta)
+    externos = threading.Event()
+    dao.suscribir(lambda evento: evento.tipo == "externo" and externos.set())
+    escritor = EscritorDiferido(dao, intervalo_cambios=0.01)
+
+    escritor.grabar(Ingreso("Grabado por el escritor", date(2024, 1, 1), 10))
+    assert not externos.wait(0.1)
+
+    con = sqlite3.connect(ruta)
+    con.execute("DELETE FROM movimientos")
+    con.commit()
+    con.close()
+
+    assert externos.wait(2)
+    escritor.cerrar()
+    dao.close()
+
+def test_tarea_diferida_devuelve_resultado_y_errores():
+    from kakebo.controllers import TareaDiferida
+    puede_acabar = threading.Event()
+
+    def trabajo(valor):
+        puede_acabar.wait()
+        return valor * 2
+
+    tarea = TareaDiferida(trabajo, 21)
+    assert tarea.terminada() is None
+    puede_acabar.set()
+    tarea.esperar()
+    assert tarea.terminada() == (42, None)
+    # el resultado se recoge una sola vez
+    assert tarea.terminada() is None
+
+    tarea = TareaDiferida(int, "no es un numero")
+    tarea.esperar()
+    resultado, error = tarea.terminada()
+    assert resultado is None
+    assert isinstance(error, ValueError)
+
+def test_cerrar_apertura_graba_los_pendientes(tmp_path):
+    from kakebo.controllers import cerrar_apertura
+    ruta = str(tmp_path / "apertura.db")
+    pendientes = [Ingreso("Grabado antes de abrir", date(2024, 1, 1), 10),
+                  Gasto("Otro antes de abrir", date(2024, 1, 2), 5, CategoriaGastos.EXTRAS)]
+
+    assert cerrar_apertura(((DaoSqlite(ruta), None), None), pendientes) is None
+    with DaoSqlite(ruta) as dao:
+        assert dao.leerTodo() == pendientes
+
+    aviso = cerrar_apertura((None, OSError("disco roto")), pendientes)
+    assert "2 movimientos" in aviso and "disco roto" in aviso
+    assert cerrar_apertura((None, OSError("disco roto")), []) is None
+    assert cerrar_apertura(None, pendientes) is None
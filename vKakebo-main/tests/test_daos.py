@@ -11,10 +11,12 @@
     - leer esos datos con el dao
     - comprobar que nos ha creado tantos movimientos (ingresos o gastos) como hay en el fichero
 """
-from kakebo.modelos import DaoCSV, Ingreso, Gasto, CategoriaGastos, DaoSqlite
+from kakebo.modelos import DaoCSV, Ingreso, Gasto, CategoriaGastos, DaoSqlite, MIGRACIONES, importar_csv, exportar_csv, Instrumentacion, DaoBinario, COLUMNAS_ORDEN, CABECERA_CSV, REGISTRO_BINARIO
 from datetime import date
 import os
 import sqlite3
+import time
+import pytest
 
 RUTA_SQLITE = "datos/movimientos_test.db"
 
@@ -24,6 +26,9 @@ def borrar_fichero(path):
 
 def borrar_movimientos_sqlite():
     # Preparar la tabla movimientos como toca, borrar e insertar un ingreso y un gasto
+    # Abrirla antes con el dao deja el esquema en la ultima version
+    with DaoSqlite(RUTA_SQLITE) as dao:
+        dao.contar()
     con = sqlite3.connect(RUTA_SQLITE)
     cur = con.cursor()
 
@@ -98,8 +103,8 @@ def test_leer_dao_sqlite():
 
     query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?, ?)"
 
-    cur.executemany(query, ((1, "I", "Un ingreso cualquiera", date(2024, 5, 14), 100, None),
-                            (2, "G", "Un gasto cualquiera", date(2024, 5, 1), 123, 3)))
+    cur.executemany(query, ((1, "I", "Un ingreso cualquiera", date(2024, 5, 14).toordinal(), 10000, None),
+                            (2, "G", "Un gasto cualquiera", date(2024, 5, 1).toordinal(), 12300, 3)))
     
     con.commit()
     con.close()
@@ -130,8 +135,8 @@ def test_grabar_sqlite():
     
     assert fila[1] == "I"
     assert fila[2] == "Un concepto cualquiera"
-    assert fila[3] == "1990-01-01"
-    assert fila[4] == 123.0
+    assert fila[3] == date(1990, 1, 1).toordinal()
+    assert fila[4] == 12300
     assert fila[5] is None
     
 def test_update_sqlite():
@@ -140,7 +145,7 @@ def test_update_sqlite():
     con = sqlite3.connect(RUTA_SQLITE)
     cur = con.cursor()
     
-    query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad) VALUES (1,'I', 'Concepto original', '0001-01-01', 0.1)"
+    query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad) VALUES (1,'I', 'Concepto original', 1, 10)"
     
     cur.execute(query)
     con.commit()
@@ -172,7 +177,7 @@ def test_delete_sqlite():
     con = sqlite3.connect(RUTA_SQLITE)
     cur = con.cursor()
     
-    query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad) VALUES (1,'I', 'Concepto original', '0001-01-01', 0.1)"
+    query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad) VALUES (1,'I', 'Concepto original', 1, 10)"
     
     cur.execute(query)
     con.commit()
@@ -200,12 +205,12 @@ def test_leerTodo_dao_sqlite():
 
     query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?, ?)"
     
-    cur.executemany(query, [(1, "I", "Un ingreso cualquiera", date(2024, 5, 14), 100, None), 
-                            (2, "G", "Un gasto cualquiera", date(2024, 5, 1), 123, 3), 
-                            (6, "I", "nomina", date(2024, 5, 1), 1500, None), 
-                            (4, "G", "comida familiar", date(2024, 4, 6), 35, 3), 
-                            (8, "G", "zapatillas", date(2024, 5, 6), 57.5, 1), 
-                            (9, "G", "comida familiar", date(2024, 4, 16), 90, 3)])
+    cur.executemany(query, [(1, "I", "Un ingreso cualquiera", date(2024, 5, 14).toordinal(), 10000, None), 
+                            (2, "G", "Un gasto cualquiera", date(2024, 5, 1).toordinal(), 12300, 3), 
+                            (6, "I", "nomina", date(2024, 5, 1).toordinal(), 150000, None), 
+                            (4, "G", "comida familiar", date(2024, 4, 6).toordinal(), 3500, 3), 
+                            (8, "G", "zapatillas", date(2024, 5, 6).toordinal(), 5750, 1), 
+                            (9, "G", "comida familiar", date(2024, 4, 16).toordinal(), 9000, 3)])
     
     con.commit()
     con.close()
@@ -240,11 +245,11 @@ def test_gasto_mayor():
 
     query = "INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?, ?)"
 
-    cur.executemany(query, ((1, "I", "Ejemplo ingreso id1", "2024-05-01", 100, None),
-                            (2, "I", "Ejemplo ingreso id2", "2024-05-02", 100, None),
-                            (3, "G", "Ejemplo gasto id3", "2024-05-03", 300, 1),
-                            (4, "G", "Ejemplo gasto id4", "2024-05-04", 301, 4),
-                            (5, "G", "Ejemplo gasto id5", "2024-05-05", 301, 4)))
+    cur.executemany(query, ((1, "I", "Ejemplo ingreso id1", date(2024, 5, 1).toordinal(), 10000, None),
+                            (2, "I", "Ejemplo ingreso id2", date(2024, 5, 2).toordinal(), 10000, None),
+                            (3, "G", "Ejemplo gasto id3", date(2024, 5, 3).toordinal(), 30000, 1),
+                            (4, "G", "Ejemplo gasto id4", date(2024, 5, 4).toordinal(), 30100, 4),
+                            (5, "G", "Ejemplo gasto id5", date(2024, 5, 5).toordinal(), 30100, 4)))
     
     con.commit()
     con.close()
@@ -252,20 +257,1051 @@ def test_gasto_mayor():
     dao = DaoSqlite(RUTA_SQLITE)
     
     gasto=300
-    movto=dao.leer_gasto_mayor(gasto)
-    num_reg=5
-    
-    for i in range(1,num_reg+1):
+    movtos=dao.leer_gasto_mayor(gasto)
+
+    # solo los gastos de mas de 300, los ids 4 y 5
+    assert [movto.id for movto in movtos] == [4, 5]
+    for i, movto in zip((4, 5), movtos):
+        assert isinstance(movto,Gasto)
+        assert movto.concepto == f"Ejemplo gasto id{i}"
+        assert movto.fecha == date(2024, 5, i)
+        assert movto.cantidad == 301.0
+        assert movto.categoria.value==4
+
     
-        if i in range(1,4):
-            assert movto is None
-            
-     
+def test_dao_sqlite_reutiliza_conexion_y_cierra():
+    borrar_movimientos_sqlite()
+
+    with DaoSqlite(RUTA_SQLITE) as dao:
+        dao.grabar(Ingreso("Primer ingreso", date(2024, 5, 1), 10))
+        dao.grabar(Gasto("Primer gasto", date(2024, 5, 2), 20, CategoriaGastos.CULTURA))
+        assert len(dao.leerTodo()) == 2
+
+    # tras cerrar se puede seguir usando, abre una conexion nueva
+    assert len(dao.leerTodo()) == 2
+    dao.close()
+
+def test_dao_sqlite_una_conexion_por_hilo():
+    import threading
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar(Ingreso("Desde el hilo principal", date(2024, 5, 1), 10))
+
+    resultados = []
+    def leer_en_hilo():
+        resultados.append(len(dao.leerTodo()))
+
+    hilo = threading.Thread(target=leer_en_hilo)
+    hilo.start()
+    hilo.join()
+
+    assert resultados == [1]
+    dao.close()
+
+def test_grabar_lote_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    existente = Ingreso("Ingreso ya grabado", date(2024, 1, 1), 50)
+    dao.grabar(existente)
+    existente.cantidad = 75
+
+    nuevos = [Ingreso(f"Ingreso numero {i}", date(2024, 1, 2), 10 + i) for i in range(5)]
+    gasto = Gasto("Gasto del lote", date(2024, 1, 3), 20, CategoriaGastos.NECESIDAD)
+
+    ids = dao.grabar_lote(iter(nuevos[:3] + [existente, gasto] + nuevos[3:]), tam_lote=2)
+
+    assert len(ids) == 7
+    assert ids[3] == existente.id
+    assert len(set(ids)) == 7
+    assert [mov.id for mov in nuevos[:3]] == ids[:3]
+    assert gasto.id == ids[4]
+    assert dao.leer(ids[4]) == gasto
+    assert dao.leer(ids[6]) == nuevos[4]
+    assert dao.leer(existente.id).cantidad == 75
+    assert len(dao.leerTodo()) == 7
+
+def test_grabar_lote_es_una_sola_transaccion():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+
+    def movimientos():
+        yield Ingreso("Este no debe quedar", date(2024, 1, 1), 10)
+        raise RuntimeError("fallo a mitad de la importacion")
+
+    with pytest.raises(RuntimeError):
+        dao.grabar_lote(movimientos(), tam_lote=1)
+
+    assert dao.leerTodo() == []
+
+def test_borrar_lote_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    ids = dao.grabar_lote(Ingreso(f"Ingreso numero {i}", date(2024, 1, 2), 10 + i) for i in range(10))
+
+    borrados = dao.borrar_lote(ids[:7], tam_lote=3)
+
+    assert borrados == 7
+    assert len(dao.leerTodo()) == 3
+
+def test_iterar_sqlite_por_lotes():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote([Ingreso("Ingreso de mayo", date(2024, 5, 1), 100),
+                     Gasto("Gasto de abril", date(2024, 4, 1), 30, CategoriaGastos.CULTURA),
+                     Gasto("Gasto de marzo", date(2024, 3, 1), 20, CategoriaGastos.EXTRAS)])
+
+    movimientos = dao.leerTodo(stream=True, tam_lote=2)
+    assert not isinstance(movimientos, list)
+    assert next(movimientos) == Ingreso("Ingreso de mayo", date(2024, 5, 1), 100)
+    assert len(list(movimientos)) == 2
+
+    por_fecha = list(dao.iterar(tam_lote=1, orden="fecha"))
+    assert [mov.fecha.month for mov in por_fecha] == [3, 4, 5]
+
+def test_leerTodo_sqlite_asigna_id_de_cada_gasto():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    ids = dao.grabar_lote([Gasto("Primer gasto", date(2024, 4, 1), 30, CategoriaGastos.CULTURA),
+                           Gasto("Segundo gasto", date(2024, 4, 2), 20, CategoriaGastos.EXTRAS)])
+
+    assert [mov.id for mov in dao.leerTodo()] == ids
+
+def test_iterar_dao_csv_y_reset():
+    ruta = "datos/test_movimientos.csv"
+    borrar_fichero(ruta)
+    dao = DaoCSV(ruta)
+    dao.grabar(Ingreso("Nomina, con coma", date(2024, 1, 31), 1500))
+    dao.grabar(Gasto("Alquiler", date(2024, 2, 1), 700, CategoriaGastos.NECESIDAD))
+    dao.grabar(Gasto("Cine con amigos", date(2024, 2, 3), 12.5, CategoriaGastos.OCIO_VICIO))
+
+    assert dao.leer() == Ingreso("Nomina, con coma", date(2024, 1, 31), 1500)
+    # el iterador continua donde se quedo leer
+    assert list(dao) == [Gasto("Alquiler", date(2024, 2, 1), 700, CategoriaGastos.NECESIDAD),
+                         Gasto("Cine con amigos", date(2024, 2, 3), 12.5, CategoriaGastos.OCIO_VICIO)]
+    assert dao.leer() is None
+
+    # lo grabado despues de llegar al final tambien se lee
+    dao.grabar(Ingreso("Devolucion", date(2024, 2, 5), 20))
+    assert dao.leer() == Ingreso("Devolucion", date(2024, 2, 5), 20)
+
+    dao.reset()
+    assert dao.puntero_lectura == 0
+    assert len(list(dao)) == 4
+    assert dao.puntero_lectura == 4
+
+def test_acceso_directo_dao_csv_con_indice():
+    ruta = "datos/test_movimientos.csv"
+    borrar_fichero(ruta)
+    borrar_fichero(ruta + ".idx")
+    dao = DaoCSV(ruta, indexar=True)
+    for mes in range(1, 4):
+        for dia in range(1, 4):
+            dao.grabar(Ingreso(f"Ingreso {dia}/{mes}", date(2024, mes, dia), mes * 10 + dia))
+
+    assert dao.total_filas() == 9
+    assert dao.leer_fila(4) == Ingreso("Ingreso 2/2", date(2024, 2, 2), 22)
+    assert dao.leer_fila(9) is None
+    assert dao.fila_de_mes(2024, 3) == 6
+    assert dao.fila_de_mes(2024, 4) is None
+    assert [mov.cantidad for mov in dao.leer_pagina(7, 5)] == [32, 33]
+
+    # lo que se graba despues se incorpora al indice sin reconstruirlo
+    dao.grabar(Gasto("Gasto de abril", date(2024, 4, 1), 5, CategoriaGastos.EXTRAS))
+    assert dao.fila_de_mes(2024, 4) == 9
+    dao.close()
+
+    # otra instancia reutiliza el fichero de indice
+    assert os.path.exists(ruta + ".idx")
+    otro = DaoCSV(ruta, indexar=True)
+    assert otro.total_filas() == 10
+    assert otro.leer_fila(9) == Gasto("Gasto de abril", date(2024, 4, 1), 5, CategoriaGastos.EXTRAS)
+    otro.close()
+    borrar_fichero(ruta + ".idx")
+
+def test_indice_dao_csv_detecta_escrituras_externas():
+    ruta = "datos/test_movimientos.csv"
+    with open(ruta, "w", newline="") as f:
+        f.write("concepto,fecha,cantidad,categoria\n")
+        f.write('"Concepto, con coma",1999-12-31,12.34,\n')
+
+    dao = DaoCSV(ruta)
+    assert dao.leer_fila(0) == Ingreso("Concepto, con coma", date(1999, 12, 31), 12.34)
+
+    with open(ruta, "a", newline="") as f:
+        f.write("Gasto,2000-01-01,55.0,4\n")
+
+    assert dao.total_filas() == 2
+    assert dao.leer_fila(1) == Gasto("Gasto", date(2000, 1, 1), 55, CategoriaGastos.EXTRAS)
+    dao.close()
+
+def test_indice_dao_csv_se_rehace_si_el_csv_se_reescribe(tmp_path):
+    ruta = str(tmp_path / "movimientos.csv")
+    dao = DaoCSV(ruta, indexar=True)
+    for dia in range(1, 5):
+        dao.grabar(Ingreso(f"Ingreso {dia}", date(2024, 1, dia), 10 * dia))
+    assert dao.total_filas() == 4
+    tamano = os.path.getsize(ruta)
+    dao.close()
+
+    # mismo tamaño, otras filas: el indice guardado ya no sirve
+    filas = "Otro,2024-02-02,20.0,\nY otro,2024-02-03,30.0,\n"
+    relleno = tamano - len(CABECERA_CSV) - len(filas) - len(",2024-02-01,10.0,\n")
+    with open(ruta, "w", newline="") as f:
+        f.write(CABECERA_CSV + "x" * relleno + ",2024-02-01,10.0,\n" + filas)
+    assert os.path.getsize(ruta) == tamano
+    otro = DaoCSV(ruta, indexar=True)
+    assert otro.total_filas() == 3
+    assert otro.leer_fila(2) == Ingreso("Y otro", date(2024, 2, 3), 30)
+    assert otro.fila_de_mes(2024, 1) is None
+
+    # y mas largo con la instancia abierta
+    with open(ruta, "w", newline="") as f:
+        f.write("concepto,fecha,cantidad,categoria\n")
+        for dia in range(1, 8):
+            f.write(f"Gasto numero {dia},2024-03-0{dia},{dia}.0,1\n")
+    assert otro.total_filas() == 7
+    assert otro.leer_fila(6) == Gasto("Gasto numero 7", date(2024, 3, 7), 7, CategoriaGastos.NECESIDAD)
+    otro.close()
+
+    # añadir filas no obliga a rehacerlo
+    with open(ruta, "a", newline="") as f:
+        f.write("Ingreso,2024-03-08,8.0,\n")
+    tercero = DaoCSV(ruta, indexar=True)
+    assert tercero.total_filas() == 8
+    assert tercero.leer_fila(7) == Ingreso("Ingreso", date(2024, 3, 8), 8)
+    tercero.close()
+
+def test_dao_csv_abierto_lee_el_fichero_que_lo_sustituye(tmp_path):
+    ruta = str(tmp_path / "movimientos.csv")
+    dao = DaoCSV(ruta)
+    for dia in range(1, 6):
+        dao.grabar(Ingreso(f"Ingreso {dia}", date(2024, 1, dia), 10 * dia))
+    assert dao.leer_fila(0) == Ingreso("Ingreso 1", date(2024, 1, 1), 10)
+
+    def sustituir(*filas):
+        # como exportar_csv: se escribe aparte y se cambia por el original
+        with open(ruta + ".tmp", "w", newline="") as f:
+            f.write(CABECERA_CSV + "".join(filas))
+        os.replace(ruta + ".tmp", ruta)
+
+    # mas corto
+    sustituir("Corto 1,2024-02-01,1.0,\n", "Corto 2,2024-02-02,2.0,\n", "Corto 3,2024-02-03,3.0,\n")
+    assert dao.total_filas() == 3
+    assert dao.leer_fila(0) == Ingreso("Corto 1", date(2024, 2, 1), 1)
+
+    # igual de largo
+    sustituir("Largo 1,2024-03-01,1.0,\n", "Largo 2,2024-03-02,2.0,\n", "Largo 3,2024-03-03,3.0,\n")
+    assert dao.total_filas() == 3
+    assert [mov.concepto for mov in dao.leer_pagina(0, 3)] == ["Largo 1", "Largo 2", "Largo 3"]
+    dao.close()
+
+def plan_de(ruta, query, parametros):
+    con = sqlite3.connect(ruta)
+    plan = " ".join(fila[3] for fila in con.execute(f"EXPLAIN QUERY PLAN {query}", parametros))
+    con.close()
+    return plan
+
+def test_migraciones_crean_esquema_e_indices(tmp_path):
+    ruta = str(tmp_path / "nueva.db")
+    dao = DaoSqlite(ruta)
+    dao.grabar(Ingreso("Base de datos nueva", date(2024, 1, 1), 10))
+    dao.close()
+
+    con = sqlite3.connect(ruta)
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    con.close()
+    assert version == len(MIGRACIONES)
+
+    # volver a abrirla no aplica nada de nuevo
+    dao = DaoSqlite(ruta)
+    assert len(dao.leerTodo()) == 1
+    dao.close()
+
+    plan = plan_de(ruta, "SELECT * FROM movimientos WHERE cantidad > ? AND tipo_movimiento = ?", (30000, "G"))
+    assert "USING INDEX idx_movimientos_tipo_cantidad" in plan
+
+    plan = plan_de(ruta, "SELECT * FROM movimientos WHERE fecha BETWEEN ? AND ?", (date(2024, 1, 1).toordinal(), date(2024, 1, 31).toordinal()))
+    assert "USING INDEX idx_movimientos_fecha" in plan
+
+    plan = plan_de(ruta, "SELECT * FROM movimientos WHERE categoria = ? AND fecha >= ?", (1, date(2024, 1, 1).toordinal()))
+    assert "USING INDEX idx_movimientos_categoria_fecha" in plan
+
+def test_migraciones_sobre_base_de_datos_existente():
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.leerTodo()
+    dao.close()
+
+    plan = plan_de(RUTA_SQLITE, "SELECT * FROM movimientos WHERE fecha > ?", (date(2024, 1, 1).toordinal(),))
+    assert "USING INDEX idx_movimientos_fecha" in plan
+
+def movimientos_resumen():
+    return [Ingreso("Nomina de abril", date(2024, 4, 30), 1500),
+            Gasto("Compra semanal", date(2024, 4, 6), 80, CategoriaGastos.NECESIDAD),
+            Gasto("Entradas de teatro", date(2024, 4, 20), 45, CategoriaGastos.CULTURA),
+            Ingreso("Nomina de mayo", date(2024, 5, 31), 1500),
+            Gasto("Cena con amigos", date(2024, 5, 10), 60, CategoriaGastos.OCIO_VICIO),
+            Gasto("Regalo cumpleaños", date(2024, 5, 12), 30, CategoriaGastos.EXTRAS),
+            Gasto("Compra semanal", date(2024, 5, 13), 95.5, CategoriaGastos.NECESIDAD)]
+
+def test_resumen_mensual_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote(movimientos_resumen())
+
+    abril, mayo = dao.resumen()
+
+    assert abril["periodo"] == "2024-04"
+    assert abril["ingresos"] == 1500
+    assert abril["gastos"][CategoriaGastos.NECESIDAD] == 80
+    assert abril["gastos"][CategoriaGastos.CULTURA] == 45
+    assert abril["gastos"][CategoriaGastos.EXTRAS] == 0
+    assert abril["ahorro"] == 1375
+    assert abril["movimientos"] == 3
+    assert mayo["ahorro"] == 1500 - 60 - 30 - 95.5
+
+    solo_mayo = dao.resumen(desde=date(2024, 5, 1), hasta=date(2024, 5, 12))
+    assert len(solo_mayo) == 1
+    assert solo_mayo[0]["ingresos"] == 0
+    assert solo_mayo[0]["movimientos"] == 2
+
+    anual = dao.resumen(agrupacion="año")
+    assert [fila["periodo"] for fila in anual] == ["2024"]
+    assert anual[0]["ahorro"] == abril["ahorro"] + mayo["ahorro"]
+
+def test_resumen_csv_coincide_con_sqlite():
+    borrar_movimientos_sqlite()
+    dao_sqlite = DaoSqlite(RUTA_SQLITE)
+    dao_sqlite.grabar_lote(movimientos_resumen())
+
+    ruta = "datos/test_movimientos.csv"
+    borrar_fichero(ruta)
+    dao_csv = DaoCSV(ruta)
+    for movimiento in movimientos_resumen():
+        dao_csv.grabar(movimiento)
+
+    for agrupacion in ("mes", "semana", "año"):
+        assert dao_csv.resumen(agrupacion=agrupacion) == dao_sqlite.resumen(agrupacion=agrupacion)
+    assert dao_csv.resumen(desde=date(2024, 4, 10)) == dao_sqlite.resumen(desde=date(2024, 4, 10))
+
+def test_leer_columnar_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote(movimientos_resumen())
+
+    frame = dao.leer_columnar()
+
+    assert len(frame) == 7
+    assert frame.movimiento(0) == Gasto("Compra semanal", date(2024, 4, 6), 80, CategoriaGastos.NECESIDAD)
+    assert frame.total(Ingreso) == 3000
+    assert frame.total(Gasto) == 80 + 45 + 60 + 30 + 95.5
+    assert frame.por_categoria()[CategoriaGastos.NECESIDAD] == 175.5
+    assert frame.por_mes() == dao.resumen()
+
+    mayo = frame.filtrar(desde=date(2024, 5, 1), tipo=Gasto)
+    assert len(mayo) == 3
+    assert mayo.total() == 60 + 30 + 95.5
+    assert len(frame.filtrar(categorias=[CategoriaGastos.CULTURA, CategoriaGastos.EXTRAS])) == 2
+    assert len(dao.leer_columnar(hasta=date(2024, 4, 30))) == 3
+
+def test_cache_de_leer_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE, tam_cache=2)
+    ids = dao.grabar_lote(Ingreso(f"Ingreso numero {i}", date(2024, 1, 2), 10 + i) for i in range(3))
+
+    dao.leer(ids[0])
+    dao.leer(ids[0])
+    dao.leer(ids[1])
+    dao.leer(ids[2])
+    estadisticas = dao.estadisticas_cache()
+    assert estadisticas["aciertos"] == 1
+    assert estadisticas["fallos"] == 3
+    assert estadisticas["expulsiones"] == 1
+    assert estadisticas["entradas"] == 2
+
+    # grabar y borrar no dejan datos viejos en la cache
+    movimiento = dao.leer(ids[2])
+    movimiento.cantidad = 99
+    dao.grabar(movimiento)
+    assert dao.leer(ids[2]).cantidad == 99
+    dao.borrar(ids[2])
+    assert dao.leer(ids[2]) is None
+
+def test_cache_de_leer_detecta_cambios_de_otra_conexion():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE, tam_cache=10)
+    movimiento = Ingreso("Ingreso original", date(2024, 1, 2), 10)
+    dao.grabar(movimiento)
+    assert dao.leer(movimiento.id).cantidad == 10
+
+    con = sqlite3.connect(RUTA_SQLITE)
+    con.execute("UPDATE movimientos SET cantidad = 2000 WHERE id = ?", (movimiento.id,))
+    con.commit()
+    con.close()
+
+    assert dao.leer(movimiento.id).cantidad == 20
+    assert dao.estadisticas_cache()["aciertos"] == 0
+
+def test_cache_de_leer_con_hilos_que_comparten_el_dao(tmp_path):
+    import threading
+    dao = DaoSqlite(str(tmp_path / "cache.db"), tam_cache=10)
+    movimiento = Ingreso("Original concepto", date(2024, 1, 2), 10)
+    dao.grabar(movimiento)
+    assert dao.leer(movimiento.id).concepto == "Original concepto"
+
+    with dao.transaccion():
+        movimiento.concepto = "Concepto cambiado"
+        dao.grabar(movimiento)
+        # otro hilo lee la fila de antes del commit y la deja en la cache
+        lector = threading.Thread(target=dao.leer, args=(movimiento.id,))
+        lector.start()
+        lector.join()
+
+    assert dao.leer(movimiento.id).concepto == "Concepto cambiado"
+    dao.close()
+
+def test_leer_gasto_mayor_devuelve_los_gastos():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote([Ingreso("Ingreso grande", date(2024, 5, 1), 1000),
+                     Gasto("Gasto pequeño", date(2024, 5, 2), 300, CategoriaGastos.NECESIDAD),
+                     Gasto("Gasto grande", date(2024, 5, 3), 301, CategoriaGastos.EXTRAS)])
+
+    assert dao.leer_gasto_mayor(300) == [Gasto("Gasto grande", date(2024, 5, 3), 301, CategoriaGastos.EXTRAS)]
+
+def test_filtrar_sqlite_paginando():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    movimientos = []
+    for dia in range(1, 29):
+        movimientos.append(Ingreso(f"Cobro del dia {dia}", date(2024, 2, dia), dia))
+        categoria = CategoriaGastos.NECESIDAD if dia % 2 else CategoriaGastos.OCIO_VICIO
+        movimientos.append(Gasto(f"Supermercado 100%_{dia}", date(2024, 2, dia), dia * 2, categoria))
+    dao.grabar_lote(movimientos)
+
+    pagina = dao.filtrar(limite=10)
+    vistos = []
+    while pagina:
+        vistos.extend(pagina)
+        ultimo = pagina[-1]
+        pagina = dao.filtrar(limite=10, despues_de=(ultimo.fecha, ultimo.id))
+    assert len(vistos) == 56
+    assert [(mov.fecha, mov.id) for mov in vistos] == sorted((mov.fecha, mov.id) for mov in vistos)
+
+    gastos = dao.filtrar(desde=date(2024, 2, 10), hasta=date(2024, 2, 19), tipo=Gasto,
+                         categorias=[CategoriaGastos.OCIO_VICIO], limite=None)
+    assert [mov.fecha.day for mov in gastos] == [10, 12, 14, 16, 18]
+
+    assert len(dao.filtrar(min_cantidad=20, max_cantidad=30, limite=None)) == 9 + 6
+    assert len(dao.filtrar(texto="dia 2", limite=None)) == 10
+    assert len(dao.filtrar(texto="100%_2", limite=None)) == 10
+    assert dao.filtrar(texto="%", tipo=Ingreso) == []
+
+def test_filtrar_sqlite_usa_el_indice_de_fecha():
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.leerTodo()
+    dao.close()
+
+    plan = plan_de(RUTA_SQLITE, "SELECT * FROM movimientos WHERE (fecha, id) > (?, ?) ORDER BY fecha, id LIMIT ?",
+                   (date(2024, 2, 10).toordinal(), 5, 10))
+    assert "USING INDEX idx_movimientos_fecha" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_filtrar_sqlite_con_filtros_no_ordena_lo_filtrado():
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.leerTodo()
+    dao.close()
+
+    # las mismas consultas que monta filtrar, primera pagina y siguientes
+    for filtros, parametros in (("tipo_movimiento = ?", ("G",)),
+                                ("fecha >= ? AND tipo_movimiento = ?", (1, "I")),
+                                ("categoria IN (?)", (1,)),
+                                ("+categoria IN (?, ?)", (1, 2)),
+                                ("tipo_movimiento = ? AND categoria IN (?)", ("G", 4))):
+        for keyset in ("", " AND (fecha, id) > (?, ?)"):
+            query = f"SELECT * FROM movimientos WHERE {filtros}{keyset} ORDER BY fecha, id LIMIT ?"
+            plan = plan_de(RUTA_SQLITE, query, parametros + ((1, 5) if keyset else ()) + (10,))
+            assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, query
+
+def test_leer_pagina_sqlite_ordenada():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote(movimientos_resumen())
+
+    assert dao.contar() == 7
+    assert [mov.fecha.day for mov in dao.leer_pagina(0, 3)] == [6, 20, 30]
+    assert [mov.fecha.day for mov in dao.leer_pagina(3, 10)] == [10, 12, 13, 31]
+    assert [mov.cantidad for mov in dao.leer_pagina(0, 2, orden="cantidad", descendente=True)] == [1500, 1500]
+    assert dao.leer_pagina(7, 10) == []
+
+def test_leer_pagina_sqlite_desde_la_de_al_lado():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.grabar_lote(movimientos_resumen())
+
+    for orden in COLUMNAS_ORDEN:
+        for descendente in (False, True):
+            todos = [mov.id for mov in dao.leer_pagina(0, 10, orden, descendente)]
+            paginas = [dao.leer_pagina(0, 2, orden, descendente)]
+            while len(paginas[-1]) == 2:
+                paginas.append(dao.leer_pagina(0, 2, orden, descendente, despues_de=paginas[-1][-1]))
+            assert [mov.id for pagina in paginas for mov in pagina] == todos, (orden, descendente)
+
+            ultima = dao.leer_pagina(5, 2, orden, descendente)
+            assert [mov.id for mov in dao.leer_pagina(0, 2, orden, descendente, antes_de=ultima[0])] == todos[3:5]
+            assert dao.leer_pagina(0, 2, orden, descendente, antes_de=paginas[0][0]) == []
+    dao.close()
+
+def test_leer_pagina_sqlite_usa_un_indice_para_cada_orden():
+    dao = DaoSqlite(RUTA_SQLITE)
+    dao.leerTodo()
+    dao.close()
+
+    for expresion in COLUMNAS_ORDEN.values():
+        for sentido in ("ASC", "DESC"):
+            plan = plan_de(RUTA_SQLITE, f"SELECT * FROM movimientos ORDER BY {expresion} {sentido}, id {sentido} "
+                                        "LIMIT ? OFFSET ?", (10, 3))
+            assert "TEMP B-TREE" not in plan, (expresion, sentido)
+            plan = plan_de(RUTA_SQLITE, f"SELECT * FROM movimientos WHERE {expresion} > ? "
+                                        f"ORDER BY {expresion} {sentido}, id {sentido} LIMIT ?", (0, 10))
+            assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, (expresion, sentido)
+
+def test_eventos_de_cambios_sqlite():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    eventos = []
+    dao.suscribir(eventos.append)
+
+    ingreso = Ingreso("Ingreso avisado", date(2024, 1, 2), 10)
+    dao.grabar(ingreso)
+    ingreso.cantidad = 15
+    dao.grabar(ingreso)
+    ids = dao.grabar_lote([Gasto("Gasto avisado", date(2024, 1, 3), 5, CategoriaGastos.EXTRAS),
+                           Ingreso("Otro ingreso avisado", date(2024, 1, 4), 20)])
+    dao.borrar(ingreso.id)
+    dao.borrar(ingreso.id)
+    dao.borrar_lote(ids)
+
+    assert [(evento.tipo, evento.id) for evento in eventos] == [("insertado", ingreso.id),
+                                                                 ("actualizado", ingreso.id),
+                                                                 ("insertado", ids[0]),
+                                                                 ("insertado", ids[1]),
+                                                                 ("borrado", ingreso.id),
+                                                                 ("borrado", ids[0]),
+                                                                 ("borrado", ids[1])]
+    assert eventos[1].movimiento.cantidad == 15
+
+def test_borrar_lote_sqlite_solo_avisa_de_los_que_existian():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    ingreso = Ingreso("Ingreso que se borra", date(2024, 1, 2), 10)
+    dao.grabar(ingreso)
+    eventos = []
+    dao.suscribir(eventos.append)
+
+    assert dao.borrar_lote([ingreso.id, 999, 1000]) == 1
+    assert [(evento.tipo, evento.id) for evento in eventos] == [("borrado", ingreso.id)]
+
+def test_eventos_solo_tras_el_commit():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    eventos = []
+    dao.suscribir(eventos.append)
+    movimiento = Ingreso("No llega a grabarse", date(2024, 1, 2), 10)
+
+    with pytest.raises(RuntimeError):
+        with dao.transaccion():
+            dao.grabar(movimiento)
+            assert eventos == []
+            raise RuntimeError("se deshace")
+
+    assert eventos == []
+    assert movimiento.id is None
+
+    dao.desuscribir(eventos.append)
+    dao.grabar(movimiento)
+    assert eventos == []
+
+def test_eventos_de_cambios_de_otra_conexion():
+    borrar_movimientos_sqlite()
+    dao = DaoSqlite(RUTA_SQLITE)
+    eventos = []
+    dao.suscribir(eventos.append)
+
+    assert not dao.comprobar_cambios()
+    dao.grabar(Ingreso("Cambio propio", date(2024, 1, 2), 10))
+    assert not dao.comprobar_cambios()
+
+    con = sqlite3.connect(RUTA_SQLITE)
+    con.execute("DELETE FROM movimientos")
+    con.commit()
+    con.close()
+
+    assert dao.comprobar_cambios()
+    assert eventos[-1].tipo == "externo"
+    assert not dao.comprobar_cambios()
+
+def escritor_concurrente(ruta, numero, lotes, tam_lote):
+    with DaoSqlite(ruta, concurrente=True) as dao:
+        for lote in range(lotes):
+            dao.grabar_lote(Gasto(f"Escritor {numero} lote {lote}", date(2024, 1, 1 + lote % 28), 1,
+                                  CategoriaGastos.NECESIDAD) for _ in range(tam_lote))
+
+def lector_concurrente(ruta, resultados):
+    cuentas = []
+    with DaoSqlite(ruta, concurrente=True, solo_lectura=True) as dao:
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < 1.5:
+            cuentas.append(dao.contar())
+            dao.resumen()
+    resultados.put(cuentas)
+
+def test_varios_procesos_leyendo_y_escribiendo(tmp_path):
+    import multiprocessing
+    ruta = str(tmp_path / "concurrente.db")
+    # crear el esquema antes de que arranquen los lectores, que no migran;
+    # DaoSqlite no abre la conexion hasta la primera consulta
+    with DaoSqlite(ruta, concurrente=True) as dao:
+        dao.contar()
+    con = sqlite3.connect(ruta)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACIONES)
+    con.close()
+
+    contexto = multiprocessing.get_context("spawn")
+    resultados = contexto.Queue()
+    escritores = [contexto.Process(target=escritor_concurrente, args=(ruta, numero, 20, 25)) for numero in range(3)]
+    lectores = [contexto.Process(target=lector_concurrente, args=(ruta, resultados)) for _ in range(2)]
+
+    try:
+        for proceso in lectores:
+            proceso.start()
+        for proceso in escritores:
+            proceso.start()
+        for proceso in escritores:
+            proceso.join(timeout=60)
+        lecturas = [resultados.get(timeout=60) for _ in lectores]
+        for proceso in lectores:
+            proceso.join(timeout=60)
+    finally:
+        # que un proceso atascado no deje la prueba colgada
+        for proceso in lectores + escritores:
+            if proceso.is_alive():
+                proceso.terminate()
+                proceso.join()
+
+    assert [proceso.exitcode for proceso in lectores + escritores] == [0] * 5
+    # los lectores nunca ven una transaccion a medias ni van hacia atras
+    # y no se quedan bloqueados por los escritores
+    for cuentas in lecturas:
+        assert len(cuentas) > 1
+        assert cuentas == sorted(cuentas)
+        assert all(cuenta % 25 == 0 for cuenta in cuentas)
+
+    con = sqlite3.connect(ruta)
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert con.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0] == 3 * 20 * 25
+    con.close()
+
+def test_dao_sqlite_solo_lectura(tmp_path):
+    ruta = str(tmp_path / "lectura.db")
+    with DaoSqlite(ruta) as dao:
+        dao.grabar(Ingreso("Ingreso ya grabado", date(2024, 1, 1), 50))
+
+    with DaoSqlite(ruta, solo_lectura=True) as dao:
+        assert dao.contar() == 1
+        with pytest.raises(sqlite3.OperationalError):
+            dao.grabar(Ingreso("No se puede grabar", date(2024, 1, 1), 50))
+
+def csv_de_prueba(ruta, n):
+    dao = DaoCSV(ruta)
+    for i in range(n):
+        if i % 3:
+            dao.grabar(Gasto(f"Gasto numero {i}", date(2024, 1 + i % 12, 1 + i % 28), i + 0.5,
+                             CategoriaGastos(1 + i % 4)))
         else:
-                assert isinstance(movto,Gasto)    
-                assert movto.concepto == f"Ejemplo gasto id{i}"
-                assert movto.fecha == date(2024, 5, i)
-                assert movto.cantidad == 301.0
-                assert movto.categoria.value==4   
+            dao.grabar(Ingreso(f"Ingreso numero {i}", date(2024, 1 + i % 12, 1 + i % 28), i + 0.5))
+
+def test_importar_y_exportar_csv(tmp_path):
+    origen = str(tmp_path / "origen.csv")
+    csv_de_prueba(origen, 25)
+
+    avisos = []
+    with DaoSqlite(str(tmp_path / "importado.db")) as dao:
+        assert importar_csv(origen, dao, tam_lote=10, progreso=lambda *a: avisos.append(a)) == 25
+        assert [aviso[0] for aviso in avisos] == [10, 20, 25]
+        assert avisos[-1][1] == avisos[-1][2] == os.path.getsize(origen)
+        assert dao.contar() == 25
+
+        # importar otra vez no duplica nada, ya estaba terminado
+        assert importar_csv(origen, dao, tam_lote=10) == 0
+
+        destino = str(tmp_path / "destino.csv")
+        assert exportar_csv(dao, destino, tam_lote=10) == 25
+
+    with open(origen, encoding="utf-8") as f1, open(destino, encoding="utf-8") as f2:
+        assert f1.read() == f2.read()
+
+def test_importar_csv_continua_tras_un_corte(tmp_path):
+    origen = str(tmp_path / "origen.csv")
+    csv_de_prueba(origen, 25)
+
+    class Corte(Exception):
+        pass
+
+    def cortar(filas, leidos, total):
+        if filas == 20:
+            raise Corte()
+
+    with DaoSqlite(str(tmp_path / "importado.db")) as dao:
+        with pytest.raises(Corte):
+            importar_csv(origen, dao, tam_lote=10, progreso=cortar)
+        assert dao.contar() == 20
+
+        assert importar_csv(origen, dao, tam_lote=10) == 5
+        assert dao.contar() == 25
+        assert [m.concepto for m in dao.leerTodo()] == [f"{'Ingreso' if i % 3 == 0 else 'Gasto'} numero {i}" for i in range(25)]
+
+        # con reanudar=False se empieza de cero
+        assert importar_csv(origen, dao, tam_lote=10, reanudar=False) == 25
+        assert dao.contar() == 50
+
+def test_importar_csv_valida_los_movimientos(tmp_path):
+    origen = str(tmp_path / "origen.csv")
+    with open(origen, "w", encoding="utf-8") as f:
+        f.write("concepto,fecha,cantidad,categoria\n")
+        f.write("Concepto valido,2024-01-01,10,\n")
+        f.write("Concepto valido,2024-01-02,0,\n")
+
+    with DaoSqlite(str(tmp_path / "importado.db")) as dao:
+        with pytest.raises(ValueError):
+            importar_csv(origen, dao)
+        assert dao.contar() == 0
+
+def test_instrumentacion_sqlite(tmp_path):
+    with DaoSqlite(str(tmp_path / "medida.db"), instrumentacion=Instrumentacion(umbral_lenta=None)) as dao:
+        dao.grabar_lote(movimientos_resumen())
+        assert len(dao.leerTodo()) == 7
+        dao.leer(1)
+        dao.leer(2)
+
+        estadisticas = dao.estadisticas()
+        assert set(estadisticas["metodos"]) == {"grabar_lote", "leerTodo", "leer"}
+        assert estadisticas["lentas"] == []
+
+        leer_todo = estadisticas["metodos"]["leerTodo"]
+        assert leer_todo["llamadas"] == 1
+        assert leer_todo["filas"] == 7
+        assert sum(leer_todo["histograma"].values()) == 1
+        assert leer_todo["fases"]["traer"] > 0
+        assert leer_todo["fases"]["hidratar"] > 0
+        assert estadisticas["metodos"]["grabar_lote"]["fases"]["conectar"] > 0
+        assert estadisticas["metodos"]["leer"]["llamadas"] == 2
+
+def test_instrumentacion_anota_consultas_lentas(tmp_path, caplog):
+    with DaoSqlite(str(tmp_path / "medida.db"), instrumentacion=Instrumentacion(umbral_lenta=0)) as dao:
+        dao.grabar_lote(movimientos_resumen())
+        with caplog.at_level("WARNING", logger="kakebo.sql"):
+            dao.leer_gasto_mayor(50)
+
+        lentas = [lenta for lenta in dao.estadisticas()["lentas"] if lenta["metodo"] == "leer_gasto_mayor"]
+        assert len(lentas) == 1
+        assert "USING INDEX idx_movimientos_tipo_cantidad" in " ".join(lentas[0]["plan"])
+        assert "leer_gasto_mayor" in caplog.text
+
+def test_sin_instrumentacion_no_se_mide_nada(tmp_path):
+    with DaoSqlite(str(tmp_path / "sin_medir.db")) as dao:
+        dao.grabar(Ingreso("Ingreso sin medir", date(2024, 1, 1), 10))
+        assert dao.estadisticas() is None
+        # los metodos son los de la clase, sin envolver
+        assert dao.leer.__func__ is DaoSqlite.leer
+
+def test_migracion_a_centimos_y_ordinales(tmp_path):
+    ruta = str(tmp_path / "antigua.db")
+    con = sqlite3.connect(ruta)
+    for sentencias in MIGRACIONES[:3]:
+        for sentencia in sentencias:
+            con.execute(sentencia)
+    con.execute("PRAGMA user_version = 3")
+    con.executemany("INSERT INTO movimientos (id, tipo_movimiento, concepto, fecha, cantidad, categoria) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((1, "I", "Nomina antigua", "2024-01-31", 1500.1, None),
+                     (2, "G", "Compra antigua", "2024-02-01", 0.29, 1),
+                     (7, "G", "Borrado despues", "2024-02-02", 10, 1)))
+    con.execute("DELETE FROM movimientos WHERE id = 7")
+    con.commit()
+    con.close()
+
+    with DaoSqlite(ruta) as dao:
+        assert dao.leerTodo() == [Ingreso("Nomina antigua", date(2024, 1, 31), 1500.1),
+                                  Gasto("Compra antigua", date(2024, 2, 1), 0.29, CategoriaGastos.NECESIDAD)]
+        # AUTOINCREMENT no reutiliza ids ya dados
+        nuevo = Ingreso("Despues de migrar", date(2024, 3, 1), 1)
+        dao.grabar(nuevo)
+        assert nuevo.id == 8
+
+    con = sqlite3.connect(ruta)
+    assert con.execute("SELECT typeof(fecha), typeof(cantidad), fecha, cantidad FROM movimientos WHERE id = 2").fetchone() == \
+        ("integer", "integer", date(2024, 2, 1).toordinal(), 29)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACIONES)
+    con.close()
+
+    with DaoSqlite(ruta) as dao:
+        assert dao.comprobar_resumen() == []
+
+    plan = plan_de(ruta, "SELECT * FROM movimientos WHERE fecha BETWEEN ? AND ?", (1, 2))
+    assert "USING INDEX idx_movimientos_fecha" in plan
+
+def test_sumas_exactas_en_centimos(tmp_path):
+    with DaoSqlite(str(tmp_path / "centimos.db")) as dao:
+        dao.grabar_lote(Gasto("Cafe de la mañana", date(2024, 1, 1 + dia % 28), 0.1, CategoriaGastos.OCIO_VICIO)
+                        for dia in range(30))
+        enero, = dao.resumen()
+        assert enero["gastos"][CategoriaGastos.OCIO_VICIO] == 3.0
+
+def test_resumen_mensual_y_saldo_por_triggers(tmp_path):
+    with DaoSqlite(str(tmp_path / "triggers.db")) as dao:
+        assert dao.saldo() == {"ingresos": 0, "gastos": 0, "saldo": 0, "movimientos": 0}
+        movimientos = movimientos_resumen()
+        dao.grabar_lote(movimientos)
+        assert dao.resumen_meses() == [dict(fila, saldo=saldo) for fila, saldo in zip(dao.resumen(), (1375, 2689.5))]
+        assert dao.saldo() == {"ingresos": 3000, "gastos": 310.5, "saldo": 2689.5, "movimientos": 7}
+
+        # cambiar de mes y de categoria, y borrar
+        compra = movimientos[1]
+        compra.fecha = date(2024, 5, 7)
+        compra.categoria = CategoriaGastos.EXTRAS
+        dao.grabar(compra)
+        dao.borrar(movimientos[0].id)
+
+        mayo = dao.resumen_mes(2024, 5)
+        assert mayo == dao.resumen(date(2024, 5, 1), date(2024, 5, 31))[0]
+        assert mayo["gastos"][CategoriaGastos.EXTRAS] == 110
+        assert dao.resumen_mes(2024, 4)["movimientos"] == 1
+        assert dao.resumen_mes(2023, 1) is None
+        assert dao.resumen_meses(desde=date(2024, 5, 20))[0]["saldo"] == dao.saldo()["saldo"]
+        assert dao.comprobar_resumen() == []
+
+def test_comprobar_y_reconstruir_resumen(tmp_path):
+    ruta = str(tmp_path / "triggers.db")
+    with DaoSqlite(ruta) as dao:
+        dao.grabar_lote(movimientos_resumen())
+
+    con = sqlite3.connect(ruta)
+    con.execute("UPDATE resumen_mensual SET total = total + 1 WHERE anio = 2024 AND mes = 4 AND tipo_movimiento = 'I'")
+    con.execute("UPDATE saldo SET n = 0")
+    con.commit()
+    con.close()
+
+    with DaoSqlite(ruta) as dao:
+        diferencias = dao.comprobar_resumen()
+        assert [clave for clave, _, _ in diferencias] == [(2024, 4, "I", 0), "saldo"]
+        assert diferencias[0][1:] == ((150001, 1), (150000, 1))
+
+        dao.reconstruir_resumen()
+        assert dao.comprobar_resumen() == []
+        assert dao.saldo()["movimientos"] == 7
+
+def movimientos_busqueda():
+    return [Gasto("Farmacia del barrio", date(2024, 3, 2), 12.5, CategoriaGastos.NECESIDAD),
+            Gasto("Supermercado, compra semanal", date(2024, 3, 3), 80, CategoriaGastos.NECESIDAD),
+            Gasto("Cena en el café de la plaza", date(2024, 3, 9), 40, CategoriaGastos.OCIO_VICIO),
+            Gasto("Farmacia de guardia", date(2024, 4, 1), 8, CategoriaGastos.NECESIDAD),
+            Ingreso("Devolucion de la farmacia", date(2024, 4, 2), 8),
+            Gasto("Libro sobre farmacologia", date(2024, 4, 5), 25, CategoriaGastos.CULTURA)]
+
+def test_buscar_sqlite(tmp_path):
+    with DaoSqlite(str(tmp_path / "busqueda.db")) as dao:
+        dao.grabar_lote(movimientos_busqueda())
+
+        assert [m.concepto for m in dao.buscar("FARMACIA", orden="recientes")] == \
+            ["Devolucion de la farmacia", "Farmacia de guardia", "Farmacia del barrio"]
+        # el orden por defecto es el rapido
+        assert dao.buscar("farmacia") == dao.buscar("farmacia", orden="recientes")
+        # por prefijo entra tambien farmacologia, sin prefijo no
+        assert len(dao.buscar("farma")) == 4
+        assert dao.buscar("farma", prefijo=False) == []
+        # sin acentos y con varias palabras
+        assert [m.concepto for m in dao.buscar("cafe plaza")] == ["Cena en el café de la plaza"]
+
+        assert [m.concepto for m in dao.buscar("farmacia", desde=date(2024, 4, 1), tipo=Gasto)] == ["Farmacia de guardia"]
+        assert [m.concepto for m in dao.buscar("farma", categorias=[CategoriaGastos.CULTURA])] == ["Libro sobre farmacologia"]
+        assert len(dao.buscar("farmacia", limite=2)) == 2
+        assert dao.buscar("  ,. ") == []
+
+        # los triggers siguen los cambios de concepto y los borrados
+        supermercado = dao.buscar("supermercado")[0]
+        supermercado.concepto = "Mercado de abastos"
+        dao.grabar(supermercado)
+        assert dao.buscar("supermercado") == []
+        assert dao.buscar("abastos")[0].id == supermercado.id
+        dao.borrar(supermercado.id)
+        assert dao.buscar("abastos") == []
+
+def test_buscar_por_relevancia_sqlite(tmp_path):
+    with DaoSqlite(str(tmp_path / "busqueda.db")) as dao:
+        dao.grabar_lote([Gasto("Farmacia", date(2024, 1, 1), 5, CategoriaGastos.NECESIDAD),
+                         Gasto("Compra en la farmacia de la estacion y mas cosas", date(2024, 1, 2), 5, CategoriaGastos.NECESIDAD),
+                         Gasto("Farmacia farmacia", date(2024, 1, 3), 5, CategoriaGastos.NECESIDAD)])
+        assert [m.concepto for m in dao.buscar("farmacia", orden="rank")][-1] == "Compra en la farmacia de la estacion y mas cosas"
+
+def test_buscar_sin_fts5_usa_like(tmp_path):
+    ruta = str(tmp_path / "sin_fts.db")
+    with DaoSqlite(ruta) as dao:
+        dao.grabar_lote(movimientos_busqueda())
+
+    # como quedaria en un SQLite sin FTS5
+    con = sqlite3.connect(ruta)
+    for trigger in ("movimientos_fts_alta", "movimientos_fts_baja", "movimientos_fts_cambio"):
+        con.execute(f"DROP TRIGGER {trigger}")
+    con.execute("DROP TABLE movimientos_fts")
+    con.commit()
+    con.close()
+
+    with DaoSqlite(ruta) as dao:
+        assert [m.concepto for m in dao.buscar("farmacia", hasta=date(2024, 4, 1))] == ["Farmacia de guardia", "Farmacia del barrio"]
+
+def test_carga_masiva_suma_resumen_y_busqueda_al_terminar(tmp_path):
+    ruta = str(tmp_path / "masiva.db")
+    with DaoSqlite(ruta) as dao:
+        dao.grabar_lote(movimientos_resumen())
+        with dao.carga_masiva():
+            dao.grabar_lote(movimientos_busqueda())
+        assert dao.comprobar_resumen() == []
+        assert dao.saldo()["movimientos"] == 13
+        assert len(dao.buscar("farma")) == 4
+
+        # si falla no queda nada, tampoco los triggers quitados
+        with pytest.raises(ZeroDivisionError):
+            with dao.carga_masiva():
+                dao.grabar(Gasto("Farmacia que no llega", date(2024, 5, 1), 3, CategoriaGastos.NECESIDAD))
+                1 / 0
+        dao.grabar(Gasto("Farmacia despues", date(2024, 5, 2), 4, CategoriaGastos.NECESIDAD))
+        assert [m.concepto for m in dao.buscar("farmacia", orden="recientes", limite=1)] == ["Farmacia despues"]
+        assert dao.comprobar_resumen() == []
+
+    con = sqlite3.connect(ruta)
+    triggers = {fila[0] for fila in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert {"resumen_alta", "movimientos_fts_alta"} <= triggers
+    con.execute("INSERT INTO movimientos_fts (movimientos_fts) VALUES ('integrity-check')")
+    con.close()
+
+def test_dao_binario_grabar_y_leer(tmp_path):
+    ruta = str(tmp_path / "libro.kbin")
+    with DaoBinario(ruta) as dao:
+        movimientos = movimientos_resumen()
+        assert dao.grabar_lote(movimientos[:6]) == [1, 2, 3, 4, 5, 6]
+        dao.grabar(movimientos[6])
+        assert movimientos[6].id == 7
+        assert dao.total_filas() == 7
+
+        assert dao.leer(2) == movimientos[1]
+        assert dao.leer(2).id == 2
+        assert dao.leer_fila(5) == movimientos[5]
+        assert dao.leer(8) is None
+        assert dao.leer_fila(7) is None
+
+        # modificar en su sitio, con otro concepto
+        movimientos[4].concepto = "Cena con amigos en la sierra"
+        movimientos[4].cantidad = 65.25
+        dao.grabar(movimientos[4])
+        assert dao.leer(5).concepto == "Cena con amigos en la sierra"
+        assert dao.leer(5).cantidad == 65.25
+
+    # al abrirlo de nuevo se sigue desde el ultimo id
+    with DaoBinario(ruta) as dao:
+        assert dao.leerTodo() == movimientos
+        nuevo = Ingreso("Ingreso tras reabrir", date(2024, 6, 1), 10)
+        dao.grabar(nuevo)
+        assert nuevo.id == 8
+
+        frame = dao.leer_columnar()
+        assert len(frame) == 8
+        assert frame.total(Gasto) == 80 + 45 + 65.25 + 30 + 95.5
+
+def test_dao_binario_borrar_y_compactar(tmp_path):
+    ruta = str(tmp_path / "libro.kbin")
+    with DaoBinario(ruta) as dao:
+        movimientos = movimientos_resumen()
+        dao.grabar_lote(movimientos)
+        dao.borrar(2)
+        dao.borrar(7)
+        dao.borrar(7)
+        assert dao.leer(2) is None
+        assert [m.id for m in dao.leerTodo()] == [1, 3, 4, 5, 6]
+        with pytest.raises(ValueError):
+            dao.grabar(movimientos[1])
+
+        conceptos_antes = os.path.getsize(dao.ruta_conceptos)
+        assert dao.compactar() == 2
+        assert dao.total_filas() == 5
+        assert os.path.getsize(dao.ruta_conceptos) < conceptos_antes
+        # los ids no cambian y se siguen encontrando
+        assert [m.id for m in dao.leerTodo()] == [1, 3, 4, 5, 6]
+        assert dao.leer(4) == movimientos[3]
+        assert dao.leer(2) is None
+
+        # no se vuelve a dar el id 7
+        nuevo = Gasto("Despues de compactar", date(2024, 6, 1), 5, CategoriaGastos.EXTRAS)
+        dao.grabar(nuevo)
+        assert nuevo.id == 8
+
+    assert sorted(os.listdir(tmp_path)) == ["libro.kbin", "libro.kbin.1.conceptos"]
+    with DaoBinario(ruta) as dao:
+        assert [m.id for m in dao.leerTodo()] == [1, 3, 4, 5, 6, 8]
+
+def test_dao_binario_ignora_registro_a_medias(tmp_path):
+    ruta = str(tmp_path / "libro.kbin")
+    with DaoBinario(ruta) as dao:
+        dao.grabar_lote(movimientos_resumen())
+    with open(ruta, "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    with DaoBinario(ruta) as dao:
+        assert dao.total_filas() == 7
+        assert len(dao.leerTodo()) == 7
+        # lo que se escribe despues queda alineado
+        nuevo = Ingreso("Despues del corte", date(2024, 6, 1), 10)
+        dao.grabar(nuevo)
+        assert nuevo.id == 8
+        assert dao.leerTodo()[-1] == nuevo
+
+    with DaoBinario(ruta) as dao:
+        assert dao.total_filas() == 8
+        assert dao.leer(8) == nuevo
+
+def test_dao_binario_abrir_no_corta_lo_que_se_esta_escribiendo(tmp_path):
+    ruta = str(tmp_path / "libro.kbin")
+    escritor = DaoBinario(ruta)
+    escritor.grabar_lote(movimientos_resumen()[:3])
+    registro = open(ruta, "rb").read()[-REGISTRO_BINARIO.size:]
+
+    # el escritor lleva medio registro cuando un lector abre el fichero
+    with open(ruta, "ab") as f:
+        f.write(registro[:10])
+    with DaoBinario(ruta) as lector:
+        assert lector.total_filas() == 3
+    with open(ruta, "ab") as f:
+        f.write(registro[10:])
+
+    with DaoBinario(ruta) as lector:
+        assert lector.total_filas() == 4
+    escritor.close()
+
+def test_dao_binario_lote_con_nuevos_y_existentes(tmp_path):
+    ruta = str(tmp_path / "libro.kbin")
+    with DaoBinario(ruta) as dao:
+        existente = Ingreso("Primero", date(2024, 1, 1), 10)
+        dao.grabar(existente)
+        existente.concepto = "Primero cambiado largo"
+        nuevo_b = Gasto("Nuevo segundo", date(2024, 1, 2), 5, CategoriaGastos.EXTRAS)
+        nuevo_c = Ingreso("Nuevo tercero", date(2024, 1, 3), 7)
+
+        assert dao.grabar_lote([nuevo_b, existente, nuevo_c]) == [2, 1, 3]
+        assert [m.concepto for m in dao.leerTodo()] == ["Primero cambiado largo", "Nuevo segundo", "Nuevo tercero"]
+        assert dao.leer(2) == nuevo_b
+        assert dao.leer(3) == nuevo_c
 
-    
\ No newline at end of file
+def test_dao_binario_fichero_ajeno(tmp_path):
+    ruta = tmp_path / "otro.kbin"
+    ruta.write_bytes(b"esto no es un libro binario")
+    with pytest.raises(ValueError):
+        DaoBinario(str(ruta))
@@ -0,0 +1,41 @@
+from datetime import date
+
+from kakebo.informes import informe, tramos, resumir_tramo
+from kakebo.modelos import DaoSqlite
+from benchmarks.libro import crear_sqlite
+
+def test_tramos_por_anios_o_por_meses():
+    assert tramos(date(2022, 3, 5), date(2024, 2, 1)) == [
+        (date(2022, 3, 5), date(2022, 12, 31)),
+        (date(2023, 1, 1), date(2023, 12, 31)),
+        (date(2024, 1, 1), date(2024, 2, 1))]
+    # con pocos años y muchos procesos se parte por meses
+    assert tramos(date(2023, 11, 15), date(2024, 2, 10), minimo=4) == [
+        (date(2023, 11, 15), date(2023, 11, 30)),
+        (date(2023, 12, 1), date(2023, 12, 31)),
+        (date(2024, 1, 1), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 10))]
+
+def test_informe_igual_que_resumen(tmp_path):
+    ruta = str(tmp_path / "informe.db")
+    crear_sqlite(ruta, 3000, semilla=3)
+
+    with DaoSqlite(ruta) as dao:
+        for agrupacion in ("mes", "semana", "año"):
+            esperado = dao.resumen(agrupacion=agrupacion)
+            assert informe(ruta, agrupacion=agrupacion, procesos=1) == esperado
+        assert informe(ruta, procesos=2) == dao.resumen()
+
+        desde, hasta = date(2018, 6, 15), date(2020, 2, 10)
+        assert informe(ruta, desde, hasta, agrupacion="semana", procesos=2) == dao.resumen(desde, hasta, "semana")
+
+def test_resumir_tramo_en_centimos(tmp_path):
+    ruta = str(tmp_path / "informe.db")
+    crear_sqlite(ruta, 500)
+    parcial = resumir_tramo(ruta, date(2015, 1, 1), date(2015, 12, 31), "año")
+    assert {periodo for periodo, *_ in parcial} == {"2015"}
+    assert all(isinstance(total, int) for _, _, total, _ in parcial)
+
+def test_informe_sin_movimientos(tmp_path):
+    ruta = str(tmp_path / "vacio.db")
+    assert informe(ruta) == []
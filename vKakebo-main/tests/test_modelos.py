@@ -1,5 +1,5 @@
 from datetime import date
-from kakebo.modelos import Ingreso, CategoriaGastos, Gasto
+from kakebo.modelos import Ingreso, CategoriaGastos, Gasto, MovimientosFrame, fecha_iso
 import pytest
 
 def test_instanciar_ingreso():
@@ -59,3 +59,70 @@ def test_gasto_categoria_tipo_correcto():
        movimiento = Gasto("Factura del Agua", date(2024,5,1), 70, "Necesidad") 
 
     
+
+def test_movimientos_sin_diccionario_de_atributos():
+    movimiento = Gasto("Factura del Agua", date(2024,5,1), 70, CategoriaGastos.NECESIDAD)
+    assert not hasattr(movimiento, "__dict__")
+    with pytest.raises(AttributeError):
+        movimiento.otro_atributo = 1
+
+def test_desde_fila_no_valida():
+    ingreso = Ingreso.desde_fila("Ingreso de confianza", date(2024, 1, 5), 1000, 7)
+    assert ingreso == Ingreso("Ingreso de confianza", date(2024, 1, 5), 1000)
+    assert ingreso.id == 7
+
+    gasto = Gasto.desde_fila("Gasto de confianza", date(2024, 1, 5), 70, CategoriaGastos.CULTURA, 8)
+    assert gasto == Gasto("Gasto de confianza", date(2024, 1, 5), 70, CategoriaGastos.CULTURA)
+    assert gasto.id == 8
+
+    # las filas de nuestro almacenamiento no se vuelven a comprobar
+    sin_validar = Ingreso.desde_fila("lo", date(2024, 1, 1), 0)
+    assert sin_validar.concepto == "lo"
+
+def test_fecha_iso_reutiliza_las_fechas():
+    assert fecha_iso("2024-05-01") == date(2024, 5, 1)
+    assert fecha_iso("2024-05-01") is fecha_iso("2024-05-01")
+
+def test_movimientos_frame():
+    frame = MovimientosFrame()
+    for dia in range(1, 11):
+        frame.agregar(dia, dia % 2 == 0, f"Movimiento {dia}", date(2023, 12, 27 + dia).toordinal()
+                      if dia < 5 else date(2024, 1, dia).toordinal(), dia * 10.0, 2 if dia % 2 == 0 else 0)
+
+    assert len(frame) == 10
+    assert [frame.es_gasto(posicion) for posicion in range(3)] == [False, True, False]
+    assert isinstance(frame.movimiento(1), Gasto)
+    assert frame.total() == 550
+    assert frame.total(Gasto) == 300
+    assert frame.por_categoria()[CategoriaGastos.CULTURA] == 300
+
+    diciembre, enero = frame.por_mes()
+    assert diciembre["periodo"] == "2023-12"
+    assert diciembre["ingresos"] == 40
+    assert diciembre["gastos"][CategoriaGastos.CULTURA] == 60
+    assert enero["movimientos"] == 6
+
+    vacio = frame.filtrar(hasta=date(2000, 1, 1))
+    assert len(vacio) == 0
+    assert vacio.total() == 0
+    assert vacio.por_mes() == []
+
+def test_movimientos_frame_filtrar_conserva_cada_columna():
+    frame = MovimientosFrame()
+    for dia in range(1, 21):
+        frame.agregar(dia, dia % 3 == 0, f"Movimiento {dia}", date(2024, 1, dia).toordinal(), dia * 1.5,
+                      dia % 4 + 1 if dia % 3 == 0 else 0)
+
+    filtrado = frame.filtrar(desde=date(2024, 1, 3), hasta=date(2024, 1, 17))
+    assert len(filtrado) == 15
+    assert [filtrado.movimiento(posicion) for posicion in range(15)] == \
+        [frame.movimiento(posicion) for posicion in range(2, 17)]
+    assert [filtrado.es_gasto(posicion) for posicion in range(15)] == [dia % 3 == 0 for dia in range(3, 18)]
+    assert filtrado.total(Gasto) == sum(dia * 1.5 for dia in range(3, 18) if dia % 3 == 0)
+
+    # se puede seguir agregando al frame filtrado
+    filtrado.agregar(99, True, "Agregado despues", date(2024, 2, 1).toordinal(), 7.0, 1)
+    assert filtrado.es_gasto(15)
+    assert filtrado.movimiento(15).concepto == "Agregado despues"
+    assert len(frame.filtrar(tipo=Gasto).filtrar(categorias=[CategoriaGastos.CULTURA])) == \
+        sum(1 for dia in range(1, 21) if dia % 3 == 0 and dia % 4 + 1 == 2)